@@ -0,0 +1,89 @@
+# app/admission.py
+"""
+Допуск прогнозов к upstream: лимит на пользователя и общий потолок фетчей.
+
+Only forecasts that miss the candle cache cost upstream capacity, so only
+those are admitted here:
+
+- each user has a token bucket (``user_rate`` per minute, ``user_burst``
+  at once); a user out of tokens is served from the candle cache even if
+  the candles are stale, and refused only when nothing is cached;
+- at most ``max_fetches`` cache-missing forecasts fetch at a time; when
+  the ceiling is reached a forecast with stale candles takes those, the
+  others wait for a slot.
+"""
+from __future__ import annotations
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Hashable
+
+from prometheus_client import Counter, Gauge
+
+from .outbound import TokenBucket
+
+ADMISSION = Counter("bot_admission_total", "Forecast requests by admission decision", ["decision", "reason"])
+FETCHES_IN_FLIGHT = Gauge("bot_forecast_fetches_in_flight", "Cache-missing forecasts fetching upstream")
+
+
+class Admission:
+    def __init__(self, user_rate: float = 6.0, user_burst: float = 3.0, max_fetches: int = 3,
+                 max_users: int = 10_000):
+        self.user_rate = user_rate / 60.0
+        self.user_burst = max(1.0, user_burst)
+        self.max_fetches = max(1, max_fetches)
+        self.max_users = max_users
+        self.fetching = 0
+        self._users: Dict[Hashable, TokenBucket] = {}
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    def allow_user(self, user_id: Hashable) -> float:
+        """0.0 and a token spent, or seconds until the user has one"""
+        now = time.monotonic()
+        bucket = self._users.get(user_id)
+        if bucket is None:
+            if len(self._users) >= self.max_users:
+                self._users = {k: b for k, b in self._users.items() if not b.idle(now)}
+            bucket = self._users[user_id] = TokenBucket(self.user_rate, self.user_burst, now)
+        return bucket.take(now)
+
+    def refund_user(self, user_id: Hashable):
+        """Return the token of a request that was turned away after ``allow_user``"""
+        bucket = self._users.get(user_id)
+        if bucket is not None:
+            bucket.refund(time.monotonic())
+
+    def fetch_free(self) -> bool:
+        """A fetch would start right away"""
+        return self.fetching < self.max_fetches
+
+    @asynccontextmanager
+    async def fetch_slot(self):
+        """One of ``max_fetches`` upstream slots; waits in arrival order"""
+        if self.fetching < self.max_fetches:
+            self.fetching += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                # the slot is handed over by _release, ``fetching`` stays the same
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self._release()
+                raise
+        FETCHES_IN_FLIGHT.set(self.fetching)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.fetching -= 1
+        FETCHES_IN_FLIGHT.set(self.fetching)
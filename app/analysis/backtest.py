@@ -0,0 +1,255 @@
+# app/analysis/backtest.py
+"""
+Vectorised backtester for the rule-based signals.
+
+``signal_from_indicators`` ("ind"), ``simple_ta_signal`` ("ta") and
+``FastPredictionEngine._combine_signals`` ("fast") are re-expressed as array
+rules over a FeatureFrame, so one pass scores every bar of every history.
+A signal at bar t is judged like a binary option: it wins when the close
+``expiry`` bars later moved its way.
+
+Запуск: python -m app.analysis.backtest [--csv EURUSD_5m.csv ...] [--pairs 70 --bars 20000]
+"""
+from __future__ import annotations
+import argparse
+import os
+import time
+from typing import Callable, Dict, List, Mapping, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import kernels
+from .features import FeatureFrame
+from .fast_prediction import PATTERN_STRENGTH
+from ..utils.dataframe_fix import fix_ohlc_columns
+from ..utils.timeframes import TIMEFRAME_SECONDS, tf_seconds
+
+DEFAULT_EXPIRIES = (1, 2, 3, 5)
+
+
+def _shift(x: np.ndarray, k: int) -> np.ndarray:
+    out = np.full(x.shape, np.nan)
+    out[..., k:] = x[..., :-k]
+    return out
+
+
+# --- rules: score for every bar ------------------------------------------------
+
+def indicator_scores(f: FeatureFrame) -> np.ndarray:
+    """Final score of ``signal_from_indicators`` per bar (-3..3, sign = direction)"""
+    p = f.params
+    # compute_indicators rounds before the decision sees the values
+    rsi = np.round(f["rsi"], 2)
+    ema_fast = np.round(f["ema_fast"], 6)
+    ema_slow = np.round(f["ema_slow"], 6)
+    score = np.where(rsi < p.rsi_oversold, 2, np.where(rsi > p.rsi_overbought, -2, 0))
+    score += np.where(ema_fast > ema_slow, 1, np.where(ema_fast < ema_slow, -1, 0))
+    # compute_indicators needs two bars
+    return np.where(f["nobs"] >= 2, score, 0)
+
+
+def ta_scores(f: FeatureFrame) -> np.ndarray:
+    """Score of ``simple_ta_signal`` per bar (sign = direction)"""
+    c = f["close"]
+    c1, c2 = _shift(c, 1), _shift(c, 2)
+    score = np.select(
+        [(c > c1) & (c1 > c2), (c < c1) & (c1 < c2), c > c2, c < c2],
+        [2, -2, 1, -1],
+        0,
+    )
+
+    high_20, low_20 = f["rolling_high_20"], f["rolling_low_20"]
+    range_size = high_20 - low_20
+    with np.errstate(invalid="ignore", divide="ignore"):
+        position = (c - low_20) / range_size
+    score += np.where(range_size > 0, np.where(position > 0.8, -1, np.where(position < 0.2, 1, 0)), 0)
+
+    ma_20 = f["sma_20"]
+    score += np.where(c > ma_20 * 1.02, 1, np.where(c < ma_20 * 0.98, -1, 0))
+
+    masks = f["patterns"]
+    score += masks["long_lower_shadow"].astype(int) - masks["long_upper_shadow"].astype(int)
+    # simple_ta_signal holds below 20 bars
+    return np.where(f["nobs"] >= 20, score, 0)
+
+
+def fast_scores(f: FeatureFrame) -> np.ndarray:
+    """0..100 score of ``FastPredictionEngine._combine_signals`` per bar"""
+    # the engine's own nodes; a NaN RSI moves nothing, as in _combine_signals
+    rsi = f["rsi_sma_14"]
+    score = 50.0 + np.where(rsi > 70, -20, np.where(rsi < 30, 20, 0))
+    score += 15 * f["fast_trend"]
+
+    masks = f["patterns"]
+    strength = np.select([masks[name] for name, _ in PATTERN_STRENGTH], [v for _, v in PATTERN_STRENGTH], 50)
+    score = (score + strength) / 2
+
+    volume = f["volume"]
+    if volume is not None:
+        seen = np.cumsum(volume == volume, axis=-1)
+        avg = np.cumsum(np.nan_to_num(volume), axis=-1) / np.maximum(seen, 1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ratio = np.where(avg > 0, volume / avg, 1)
+        score = np.where(ratio > 1.5, score * 1.2, score)
+    return np.where(f["nobs"] >= 1, score, 50.0)
+
+
+def _fast_direction(score: np.ndarray) -> np.ndarray:
+    return np.where(score > 55, 1, np.where(score < 45, -1, 0))
+
+
+# name -> (scores, score -> direction in {-1, 0, 1})
+RULES: Dict[str, Tuple[Callable[[FeatureFrame], np.ndarray], Callable[[np.ndarray], np.ndarray]]] = {
+    "ind": (indicator_scores, np.sign),
+    "ta": (ta_scores, np.sign),
+    "fast": (fast_scores, _fast_direction),
+}
+
+
+def directions(f: FeatureFrame, rule: str) -> np.ndarray:
+    """-1/0/+1 per bar for one rule"""
+    scores, to_direction = RULES[rule]
+    return to_direction(scores(f)).astype(np.int8)
+
+
+# --- scoring ----------------------------------------------------------------------
+
+def score_outcomes(direction: np.ndarray, close: np.ndarray, expiry: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(signals, wins, ties) along the last axis for one expiry in bars"""
+    return _score(direction, _moves(close, expiry), expiry)
+
+
+def _moves(close: np.ndarray, expiry: int) -> np.ndarray:
+    # -1/0/+1 move from bar t to t+expiry, NaN where it is unknown
+    return np.sign(close[..., expiry:] - close[..., :-expiry])
+
+
+def _score(direction: np.ndarray, move: np.ndarray, expiry: int):
+    d = direction[..., :move.shape[-1]]
+    taken = (d != 0) & (move == move)
+    signals = taken.sum(axis=-1)
+    wins = (taken & (move == d)).sum(axis=-1)
+    ties = (taken & (move == 0)).sum(axis=-1)
+    return signals, wins, ties
+
+
+def backtest_frame(
+    f: FeatureFrame,
+    rules: Sequence[str] = tuple(RULES),
+    expiries: Sequence[int] = DEFAULT_EXPIRIES,
+) -> Dict[Tuple[str, int], Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """{(rule, expiry): (signals, wins, ties)}; arrays have one entry per row of the frame"""
+    close = f["close"]
+    moves = {e: _moves(close, e) for e in expiries}
+    out = {}
+    for rule in rules:
+        d = directions(f, rule)
+        for expiry in expiries:
+            out[(rule, expiry)] = _score(d, moves[expiry], expiry)
+    return out
+
+
+def run_backtest(
+    histories: Mapping[Tuple[str, str], pd.DataFrame],
+    rules: Sequence[str] = tuple(RULES),
+    expiries: Sequence[int] = DEFAULT_EXPIRIES,
+) -> Tuple[pd.DataFrame, Dict[str, float]]:
+    """
+    Backtest every (pair, timeframe) history.  Histories are stacked into one
+    left-padded matrix so the whole run is a single batched pass.
+    Returns the per pair/timeframe/rule/expiry report and throughput stats.
+    """
+    keys = list(histories)
+    frames = [FeatureFrame.of(histories[k]) for k in keys]
+    bars = sum(len(fr) for fr in frames)
+
+    start = time.perf_counter()
+    columns = {name: kernels.stack_series([fr[name] for fr in frames]) for name in ("open", "high", "low", "close")}
+    if all(fr["volume"] is not None for fr in frames):
+        columns["volume"] = kernels.stack_series([fr["volume"] for fr in frames])
+    batch = FeatureFrame(**columns)
+    results = backtest_frame(batch, rules, expiries)
+    elapsed = time.perf_counter() - start
+
+    rows = []
+    for (rule, expiry), (signals, wins, ties) in results.items():
+        for i, (pair, timeframe) in enumerate(keys):
+            n = int(signals[i])
+            rows.append({
+                "pair": pair,
+                "timeframe": timeframe,
+                "rule": rule,
+                "expiry": expiry,
+                "signals": n,
+                "wins": int(wins[i]),
+                "ties": int(ties[i]),
+                "hit_rate": wins[i] / n if n else float("nan"),
+            })
+    report = pd.DataFrame(rows)
+    stats = {"bars": bars, "seconds": elapsed, "bars_per_second": bars / elapsed if elapsed else float("inf")}
+    return report, stats
+
+
+# --- histories ---------------------------------------------------------------------
+
+def synthetic_history(symbol: str, timeframe: str, bars: int, seed: int = 0, base: float = 1.0) -> pd.DataFrame:
+    """Random-walk candles, vectorised (the bot's generator builds them row by row)"""
+    rng = np.random.default_rng(seed)
+    vol = 0.002 if "JPY" in symbol else 0.0008
+    close = base * np.exp(np.cumsum(rng.normal(0, vol, bars)))
+    open_ = np.concatenate([[base], close[:-1]])
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, vol * 0.3, bars)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, vol * 0.3, bars)))
+    index = pd.date_range(end=pd.Timestamp.now(tz="UTC").floor("min"), periods=bars,
+                          freq=pd.Timedelta(seconds=tf_seconds(timeframe)))
+    return pd.DataFrame({"Open": open_, "High": high, "Low": low, "Close": close}, index=index)
+
+
+def load_history(path: str) -> Tuple[Tuple[str, str], pd.DataFrame]:
+    """
+    Imported candles from CSV.  The file name gives the key
+    (``EURUSD_5m.csv`` -> ("EURUSD", "5m")); columns may be in any case.
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    pair, _, timeframe = name.partition("_")
+    df = fix_ohlc_columns(pd.read_csv(path))
+    return (pair, timeframe if timeframe in TIMEFRAME_SECONDS else "1m"), df
+
+
+def summarize(report: pd.DataFrame) -> pd.DataFrame:
+    """Hit rate per rule and expiry over all pairs"""
+    g = report.groupby(["rule", "expiry"])[["signals", "wins", "ties"]].sum()
+    g["hit_rate"] = g["wins"] / g["signals"].where(g["signals"] > 0)
+    return g
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="Backtest the bot's signal rules")
+    parser.add_argument("--csv", nargs="*", default=[], help="imported histories, e.g. EURUSD_5m.csv")
+    parser.add_argument("--pairs", type=int, default=70, help="synthetic pairs when no CSV is given")
+    parser.add_argument("--bars", type=int, default=20000, help="bars per synthetic pair")
+    parser.add_argument("--timeframe", default="1m")
+    parser.add_argument("--expiries", default="1,2,3,5")
+    parser.add_argument("--out", default="", help="write the per-pair report to this CSV")
+    args = parser.parse_args(argv)
+
+    if args.csv:
+        histories = dict(load_history(p) for p in args.csv)
+    else:
+        histories = {
+            (f"SYN{i:02d}", args.timeframe): synthetic_history(f"SYN{i:02d}", args.timeframe, args.bars, seed=i)
+            for i in range(args.pairs)
+        }
+    expiries = [int(e) for e in args.expiries.split(",")]
+
+    report, stats = run_backtest(histories, expiries=expiries)
+    print(summarize(report).to_string())
+    print(f"\n{stats['bars']:,} bars in {stats['seconds']:.2f}s "
+          f"({stats['bars_per_second'] / 1e6:.2f}M bars/s, backend {kernels.backend()})")
+    if args.out:
+        report.to_csv(args.out, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# app/analysis/confluence.py
+"""
+Multi-timeframe confluence from one base series.
+
+Instead of fetching and analysing 1m, 5m and 15m separately, the base
+(lowest) timeframe is fetched once with enough history, resampled to the
+higher timeframes in a few vectorised reductions, and all timeframes go
+through the indicator pipeline as rows of one batched FeatureFrame.  The
+per-timeframe decisions are then combined into a single verdict.
+"""
+from __future__ import annotations
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from . import kernels
+from .decision import signal_from_indicators
+from .features import FeatureFrame
+from .params import IndicatorParams, for_timeframe
+from ..utils.candles import CandleSeries
+from ..utils.timeframes import tf_seconds
+
+LADDER = ("1m", "5m", "15m", "30m", "1h")
+# bars the highest timeframe needs for MACD(12, 26, 9) to settle
+MIN_BARS = 60
+
+ACTION_SCORE = {"STRONG BUY": 2, "BUY": 1, "HOLD": 0, "SELL": -1, "STRONG SELL": -2}
+
+
+def ladder(base: str, size: int = 3) -> List[str]:
+    """``base`` plus higher timeframes, each a whole multiple of the base and >= 3x the previous one"""
+    sec = tf_seconds(base)
+    out = [base]
+    for tf in LADDER:
+        step = tf_seconds(tf)
+        if len(out) < size and step % sec == 0 and step >= 3 * tf_seconds(out[-1]):
+            out.append(tf)
+    return out
+
+
+def base_bars(timeframes: Sequence[str], min_bars: int = MIN_BARS) -> int:
+    """History length of the base timeframe so the top one gets ``min_bars`` bars"""
+    base = tf_seconds(timeframes[0])
+    top = max(tf_seconds(tf) for tf in timeframes)
+    return min_bars * (top // base) + top // base
+
+
+def resample(candles: CandleSeries, base: str, timeframe: str) -> CandleSeries:
+    """Aggregate base candles into ``timeframe`` bars (epoch-aligned; by count when there are no times)"""
+    n = len(candles)
+    if timeframe == base or not n:
+        return candles
+    if candles.has_times:
+        ms = tf_seconds(timeframe) * 1000
+        bucket = candles.ts // ms
+    else:
+        ratio = max(1, tf_seconds(timeframe) // tf_seconds(base))
+        # align buckets on the last bar so the newest bar is always complete
+        bucket = (np.arange(n) + (-n) % ratio) // ratio
+        ms = None
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], n] - 1
+    return CandleSeries(
+        bucket[starts] * ms if ms else bucket[starts],
+        candles.open[starts],
+        np.maximum.reduceat(candles.high, starts),
+        np.minimum.reduceat(candles.low, starts),
+        candles.close[ends],
+        np.add.reduceat(candles.volume, starts) if candles.has_volume else None,
+    )
+
+
+def analyze(candles, base: str, timeframes: Optional[Sequence[str]] = None,
+            params_for: Callable[[str], IndicatorParams] = for_timeframe) -> Dict:
+    """
+    Indicator signal per timeframe plus a confluence verdict.
+    Timeframes sharing an IndicatorParams set are evaluated as one batch.
+    Returns {"verdict", "agreement", "timeframes": [{"timeframe", "action", "bars", "notes", "indicators"}]}.
+    """
+    candles = CandleSeries.from_frame(candles)
+    timeframes = list(timeframes or ladder(base))
+    series = [resample(candles, base, tf) for tf in timeframes]
+
+    groups: Dict[IndicatorParams, List[int]] = {}
+    for i, tf in enumerate(timeframes):
+        groups.setdefault(params_for(tf), []).append(i)
+
+    rows: List[Optional[dict]] = [None] * len(timeframes)
+    for params, members in groups.items():
+        batch = FeatureFrame(
+            params=params,
+            **{col: kernels.stack_series([getattr(series[i], col) for i in members])
+               for col in ("open", "high", "low", "close")},
+        )
+        for i, ind in zip(members, batch["indicator_rows"]):
+            if len(series[i]) < 2:
+                action, notes, ind = "HOLD", ["Insufficient data for analysis"], {}
+            else:
+                action, notes = signal_from_indicators(batch, ind)
+            rows[i] = {"timeframe": timeframes[i], "action": action, "bars": len(series[i]),
+                       "notes": notes, "indicators": ind}
+
+    verdict, agreement = combine([r["action"] for r in rows])
+    return {"verdict": verdict, "agreement": agreement, "timeframes": rows}
+
+
+def combine(actions: Sequence[str]) -> Tuple[str, float]:
+    """
+    Verdict over per-timeframe actions: every timeframe on the same side is a
+    strong signal, a net lean is a plain one.  Agreement is the share of
+    timeframes on the verdict's side.
+    """
+    scores = np.array([ACTION_SCORE.get(a, 0) for a in actions])
+    sides = np.sign(scores)
+    total = scores.sum()
+    if len(sides) and (sides > 0).all():
+        verdict = "STRONG BUY"
+    elif len(sides) and (sides < 0).all():
+        verdict = "STRONG SELL"
+    elif total > 0:
+        verdict = "BUY"
+    elif total < 0:
+        verdict = "SELL"
+    else:
+        verdict = "HOLD"
+    side = int(np.sign(ACTION_SCORE[verdict]))
+    agreement = float((sides == side).mean()) if len(sides) else 0.0
+    return verdict, agreement
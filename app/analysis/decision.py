@@ -4,19 +4,25 @@ Decision making based on indicators and technical analysis
 All messages in English
 """
 import pandas as pd
-from typing import Tuple, List
+from typing import Tuple, List, Optional
 
-def signal_from_indicators(df: pd.DataFrame, ind: dict) -> Tuple[str, List[str]]:
-    """Generate signal from indicators"""
+from .features import FeatureFrame
+from .params import IndicatorParams, for_timeframe
+
+def signal_from_indicators(df: pd.DataFrame, ind: dict,
+                           params: Optional[IndicatorParams] = None) -> Tuple[str, List[str]]:
+    """Generate signal from indicators (RSI levels from the frame's IndicatorParams)"""
     action = "HOLD"
     notes = []
+    if params is None:
+        params = df.params if isinstance(df, FeatureFrame) else for_timeframe()
     
     # RSI analysis
     rsi = ind.get('RSI', 50)
-    if rsi > 70:
+    if rsi > params.rsi_overbought:
         notes.append("RSI overbought")
         action = "SELL"
-    elif rsi < 30:
+    elif rsi < params.rsi_oversold:
         notes.append("RSI oversold")
         action = "BUY"
     elif rsi > 60:
@@ -93,10 +99,10 @@ def simple_ta_signal(df: pd.DataFrame) -> Tuple[str, List[str]]:
     
     notes = []
     score = 0
+    f = FeatureFrame.of(df)
     
     # Get recent prices
-    recent = df.tail(10)
-    closes = recent['Close'].values
+    closes = f["close"][-10:]
     
     # 1. Trend Analysis (Improved messages)
     if len(closes) >= 3:
@@ -116,8 +122,8 @@ def simple_ta_signal(df: pd.DataFrame) -> Tuple[str, List[str]]:
             notes.append("Sideways consolidation")
     
     # 2. Support/Resistance Analysis
-    high_20 = df.tail(20)['High'].max()
-    low_20 = df.tail(20)['Low'].min()
+    high_20 = f["high_20"]
+    low_20 = f["low_20"]
     current = closes[-1]
     range_size = high_20 - low_20
     
@@ -134,8 +140,8 @@ def simple_ta_signal(df: pd.DataFrame) -> Tuple[str, List[str]]:
             notes.append("Price in middle of range")
     
     # 3. Volatility Analysis
-    volatility = df.tail(10)['Close'].std()
-    avg_price = df.tail(10)['Close'].mean()
+    volatility = f["std_10"]
+    avg_price = f["mean_10"]
     vol_ratio = (volatility / avg_price) * 100 if avg_price > 0 else 0
     
     if vol_ratio > 2:
@@ -146,8 +152,8 @@ def simple_ta_signal(df: pd.DataFrame) -> Tuple[str, List[str]]:
         notes.append("Normal market volatility")
     
     # 4. Moving Average Analysis
-    if len(df) >= 20:
-        ma_20 = df.tail(20)['Close'].mean()
+    if len(f) >= 20:
+        ma_20 = f["mean_20"]
         if current > ma_20 * 1.02:
             notes.append("Price significantly above MA20")
             score += 1
@@ -158,19 +164,15 @@ def simple_ta_signal(df: pd.DataFrame) -> Tuple[str, List[str]]:
             notes.append("Price near MA20")
     
     # 5. Pattern Recognition
-    if len(recent) >= 3:
+    if len(closes) >= 3:
+        last = {name: mask[-1] for name, mask in f["patterns"].items()}
         # Hammer pattern
-        last_candle = recent.iloc[-1]
-        body = abs(last_candle['Close'] - last_candle['Open'])
-        lower_shadow = min(last_candle['Open'], last_candle['Close']) - last_candle['Low']
-        
-        if lower_shadow > body * 2:
+        if last["long_lower_shadow"]:
             notes.append("Bullish hammer pattern detected")
             score += 1
         
         # Shooting star
-        upper_shadow = last_candle['High'] - max(last_candle['Open'], last_candle['Close'])
-        if upper_shadow > body * 2:
+        if last["long_upper_shadow"]:
             notes.append("Bearish shooting star pattern")
             score -= 1
     
@@ -6,8 +6,19 @@ from datetime import datetime
 import pandas as pd
 from typing import Optional, Tuple, Dict, Any
 
+from .features import FeatureFrame
+
 logger = logging.getLogger(__name__)
 
+# Паттерн последнего бара -> сила сигнала (по приоритету проверки).
+# Остальные маски patterns.scan сюда не входят, пока их сила не подтверждена бэктестом.
+PATTERN_STRENGTH = (
+    ("hammer", 70),
+    ("shooting_star", 30),
+    ("bullish_engulfing", 80),
+    ("bearish_engulfing", 20),
+)
+
 class FastPredictionEngine:
     """Оптимизированный движок для быстрых прогнозов"""
     
@@ -29,16 +40,19 @@ class FastPredictionEngine:
         start_time = datetime.now()
         
         try:
+            # Общий набор признаков для всех анализов
+            frame = FeatureFrame.of(df)
+
             # Параллельный анализ
             tasks = []
             
             if mode == "ind":
-                tasks.append(self._analyze_indicators_fast(df))
-                tasks.append(self._analyze_patterns_fast(df))
-                tasks.append(self._analyze_volume_fast(df))
+                tasks.append(self._analyze_indicators_fast(frame))
+                tasks.append(self._analyze_patterns_fast(frame))
+                tasks.append(self._analyze_volume_fast(frame))
             else:
-                tasks.append(self._analyze_ta_fast(df))
-                tasks.append(self._analyze_support_resistance_fast(df))
+                tasks.append(self._analyze_ta_fast(frame))
+                tasks.append(self._analyze_support_resistance_fast(frame))
             
             # Ждем все анализы параллельно
             results = await asyncio.gather(*tasks, return_exceptions=True)
@@ -49,8 +63,11 @@ class FastPredictionEngine:
                 patterns_result = results[1] if not isinstance(results[1], Exception) else {}
                 volume_result = results[2] if not isinstance(results[2], Exception) else {}
                 
-                # Комбинируем сигналы
+                # Комбинируем сигналы; обученная модель, если загружена, заменяет ручную формулу
                 signal = self._combine_signals(indicators_result, patterns_result, volume_result)
+                from . import scoring
+                if scoring.current() is not None:
+                    signal = scoring.score_label(float(scoring.score_frames([frame])[0]))
                 
                 # Форматируем прогноз
                 prediction = self._format_indicator_prediction(
@@ -89,82 +106,71 @@ class FastPredictionEngine:
             logger.error(f"Fast prediction error: {e}")
             return self._get_fallback_prediction(timeframe), {}
     
-    async def _analyze_indicators_fast(self, df: pd.DataFrame) -> Dict:
+    async def _analyze_indicators_fast(self, df) -> Dict:
         """Быстрый анализ индикаторов"""
         await asyncio.sleep(0.1)  # Симуляция async операции
         
         try:
-            # Быстрые вычисления основных индикаторов
-            close = df['close'].values
+            f = FeatureFrame.of(df)
             
-            # RSI (упрощенный)
-            rsi = self._calculate_rsi_fast(close)
+            # RSI по скользящим средним приростов/падений (не Wilder)
+            rsi = float(f["rsi_sma_14"][-1])
             
-            # EMA
-            ema_fast = pd.Series(close).ewm(span=9).mean().iloc[-1]
-            ema_slow = pd.Series(close).ewm(span=21).mean().iloc[-1]
-            
-            # MACD
-            exp1 = pd.Series(close).ewm(span=12).mean()
-            exp2 = pd.Series(close).ewm(span=26).mean()
-            macd = exp1.iloc[-1] - exp2.iloc[-1]
+            # EMA и MACD как pandas ewm(span).mean() (adjust=True)
+            emas = f["ema_adjusted"]
+            ema_fast = emas[9][-1]
+            ema_slow = emas[21][-1]
+            macd = emas[12][-1] - emas[26][-1]
             
             return {
                 'RSI': rsi,
                 'EMA_fast': ema_fast,
                 'EMA_slow': ema_slow,
                 'MACD': macd,
-                'trend': 'UP' if ema_fast > ema_slow else 'DOWN'
+                'trend': 'UP' if f["fast_trend"][-1] > 0 else 'DOWN'
             }
         except Exception as e:
             logger.error(f"Indicator analysis error: {e}")
             return {}
     
-    async def _analyze_patterns_fast(self, df: pd.DataFrame) -> Dict:
-        """Быстрый поиск паттернов"""
+    async def _analyze_patterns_fast(self, df) -> Dict:
+        """Быстрый поиск паттернов (маски по всей истории, берём последний бар)"""
         await asyncio.sleep(0.1)
         
         try:
-            # Упрощенный поиск основных паттернов
-            last_candles = df.tail(5)
+            f = FeatureFrame.of(df)
+            masks = f["patterns"]
             
-            # Проверяем простые паттерны
             pattern = "NEUTRAL"
             strength = 50
+            for name, value in PATTERN_STRENGTH:
+                if masks[name][-1]:
+                    pattern = name.upper()
+                    strength = value
+                    break
             
-            # Бычий молот
-            if self._is_hammer(last_candles.iloc[-1]):
-                pattern = "HAMMER"
-                strength = 70
-            # Медвежья звезда
-            elif self._is_shooting_star(last_candles.iloc[-1]):
-                pattern = "SHOOTING_STAR"
-                strength = 30
-            # Бычье поглощение
-            elif self._is_bullish_engulfing(last_candles.iloc[-2:]):
-                pattern = "BULLISH_ENGULFING"
-                strength = 80
-            # Медвежье поглощение
-            elif self._is_bearish_engulfing(last_candles.iloc[-2:]):
-                pattern = "BEARISH_ENGULFING"
-                strength = 20
-            
-            return {
+            result = {
                 'pattern': pattern,
                 'strength': strength
             }
+            stats = f["pattern_stats"].get(pattern.lower())
+            if stats and stats['count']:
+                result['hit_rate'] = float(stats['hit_rate'])
+                result['occurrences'] = int(stats['count'])
+            return result
         except Exception as e:
             logger.error(f"Pattern analysis error: {e}")
             return {}
     
-    async def _analyze_volume_fast(self, df: pd.DataFrame) -> Dict:
+    async def _analyze_volume_fast(self, df) -> Dict:
         """Быстрый анализ объема"""
         await asyncio.sleep(0.1)
         
         try:
-            if 'volume' in df.columns:
-                avg_volume = df['volume'].mean()
-                last_volume = df['volume'].iloc[-1]
+            volume = FeatureFrame.of(df)["volume"]
+            if volume is not None:
+                avg_volume = volume.mean()
+                last_volume = volume[-1]
                 volume_ratio = last_volume / avg_volume if avg_volume > 0 else 1
                 
                 return {
@@ -177,20 +183,18 @@ class FastPredictionEngine:
         except:
             return {'signal': 'NO_DATA'}
     
-    async def _analyze_ta_fast(self, df: pd.DataFrame) -> Dict:
+    async def _analyze_ta_fast(self, df) -> Dict:
         """Быстрый технический анализ"""
         await asyncio.sleep(0.1)
         
         try:
-            close = df['close'].values
-            high = df['high'].values
-            low = df['low'].values
+            f = FeatureFrame.of(df)
             
             # Определяем тренд
-            sma_20 = pd.Series(close).rolling(20).mean().iloc[-1]
-            sma_50 = pd.Series(close).rolling(50).mean().iloc[-1] if len(close) > 50 else sma_20
+            sma_20 = f["sma_20"][-1]
+            sma_50 = f["sma_50"][-1] if len(f) > 50 else sma_20
             
-            current_price = close[-1]
+            current_price = f["close"][-1]
             
             if current_price > sma_20 > sma_50:
                 trend = "STRONG_UP"
@@ -219,77 +223,23 @@ class FastPredictionEngine:
             logger.error(f"TA analysis error: {e}")
             return {'signal': 'HOLD'}
     
-    async def _analyze_support_resistance_fast(self, df: pd.DataFrame) -> Dict:
+    async def _analyze_support_resistance_fast(self, df) -> Dict:
         """Быстрый поиск уровней поддержки/сопротивления"""
         await asyncio.sleep(0.1)
         
         try:
-            high = df['high'].values
-            low = df['low'].values
-            close = df['close'].values
+            f = FeatureFrame.of(df)
             
             # Простой метод: последние экстремумы
-            resistance = max(high[-20:]) if len(high) > 20 else max(high)
-            support = min(low[-20:]) if len(low) > 20 else min(low)
-            
-            pivot = (high[-1] + low[-1] + close[-1]) / 3
-            
             return {
-                'support': support,
-                'resistance': resistance,
-                'pivot': pivot,
-                'current': close[-1]
+                'support': f["low_20"],
+                'resistance': f["high_20"],
+                'pivot': f["pivot"],
+                'current': f["close"][-1]
             }
         except:
             return {}
     
-    def _calculate_rsi_fast(self, prices, period=14):
-        """Упрощенный расчет RSI"""
-        try:
-            deltas = pd.Series(prices).diff()
-            gain = deltas.where(deltas > 0, 0).rolling(period).mean()
-            loss = -deltas.where(deltas < 0, 0).rolling(period).mean()
-            rs = gain.iloc[-1] / loss.iloc[-1] if loss.iloc[-1] != 0 else 100
-            return 100 - (100 / (1 + rs))
-        except:
-            return 50
-    
-    def _is_hammer(self, candle):
-        """Проверка на паттерн молот"""
-        body = abs(candle['close'] - candle['open'])
-        lower_shadow = min(candle['open'], candle['close']) - candle['low']
-        upper_shadow = candle['high'] - max(candle['open'], candle['close'])
-        
-        return lower_shadow > body * 2 and upper_shadow < body * 0.3
-    
-    def _is_shooting_star(self, candle):
-        """Проверка на паттерн падающая звезда"""
-        body = abs(candle['close'] - candle['open'])
-        upper_shadow = candle['high'] - max(candle['open'], candle['close'])
-        lower_shadow = min(candle['open'], candle['close']) - candle['low']
-        
-        return upper_shadow > body * 2 and lower_shadow < body * 0.3
-    
-    def _is_bullish_engulfing(self, candles):
-        """Проверка на бычье поглощение"""
-        if len(candles) < 2:
-            return False
-        prev, curr = candles.iloc[0], candles.iloc[1]
-        return (prev['close'] < prev['open'] and 
-                curr['close'] > curr['open'] and
-                curr['close'] > prev['open'] and
-                curr['open'] < prev['close'])
-    
-    def _is_bearish_engulfing(self, candles):
-        """Проверка на медвежье поглощение"""
-        if len(candles) < 2:
-            return False
-        prev, curr = candles.iloc[0], candles.iloc[1]
-        return (prev['close'] > prev['open'] and 
-                curr['close'] < curr['open'] and
-                curr['close'] < prev['open'] and
-                curr['open'] > prev['close'])
-    
     def _combine_signals(self, indicators, patterns, volume):
         """Комбинирование сигналов для финального решения"""
         score = 50  # Нейтральный старт
@@ -351,11 +301,23 @@ class FastPredictionEngine:
                 'HAMMER': 'Бычий молот',
                 'SHOOTING_STAR': 'Падающая звезда',
                 'BULLISH_ENGULFING': 'Бычье поглощение',
-                'BEARISH_ENGULFING': 'Медвежье поглощение'
+                'BEARISH_ENGULFING': 'Медвежье поглощение',
+                'MORNING_STAR': 'Утренняя звезда',
+                'EVENING_STAR': 'Вечерняя звезда',
+                'THREE_WHITE_SOLDIERS': 'Три белых солдата',
+                'THREE_BLACK_CROWS': 'Три черные вороны',
+                'BULLISH_HARAMI': 'Бычий харами',
+                'BEARISH_HARAMI': 'Медвежий харами',
+                'DOJI': 'Доджи'
             }
             pattern = patterns.get('pattern', 'NEUTRAL')
             lines.append(f"• {pattern_names.get(pattern, pattern)}")
             lines.append(f"• Сила: {patterns.get('strength', 50)}%")
+            if patterns.get('occurrences'):
+                lines.append(
+                    f"• Отработал в истории: {patterns['hit_rate'] * 100:.0f}% "
+                    f"({patterns['occurrences']} раз)"
+                )
             lines.append("")
         
         if volume and volume.get('signal') != 'NO_DATA':
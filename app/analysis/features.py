@@ -0,0 +1,397 @@
+# app/analysis/features.py
+"""
+Shared feature frame: every derived series the decision functions need,
+computed lazily and at most once per candle history.
+
+Features are nodes of a small DAG registered with ``@feature(name, *deps)``;
+asking a frame for a node computes its dependencies first and memoises
+everything on the way, so e.g. the EMA 9/21 pass is shared by the indicator
+mode, the fast engine and the TA mode.  Arrays may be 1-D (one pair) or
+(pairs x bars) — the nodes work along the last axis.
+
+Windowed families (``ema_9``, ``rsi_14``, ``sma_50`` ...) are registered
+once with ``@family(prefix, *deps)`` and resolved for any window.  Node
+dependencies may name a window through the frame's ``IndicatorParams``
+(``"rsi_{rsi_window}"``), which is how the tunable indicators are wired.
+"""
+from __future__ import annotations
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import kernels, patterns
+from ..utils.candles import CandleSeries
+from . import params as indicator_params
+from .params import IndicatorParams
+
+_NODES: Dict[str, Tuple[Tuple[str, ...], Callable[..., Any]]] = {}
+_FAMILIES: Dict[str, Tuple[Tuple[str, ...], Callable[..., Any]]] = {}
+
+BASE_COLUMNS = ("open", "high", "low", "close", "volume")
+
+
+def feature(name: str, *deps: str):
+    """Register a feature node computed from ``deps``"""
+    def register(func):
+        _NODES[name] = (deps, func)
+        return func
+    return register
+
+
+def family(prefix: str, *deps: str):
+    """Register ``<prefix>_<window>`` nodes; ``func(*deps, window)``"""
+    def register(func):
+        _FAMILIES[prefix] = (deps, func)
+        return func
+    return register
+
+
+def _resolve(name: str) -> Tuple[Tuple[str, ...], Callable[..., Any]]:
+    try:
+        return _NODES[name]
+    except KeyError:
+        pass
+    prefix, _, window = name.rpartition("_")
+    if window.isdigit() and prefix in _FAMILIES:
+        deps, func = _FAMILIES[prefix]
+        return deps, lambda *args: func(*args, int(window))
+    raise KeyError(name)
+
+
+@lru_cache(maxsize=None)
+def _param_bound(name: str) -> bool:
+    """True when a node's value depends on the frame's IndicatorParams"""
+    if name == "params":
+        return True
+    if name in BASE_COLUMNS:
+        return False
+    try:
+        deps, _ = _resolve(name)
+    except KeyError:
+        return False  # not a node: a value handed in with ``provide`` (e.g. ``levels``)
+    return any("{" in d or _param_bound(d) for d in deps)
+
+
+def _column(df: pd.DataFrame, name: str):
+    if isinstance(df, CandleSeries):
+        return df.column(name)
+    for col in (name.capitalize(), name):
+        if col in df.columns:
+            return kernels.as_float_array(df[col].to_numpy())
+    return None
+
+
+def bar_stamp(df) -> str:
+    """Identity of the last bar: timestamp (or length) plus last close"""
+    if isinstance(df, FeatureFrame):
+        return df.stamp
+    if isinstance(df, CandleSeries):
+        return f"{df.ts[-1]}_{df.close[-1]}" if len(df) else ""
+    if "timestamp" in df.columns:
+        ts = df["timestamp"].iloc[-1]
+    elif isinstance(df.index, pd.DatetimeIndex):
+        ts = df.index[-1]
+    else:
+        ts = len(df)
+    close = _column(df, "close")
+    return f"{ts}_{close[-1] if close is not None and len(close) else ''}"
+
+
+class FeatureFrame:
+    """Lazily evaluated feature DAG over one OHLC history (or a batch of them)"""
+
+    def __init__(self, close, open=None, high=None, low=None, volume=None, stamp: str = "",
+                 params: IndicatorParams | None = None):
+        close = kernels.as_float_array(close)
+        # parameter-free values, shared with every with_params() view of this history
+        self._shared: Dict[str, Any] = {
+            "close": close,
+            "open": close if open is None else kernels.as_float_array(open),
+            "high": close if high is None else kernels.as_float_array(high),
+            "low": close if low is None else kernels.as_float_array(low),
+            "volume": None if volume is None else kernels.as_float_array(volume),
+        }
+        # values that depend on this frame's IndicatorParams
+        self._bound: Dict[str, Any] = {"params": params or indicator_params.for_timeframe()}
+        self.stamp = stamp
+
+    @classmethod
+    def of(cls, df, params: IndicatorParams | None = None) -> "FeatureFrame":
+        """Frame for a CandleSeries or a DataFrame with Open/High/Low/Close (any case); frames pass through"""
+        if isinstance(df, cls):
+            return df if params is None else df.with_params(params)
+        cols = {name: _column(df, name) for name in BASE_COLUMNS}
+        if cols["close"] is None:
+            raise KeyError("Close")
+        return cls(stamp=bar_stamp(df), params=params, **cols)
+
+    def with_params(self, params: IndicatorParams) -> "FeatureFrame":
+        """
+        Same history under other parameters.  Parameter-free features are
+        shared both ways: whatever either frame computes (``rsi_10``,
+        ``ema_34`` ...) the other reuses.
+        """
+        if params == self.params:
+            return self
+        other = FeatureFrame.__new__(FeatureFrame)
+        other._shared = self._shared
+        other._bound = {"params": params}
+        other.stamp = self.stamp
+        return other
+
+    def provide(self, **values) -> "FeatureFrame":
+        """Pre-fill nodes with values maintained elsewhere (e.g. incremental level trackers)"""
+        for name, value in values.items():
+            self._store(name, value)
+        return self
+
+    def _store(self, name: str, value: Any):
+        (self._bound if _param_bound(name) else self._shared)[name] = value
+
+    @property
+    def params(self) -> IndicatorParams:
+        return self._bound["params"]
+
+    def __len__(self) -> int:
+        return self._shared["close"].shape[-1]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._bound or name in self._shared
+
+    def __getitem__(self, name: str):
+        for values in (self._bound, self._shared):
+            try:
+                return values[name]
+            except KeyError:
+                pass
+        deps, func = _resolve(name)
+        p = self._bound["params"]
+        value = func(*(self[d.format_map(p.__dict__) if "{" in d else d] for d in deps))
+        self._store(name, value)
+        return value
+
+    @property
+    def indicators(self) -> dict:
+        """Same dict as ``compute_indicators`` for a single-pair frame"""
+        return self["indicator_rows"][0]
+
+
+# --- moving averages -------------------------------------------------------
+
+@feature("nobs", "close")
+def _nobs(close):
+    return np.cumsum(close == close, axis=-1)
+
+
+@feature("ema_raw", "close")
+def _ema_raw(close):
+    # One stacked pass; min_periods masking is applied per consumer below
+    spans = (9, 21, 12, 26)
+    return dict(zip(spans, kernels.ema_many(close, spans, min_periods=1)))
+
+
+@feature("ema_adjusted", "close")
+def _ema_adjusted(close):
+    # pandas' default ewm(span).mean() (adjust=True), the FastPredictionEngine's EMA
+    return {span: kernels.ema_adjusted(close, span) for span in (9, 21, 12, 26)}
+
+
+@feature("fast_trend", "ema_adjusted")
+def _fast_trend(emas):
+    # FastPredictionEngine's trend: +1 when EMA 9 is above EMA 21, else -1
+    return np.where(emas[9] > emas[21], 1, -1)
+
+
+@family("ema", "ema_raw", "nobs", "close")
+def _ema(raw, nobs, close, span):
+    if span in raw:
+        return np.where(nobs >= span, raw[span], np.nan)
+    return kernels.ema(close, span)
+
+
+@family("rsi", "close")
+def _rsi(close, window):
+    return kernels.rsi(close, window)
+
+
+@family("rsi_sma", "close")
+def _rsi_sma(close, window):
+    return kernels.rsi_sma(close, window)
+
+
+@family("sma", "close")
+def _sma(close, window):
+    return kernels.sma(close, window)
+
+
+@family("rolling_std", "close")
+def _rolling_std(close, window):
+    return kernels.rolling_std(close, window)
+
+
+# --- tunable indicators (IndicatorParams) -------------------------------------
+
+@feature("rsi", "rsi_{rsi_window}")
+def _rsi_tuned(rsi):
+    return rsi
+
+
+@feature("ema_fast", "ema_{ema_fast}")
+def _ema_fast(ema):
+    return ema
+
+
+@feature("ema_slow", "ema_{ema_slow}")
+def _ema_slow(ema):
+    return ema
+
+
+@feature("macd", "ema_{macd_fast}", "ema_{macd_slow}")
+def _macd(ema_fast, ema_slow):
+    return ema_fast - ema_slow
+
+
+@feature("macd_signal", "macd", "params")
+def _macd_signal(macd, p):
+    return kernels.ema(macd, p.macd_signal)
+
+
+@feature("macd_hist", "macd", "macd_signal")
+def _macd_hist(macd, signal):
+    return macd - signal
+
+
+@feature("bb_mid", "sma_{bb_window}")
+def _bb_mid(sma):
+    return sma
+
+
+@feature("bb_upper", "bb_mid", "rolling_std_{bb_window}", "params")
+def _bb_upper(mid, std, p):
+    return mid + p.bb_dev * std
+
+
+@feature("bb_lower", "bb_mid", "rolling_std_{bb_window}", "params")
+def _bb_lower(mid, std, p):
+    return mid - p.bb_dev * std
+
+
+# --- last-bar statistics -----------------------------------------------------
+
+@feature("high_20", "high")
+def _high_20(high):
+    return high[..., -20:].max(axis=-1)
+
+
+@feature("low_20", "low")
+def _low_20(low):
+    return low[..., -20:].min(axis=-1)
+
+
+@feature("rolling_high_20", "high")
+def _rolling_high_20(high):
+    return kernels.rolling_max(high, 20, min_periods=1)
+
+
+@feature("rolling_low_20", "low")
+def _rolling_low_20(low):
+    return kernels.rolling_min(low, 20, min_periods=1)
+
+
+@feature("mean_10", "close")
+def _mean_10(close):
+    return close[..., -10:].mean(axis=-1)
+
+
+@feature("std_10", "close")
+def _std_10(close):
+    # pandas .std() semantics (ddof=1)
+    return close[..., -10:].std(axis=-1, ddof=1)
+
+
+@feature("mean_20", "close")
+def _mean_20(close):
+    return close[..., -20:].mean(axis=-1)
+
+
+@feature("pivot", "high", "low", "close")
+def _pivot(high, low, close):
+    return (high[..., -1] + low[..., -1] + close[..., -1]) / 3
+
+
+# --- candle anatomy ------------------------------------------------------------
+
+@feature("body", "open", "close")
+def _body(open_, close):
+    return np.abs(close - open_)
+
+
+@feature("upper_shadow", "open", "high", "close")
+def _upper_shadow(open_, high, close):
+    return high - np.maximum(open_, close)
+
+
+@feature("lower_shadow", "open", "low", "close")
+def _lower_shadow(open_, low, close):
+    return np.minimum(open_, close) - low
+
+
+@feature("patterns", "open", "high", "low", "close")
+def _patterns(open_, high, low, close):
+    return patterns.scan(open_, high, low, close)
+
+
+@feature("pattern_stats", "patterns", "close")
+def _pattern_stats(masks, close):
+    return patterns.hit_stats(masks, close, horizon=1)
+
+
+# --- indicator summary -----------------------------------------------------------
+
+def summarise_indicators(series: Dict[str, np.ndarray]) -> List[dict]:
+    """Last-bar indicator dicts (the ``compute_indicators`` format), one per row"""
+    ema_fast, ema_slow = series["EMA_fast"], series["EMA_slow"]
+    cross_up = (ema_fast[..., -2] < ema_slow[..., -2]) & (ema_fast[..., -1] > ema_slow[..., -1])
+    cross_down = (ema_fast[..., -2] > ema_slow[..., -2]) & (ema_fast[..., -1] < ema_slow[..., -1])
+
+    last = {key: np.atleast_1d(values[..., -1]).tolist() for key, values in series.items()}
+    up = np.atleast_1d(cross_up).tolist()
+    down = np.atleast_1d(cross_down).tolist()
+
+    return [
+        {
+            "RSI": round(last["RSI"][i], 2),
+            "EMA_fast": round(last["EMA_fast"][i], 6),
+            "EMA_slow": round(last["EMA_slow"][i], 6),
+            "EMA_cross_up": up[i],
+            "EMA_cross_down": down[i],
+            "MACD": round(last["MACD"][i], 6),
+            "MACD_signal": round(last["MACD_signal"][i], 6),
+            "MACD_hist": round(last["MACD_hist"][i], 6),
+            "BB_upper": round(last["BB_upper"][i], 6),
+            "BB_middle": round(last["BB_middle"][i], 6),
+            "BB_lower": round(last["BB_lower"][i], 6),
+        }
+        for i in range(len(up))
+    ]
+
+
+@feature(
+    "indicator_rows",
+    "rsi", "ema_fast", "ema_slow", "macd", "macd_signal", "macd_hist",
+    "bb_upper", "bb_mid", "bb_lower",
+)
+def _indicator_rows(rsi, ema_fast, ema_slow, macd, macd_signal, macd_hist, bb_upper, bb_mid, bb_lower):
+    return summarise_indicators({
+        "RSI": rsi,
+        "EMA_fast": ema_fast,
+        "EMA_slow": ema_slow,
+        "MACD": macd,
+        "MACD_signal": macd_signal,
+        "MACD_hist": macd_hist,
+        "BB_upper": bb_upper,
+        "BB_middle": bb_mid,
+        "BB_lower": bb_lower,
+    })
@@ -0,0 +1,356 @@
+# app/analysis/kernels.py
+"""
+Array-in/array-out NumPy indicator kernels.
+
+Every kernel works along the last axis, so the same call handles a single
+series (shape ``(bars,)``) or a whole batch of pairs (shape ``(pairs, bars)``).
+The recursions reproduce the pandas/ta arithmetic step by step, so results
+match ``ta`` bit for bit on EMA/RSI/MACD and to float rounding on the
+rolling-window kernels.
+
+The EWM recursion behind EMA, Wilder RSI and the MACD signal line can run
+on a numba-compiled backend (``INDICATOR_BACKEND=numba|auto``); the NumPy
+code below stays the fallback.
+"""
+from __future__ import annotations
+import logging
+import sys
+import time
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_backend: str | None = None
+_jit_ewm = None
+compile_seconds = 0.0
+
+
+def as_float_array(x) -> np.ndarray:
+    """Return ``x`` as a float64 ndarray without copying when possible"""
+    return np.asarray(x, dtype=np.float64)
+
+
+def stack_series(series: Sequence[Sequence[float]]) -> np.ndarray:
+    """
+    Stack series of different lengths into a (pairs x bars) matrix.
+    Shorter rows are left-padded with NaN, which every kernel treats as
+    "no data yet" — the padded row gives the same result as the raw one.
+    """
+    arrays = [as_float_array(s) for s in series]
+    width = max((len(a) for a in arrays), default=0)
+    out = np.full((len(arrays), width), np.nan)
+    for i, a in enumerate(arrays):
+        if len(a):
+            out[i, width - len(a):] = a
+    return out
+
+
+def _ewm_1d(values: np.ndarray, alpha: float, minp: int, adjust: bool = False) -> np.ndarray:
+    # Plain-float loop: for one short series it is much cheaper than
+    # running NumPy ufuncs on 1-element slices.
+    factor = 1.0 - alpha
+    new_wt = 1.0 if adjust else alpha
+    out = np.empty(len(values))
+    weighted = float("nan")
+    old_wt = 1.0
+    nobs = 0
+    nan = float("nan")
+    for i, cur in enumerate(values.tolist()):
+        is_obs = cur == cur
+        if weighted == weighted:
+            old_wt *= factor
+            if is_obs:
+                if weighted != cur:
+                    weighted = (old_wt * weighted + new_wt * cur) / (old_wt + new_wt)
+                old_wt = old_wt + new_wt if adjust else 1.0
+        elif is_obs:
+            weighted = cur
+        nobs += is_obs
+        out[i] = weighted if nobs >= minp else nan
+    return out
+
+
+def _ewm_2d(values: np.ndarray, alpha: np.ndarray, minp: np.ndarray, adjust: bool = False) -> np.ndarray:
+    # Time loop, vectorised across rows; alpha/minp are per-row arrays
+    rows, bars = values.shape
+    alpha = alpha[:, np.newaxis]
+    factor = 1.0 - alpha[:, 0]
+    valid = values == values
+    nobs = np.cumsum(valid, axis=1)
+    started = nobs > 0
+    out = np.empty((rows, bars))
+
+    if not adjust and np.array_equal(valid, started):
+        # No gaps after the first observation: the weight is always
+        # (1 - alpha) before the update, so most of the bookkeeping folds
+        # into constants.
+        scaled = alpha * values
+        denom = factor + alpha[:, 0]
+        first = bars - nobs[:, -1]
+        warmup = int(first.max(initial=0))
+        weighted = np.full(rows, np.nan)
+        blended = np.empty(rows)
+        for i in range(bars):
+            cur = values[:, i]
+            np.multiply(factor, weighted, out=blended)
+            blended += scaled[:, i]
+            blended /= denom
+            weighted = np.where(weighted != cur, blended, weighted)
+            if i <= warmup:
+                np.copyto(weighted, cur, where=(first == i))
+            out[:, i] = weighted
+    else:
+        new_wt = np.ones(rows) if adjust else alpha[:, 0]
+        weighted = np.full(rows, np.nan)
+        old_wt = np.ones(rows)
+        for i in range(bars):
+            cur = values[:, i]
+            is_obs = valid[:, i]
+            has = weighted == weighted
+            old_wt = np.where(has, old_wt * factor, old_wt)
+            step = has & is_obs
+            blended = (old_wt * weighted + new_wt * cur) / (old_wt + new_wt)
+            weighted = np.where(step & (weighted != cur), blended, weighted)
+            old_wt = np.where(step, old_wt + new_wt if adjust else 1.0, old_wt)
+            weighted = np.where(~has & is_obs, cur, weighted)
+            out[:, i] = weighted
+
+    out[nobs < minp[:, np.newaxis]] = np.nan
+    return out
+
+
+def use_backend(name: str) -> str:
+    """
+    Select the EWM backend: "numpy", "numba" or "auto" (numba if installed).
+    Compiles (or loads from cache) the numba kernels right away so the cost
+    is paid at startup; the time spent is kept in ``compile_seconds``.
+    Returns the backend actually in use.
+    """
+    global _backend, _jit_ewm, compile_seconds
+    name = (name or "auto").lower()
+    _backend, _jit_ewm = "numpy", None
+    if name in ("numba", "auto"):
+        start = time.perf_counter()
+        fresh = __name__ + "_jit" not in sys.modules
+        try:
+            from . import kernels_jit
+        except ImportError:
+            if name == "numba":
+                logger.warning("numba is not installed, indicator kernels fall back to NumPy")
+        else:
+            _backend, _jit_ewm = "numba", kernels_jit.ewm_rows
+            if fresh:
+                compile_seconds = time.perf_counter() - start
+                logger.info("Indicator kernels compiled with numba in %.2fs", compile_seconds)
+    return _backend
+
+
+def backend() -> str:
+    """Name of the EWM backend in use, resolving the configured one on first call"""
+    if _backend is None:
+        from ..config import INDICATOR_BACKEND
+        use_backend(INDICATOR_BACKEND)
+    return _backend
+
+
+def ewm_many(x, coms: Sequence[float], min_periods: Sequence[int]) -> List[np.ndarray]:
+    """
+    Several ``ewm_mean`` calls over the same input in one pass.
+    Batches are stacked so the time loop runs once for all of them.
+    """
+    values = as_float_array(x)
+    alphas = [1.0 / (1.0 + com) for com in coms]
+    minps = [max(int(m), 1) for m in min_periods]
+    if values.shape[-1] == 0:
+        # no bars: nothing to smooth, and reshape(-1, 0) cannot infer the rows
+        return [np.empty(values.shape) for _ in alphas]
+    if backend() == "numba":
+        flat = values.reshape(-1, values.shape[-1])
+        rows = flat.shape[0]
+        stacked = _jit_ewm(
+            np.ascontiguousarray(np.concatenate([flat] * len(alphas))),
+            np.repeat(np.asarray(alphas, dtype=np.float64), rows),
+            np.repeat(np.asarray(minps, dtype=np.int64), rows),
+        )
+        return [stacked[k * rows:(k + 1) * rows].reshape(values.shape) for k in range(len(alphas))]
+    if values.ndim == 1:
+        return [_ewm_1d(values, a, m) for a, m in zip(alphas, minps)]
+    flat = values.reshape(-1, values.shape[-1])
+    rows = flat.shape[0]
+    stacked = _ewm_2d(
+        np.concatenate([flat] * len(alphas)),
+        np.repeat(alphas, rows),
+        np.repeat(minps, rows),
+    )
+    return [stacked[k * rows:(k + 1) * rows].reshape(values.shape) for k in range(len(alphas))]
+
+
+def ewm_mean(x, com: float, min_periods: int = 0) -> np.ndarray:
+    """
+    Equivalent of ``Series.ewm(com=com, min_periods=min_periods, adjust=False).mean()``.
+    Leading NaNs are skipped, interior NaNs decay the weights like pandas does.
+    """
+    return ewm_many(x, [com], [min_periods])[0]
+
+
+def ewm_adjusted(x, com: float, min_periods: int = 0) -> np.ndarray:
+    """
+    Equivalent of ``Series.ewm(com=com, min_periods=min_periods).mean()``
+    with pandas' default ``adjust=True``: every bar so far weighted by
+    (1 - alpha)^age, no recursion seed.  NumPy backend only.
+    """
+    values = as_float_array(x)
+    alpha = 1.0 / (1.0 + com)
+    minp = max(int(min_periods), 1)
+    if values.ndim == 1:
+        return _ewm_1d(values, alpha, minp, adjust=True)
+    rows = int(np.prod(values.shape[:-1]))
+    flat = values.reshape(rows, values.shape[-1])
+    return _ewm_2d(flat, np.full(rows, alpha), np.full(rows, minp), adjust=True).reshape(values.shape)
+
+
+def _span_com(span: int) -> float:
+    return (span - 1) / 2.0
+
+
+def _wilder_com(window: int) -> float:
+    return 1.0 / (1.0 / window) - 1.0
+
+
+def ema(x, span: int, min_periods: int | None = None) -> np.ndarray:
+    """EMA as computed by ``ta.trend.EMAIndicator`` (min_periods defaults to span)"""
+    return ewm_mean(x, _span_com(span), span if min_periods is None else min_periods)
+
+
+def ema_adjusted(x, span: int, min_periods: int = 0) -> np.ndarray:
+    """EMA as ``Series.ewm(span=span).mean()`` computes it (adjust=True)"""
+    return ewm_adjusted(x, _span_com(span), min_periods)
+
+
+def ema_many(x, spans: Sequence[int], min_periods: int | None = None) -> List[np.ndarray]:
+    """Several EMAs of the same input in one pass"""
+    minps = list(spans) if min_periods is None else [min_periods] * len(spans)
+    return ewm_many(x, [_span_com(s) for s in spans], minps)
+
+
+def wilder(x, window: int, min_periods: int | None = None) -> np.ndarray:
+    """Wilder smoothing, i.e. ``ewm(alpha=1/window)``"""
+    return ewm_mean(x, _wilder_com(window), window if min_periods is None else min_periods)
+
+
+def rsi(close, window: int = 14) -> np.ndarray:
+    """RSI as computed by ``ta.momentum.RSIIndicator``"""
+    close = as_float_array(close)
+    diff = np.full(close.shape, np.nan)
+    diff[..., 1:] = close[..., 1:] - close[..., :-1]
+    up = np.where(diff > 0, diff, 0.0)
+    down = -np.where(diff < 0, diff, 0.0)
+    # NaN padding in front of a row must stay "no data", not zero moves
+    lead = np.cumsum(close == close, axis=-1) == 0
+    up[lead] = np.nan
+    down[lead] = np.nan
+    if close.ndim == 1:
+        ema_up, ema_down = wilder(up, window), wilder(down, window)
+    else:
+        ema_up, ema_down = np.split(wilder(np.concatenate([up, down]), window), 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = ema_up / ema_down
+        return np.where(ema_down == 0, 100.0, 100 - (100 / (1 + rs)))
+
+
+def rsi_sma(close, window: int = 14) -> np.ndarray:
+    """
+    RSI from plain rolling means of gains and losses, as the fast engine has
+    always computed it (pandas ``diff().where(...).rolling(window).mean()``):
+    the first bar counts as a zero move, and no losses give RS = 100.
+    """
+    close = as_float_array(close)
+    diff = np.full(close.shape, np.nan)
+    diff[..., 1:] = close[..., 1:] - close[..., :-1]
+    # pandas' where() turns the first (NaN) difference into 0; NaN padding stays NaN
+    first = (np.cumsum(close == close, axis=-1) == 1) & (close == close)
+    diff[first] = 0.0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        gain = sma(np.where(diff > 0, diff, np.where(diff == diff, 0.0, np.nan)), window)
+        loss = sma(np.where(diff < 0, -diff, np.where(diff == diff, 0.0, np.nan)), window)
+        rs = np.where(loss != 0, gain / loss, 100.0)
+        return 100 - (100 / (1 + rs))
+
+
+def macd(close, fast: int = 12, slow: int = 26, sign: int = 9) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """MACD line, signal line and histogram as computed by ``ta.trend.MACD``"""
+    close = as_float_array(close)
+    ema_fast, ema_slow = ema_many(close, (fast, slow))
+    line = ema_fast - ema_slow
+    signal = ema(line, sign)
+    return line, signal, line - signal
+
+
+def _windows(x: np.ndarray, window: int):
+    if x.shape[-1] < window:
+        return None
+    return np.lib.stride_tricks.sliding_window_view(x, window, axis=-1)
+
+
+def sma(x, window: int) -> np.ndarray:
+    """Rolling mean with ``min_periods=window``"""
+    x = as_float_array(x)
+    out = np.full(x.shape, np.nan)
+    win = _windows(x, window)
+    if win is not None:
+        out[..., window - 1:] = win.mean(axis=-1)
+    return out
+
+
+def rolling_std(x, window: int, ddof: int = 0) -> np.ndarray:
+    """Rolling standard deviation with ``min_periods=window``"""
+    x = as_float_array(x)
+    out = np.full(x.shape, np.nan)
+    win = _windows(x, window)
+    if win is not None:
+        out[..., window - 1:] = win.std(axis=-1, ddof=ddof)
+    return out
+
+
+def _rolling_extreme(x, window: int, min_periods: int, op: np.ufunc) -> np.ndarray:
+    # van Herk/Gil-Werman: prefix and suffix running extremes inside blocks of
+    # ``window`` bars; any window spans at most two blocks, so each output is
+    # op(suffix at its start, prefix at its end) — O(1) per bar for any window.
+    x = as_float_array(x)
+    bars = x.shape[-1]
+    out = np.full(x.shape, np.nan)
+    if bars == 0:
+        return out
+    blocks = -(-bars // window)
+    padded = np.full(x.shape[:-1] + (blocks * window,), np.nan)
+    padded[..., :bars] = x
+    shaped = padded.reshape(x.shape[:-1] + (blocks, window))
+    prefix = op.accumulate(shaped, axis=-1).reshape(padded.shape)[..., :bars]
+    suffix = op.accumulate(shaped[..., ::-1], axis=-1)[..., ::-1].reshape(padded.shape)
+    if bars >= window:
+        out[..., window - 1:] = op(suffix[..., :bars - window + 1], prefix[..., window - 1:])
+    # Warm-up: windows shorter than ``window`` are plain running extremes
+    head = min(window - 1, bars)
+    out[..., :head] = prefix[..., :head]
+    out[..., :max(min_periods, 1) - 1] = np.nan
+    return out
+
+
+def rolling_max(x, window: int, min_periods: int | None = None) -> np.ndarray:
+    """Rolling max (``min_periods`` defaults to window; a NaN inside a window gives NaN)"""
+    return _rolling_extreme(x, window, window if min_periods is None else min_periods, np.maximum)
+
+
+def rolling_min(x, window: int, min_periods: int | None = None) -> np.ndarray:
+    """Rolling min (``min_periods`` defaults to window; a NaN inside a window gives NaN)"""
+    return _rolling_extreme(x, window, window if min_periods is None else min_periods, np.minimum)
+
+
+def bollinger(close, window: int = 20, dev: float = 2) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Bollinger (upper, middle, lower) as computed by ``ta.volatility.BollingerBands``"""
+    close = as_float_array(close)
+    mid = sma(close, window)
+    std = rolling_std(close, window)
+    return mid + dev * std, mid, mid - dev * std
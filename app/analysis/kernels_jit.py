@@ -0,0 +1,38 @@
+# app/analysis/kernels_jit.py
+"""
+Numba-compiled recursions for app/analysis/kernels.py.
+
+Only imported when numba is installed and the numba backend is selected.
+Signatures are explicit, so compilation happens eagerly at import and the
+machine code is cached on disk (``cache=True``) for the next start.
+"""
+import numpy as np
+from numba import njit
+
+
+@njit("float64[:, :](float64[:, :], float64[:], int64[:])", cache=True, nogil=True)
+def ewm_rows(values, alpha, minp):
+    # Same step as kernels._ewm_1d, one row at a time
+    rows, bars = values.shape
+    out = np.empty((rows, bars))
+    for r in range(rows):
+        a = alpha[r]
+        factor = 1.0 - a
+        weighted = np.nan
+        old_wt = 1.0
+        nobs = 0
+        for i in range(bars):
+            cur = values[r, i]
+            is_obs = cur == cur
+            if weighted == weighted:
+                old_wt *= factor
+                if is_obs:
+                    if weighted != cur:
+                        weighted = (old_wt * weighted + a * cur) / (old_wt + a)
+                    old_wt = 1.0
+            elif is_obs:
+                weighted = cur
+            if is_obs:
+                nobs += 1
+            out[r, i] = weighted if nobs >= minp[r] else np.nan
+    return out
@@ -0,0 +1,223 @@
+# app/analysis/levels.py
+"""
+Incremental support/resistance per (symbol, timeframe).
+
+Rolling highs/lows over several windows (20/50/200 bars) are kept with
+monotonic deques, so each new bar costs amortised O(1) per window and the
+range of any tracked window is an O(1) lookup.  Swing pivots (a high or low
+that stands out ``span`` bars on each side) are clustered into a bounded
+set of price levels with touch counts.
+
+Only closed bars enter the deques; the last, possibly still forming bar is
+held aside and folded into queries, so ``resistance(20)`` always equals
+``high[-20:].max()`` of the series last synced.
+"""
+from __future__ import annotations
+from collections import deque
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..utils.candles import CandleSeries
+
+WINDOWS = (20, 50, 200)
+
+
+class RollingExtrema:
+    """Max of highs and min of lows over the last ``window`` pushed bars"""
+    __slots__ = ("window", "_max", "_min", "_n")
+
+    def __init__(self, window: int):
+        self.window = window
+        self._max: deque = deque()  # (index, high), highs decreasing
+        self._min: deque = deque()  # (index, low), lows increasing
+        self._n = 0
+
+    def push(self, high: float, low: float):
+        i = self._n
+        self._n += 1
+        if self.window <= 0:
+            return
+        while self._max and self._max[-1][1] <= high:
+            self._max.pop()
+        self._max.append((i, high))
+        while self._min and self._min[-1][1] >= low:
+            self._min.pop()
+        self._min.append((i, low))
+        expired = i - self.window
+        if self._max[0][0] <= expired:
+            self._max.popleft()
+        if self._min[0][0] <= expired:
+            self._min.popleft()
+
+    @property
+    def high(self) -> float:
+        return self._max[0][1] if self._max else float("-inf")
+
+    @property
+    def low(self) -> float:
+        return self._min[0][1] if self._min else float("inf")
+
+    def __len__(self) -> int:
+        return min(self._n, self.window)
+
+
+class Level:
+    __slots__ = ("price", "touches", "last_bar", "kind")
+
+    def __init__(self, price: float, bar: int, kind: int):
+        self.price = price
+        self.touches = 1
+        self.last_bar = bar
+        self.kind = kind  # +1 built from swing highs, -1 from swing lows, 0 both
+
+    def __repr__(self) -> str:
+        return f"Level({self.price:.5f}, touches={self.touches})"
+
+
+class LevelTracker:
+    """Rolling ranges plus clustered pivot levels for one candle stream"""
+
+    def __init__(self, windows: Sequence[int] = WINDOWS, span: int = 2,
+                 tolerance: float = 0.0005, max_levels: int = 12):
+        self.windows = tuple(windows)
+        # closed bars only: the provisional bar completes each window
+        self._ranges = {w: RollingExtrema(w - 1) for w in self.windows}
+        self.span = span
+        self.tolerance = tolerance
+        self.max_levels = max_levels
+        self.levels: List[Level] = []
+        self._recent: deque = deque(maxlen=2 * span + 1)  # (high, low) of closed bars
+        self.bars = 0
+        self.last_ts: Optional[int] = None
+        self.last_bar: Optional[Tuple[float, float]] = None  # (high, low) of the last closed bar
+        self.current: Optional[Tuple[float, float, float]] = None  # forming bar (high, low, close)
+
+    # --- updates ------------------------------------------------------------------
+
+    def push(self, ts: int, high: float, low: float):
+        """Add one closed bar"""
+        for r in self._ranges.values():
+            r.push(high, low)
+        self._recent.append((high, low))
+        self.bars += 1
+        self.last_ts = ts
+        self.last_bar = (high, low)
+        if len(self._recent) == self._recent.maxlen:
+            self._check_pivot()
+
+    def _check_pivot(self):
+        mid = self.span
+        highs = [h for h, _ in self._recent]
+        lows = [l for _, l in self._recent]
+        bar = self.bars - 1 - mid
+        h, l = highs[mid], lows[mid]
+        if h == max(highs) and highs.count(h) == 1:
+            self._add_level(h, bar, 1)
+        if l == min(lows) and lows.count(l) == 1:
+            self._add_level(l, bar, -1)
+
+    def _add_level(self, price: float, bar: int, kind: int):
+        best = None
+        for level in self.levels:
+            if abs(level.price - price) <= level.price * self.tolerance:
+                if best is None or abs(level.price - price) < abs(best.price - price):
+                    best = level
+        if best is not None:
+            best.price = (best.price * best.touches + price) / (best.touches + 1)
+            best.touches += 1
+            best.last_bar = bar
+            if best.kind != kind:
+                best.kind = 0
+            return
+        if len(self.levels) >= self.max_levels:
+            self.levels.remove(min(self.levels, key=lambda lv: (lv.last_bar, lv.touches)))
+        self.levels.append(Level(price, bar, kind))
+
+    def continues(self, candles: CandleSeries) -> bool:
+        """True when ``candles`` still contains our last closed bar unchanged"""
+        if self.last_ts is None:
+            return True
+        ts = candles.ts
+        i = int(np.searchsorted(ts, self.last_ts))
+        return i < len(ts) and ts[i] == self.last_ts and (candles.high[i], candles.low[i]) == self.last_bar
+
+    def sync(self, candles: CandleSeries):
+        """Feed the closed bars newer than the last one seen; keep the last bar provisional"""
+        n = len(candles)
+        if not n:
+            return
+        ts = candles.ts
+        start = 0
+        if self.last_ts is not None:
+            start = int(np.searchsorted(ts[:n - 1], self.last_ts, side="right"))
+        highs = candles.high[start:n - 1].tolist()
+        lows = candles.low[start:n - 1].tolist()
+        for t, h, l in zip(ts[start:n - 1].tolist(), highs, lows):
+            self.push(t, h, l)
+        self.current = (float(candles.high[-1]), float(candles.low[-1]), float(candles.close[-1]))
+
+    # --- queries (O(1) in the history length) -----------------------------------------
+
+    def resistance(self, window: int = 20) -> float:
+        """Highest high of the last ``window`` bars, forming bar included"""
+        high = self._ranges[window].high
+        return max(high, self.current[0]) if self.current else high
+
+    def support(self, window: int = 20) -> float:
+        """Lowest low of the last ``window`` bars, forming bar included"""
+        low = self._ranges[window].low
+        return min(low, self.current[1]) if self.current else low
+
+    def nearest(self, price: Optional[float] = None) -> Tuple[Optional[Level], Optional[Level]]:
+        """Closest clustered level below and above ``price`` (default: last close)"""
+        if price is None:
+            price = self.current[2] if self.current else float("nan")
+        below = above = None
+        for level in self.levels:
+            if level.price <= price and (below is None or level.price > below.price):
+                below = level
+            elif level.price > price and (above is None or level.price < above.price):
+                above = level
+        return below, above
+
+
+class LevelRegistry:
+    """One LevelTracker per stream key, e.g. (symbol, timeframe, otc)"""
+
+    def __init__(self, **tracker_kwargs):
+        self._trackers: Dict[Hashable, LevelTracker] = {}
+        self._kwargs = tracker_kwargs
+
+    def sync(self, key: Hashable, candles) -> LevelTracker:
+        candles = CandleSeries.from_frame(candles)
+        tracker = self._trackers.get(key)
+        # bar numbers instead of times, or a history that no longer contains our last bar: start over
+        if tracker is None or not candles.has_times or not tracker.continues(candles):
+            tracker = self._trackers[key] = LevelTracker(**self._kwargs)
+        tracker.sync(candles)
+        return tracker
+
+    def get(self, key: Hashable) -> Optional[LevelTracker]:
+        return self._trackers.get(key)
+
+    def __len__(self) -> int:
+        return len(self._trackers)
+
+
+def level_notes(tracker: LevelTracker, digits: int = 5) -> List[str]:
+    """English notes for the TA message: nearest clustered levels and wider ranges"""
+    notes = []
+    below, above = tracker.nearest()
+    if below is not None:
+        notes.append(f"Support level {below.price:.{digits}f} ({below.touches} touches)")
+    if above is not None:
+        notes.append(f"Resistance level {above.price:.{digits}f} ({above.touches} touches)")
+    wide = [w for w in tracker.windows if w > 20 and tracker.bars + 1 >= w]
+    if wide:
+        w = max(wide)
+        notes.append(f"{w}-bar range {tracker.support(w):.{digits}f} - {tracker.resistance(w):.{digits}f}")
+    return notes
+
+
+levels = LevelRegistry()
@@ -0,0 +1,294 @@
+# app/analysis/optimize.py
+"""
+Walk-forward search over IndicatorParams.
+
+Every candidate set is scored with the vectorised "ind" rule (see
+backtest.py) on all pairs of a timeframe at once.  The history is cut into
+``folds`` consecutive segments; at step k the set with the best in-sample
+hit rate on segments 0..k-1 is picked and judged on segment k, so the
+reported out-of-sample hit rate never saw the data it is measured on.  The
+set written to the params file is the best one over all segments, per
+timeframe, plus an overall default — but only where the walk-forward hit
+rate beats DEFAULT's on the same segments by ``margin``; otherwise the
+timeframe keeps DEFAULT (column ``chosen`` of the report).
+
+Candidates fan out over a process pool.  The stacked OHLC matrices live in
+shared memory, so workers attach to them instead of unpickling a copy per
+task, and each worker keeps one FeatureFrame per timeframe: windowed
+series (``rsi_10``, ``ema_34`` ...) are computed once per worker and reused
+by every candidate that needs them.
+
+Запуск: python -m app.analysis.optimize [--csv EURUSD_5m.csv ...] [--timeframes 1m,5m]
+        [--grid rsi_window=7,14,21 ema_fast=5,9] [--random 200] [--workers 4] [--margin 0.01]
+        [--out indicator_params.json]
+"""
+from __future__ import annotations
+import argparse
+import datetime
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from multiprocessing import shared_memory
+from typing import Dict, List, Mapping, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import kernels
+from . import params as indicator_params
+from .backtest import _moves, directions, load_history, synthetic_history
+from .features import FeatureFrame
+from .params import DEFAULT, IndicatorParams
+from ..config import INDICATOR_PARAMS_FILE
+
+# MACD and BB only feed the displayed indicators, not the signal, so the
+# default grid leaves them alone; pass --grid macd_fast=... to tune them anyway.
+GRID: Dict[str, Sequence] = {
+    "rsi_window": (7, 10, 14, 21),
+    "rsi_overbought": (65.0, 70.0, 75.0, 80.0),
+    "rsi_oversold": (20.0, 25.0, 30.0, 35.0),
+    "ema_fast": (5, 9, 12),
+    "ema_slow": (21, 26, 34, 50),
+}
+
+_COLUMNS = ("open", "high", "low", "close")
+
+
+def valid(p: IndicatorParams) -> bool:
+    return p.ema_fast < p.ema_slow and p.macd_fast < p.macd_slow and p.rsi_oversold < p.rsi_overbought
+
+
+def candidates(grid: Mapping[str, Sequence], samples: int = 0, seed: int = 0) -> List[IndicatorParams]:
+    """Full grid, or ``samples`` random points of it; DEFAULT always comes first"""
+    names = list(grid)
+    sets = [p for p in (replace(DEFAULT, **dict(zip(names, values)))
+                        for values in itertools.product(*(grid[n] for n in names))) if valid(p)]
+    if samples and samples < len(sets):
+        rng = np.random.default_rng(seed)
+        sets = [sets[i] for i in sorted(rng.choice(len(sets), samples, replace=False))]
+    return [DEFAULT] + [p for p in dict.fromkeys(sets) if p != DEFAULT]
+
+
+# --- scoring -----------------------------------------------------------------------
+
+def segment_scores(f: FeatureFrame, expiry: int, folds: int, rule: str = "ind") -> Tuple[np.ndarray, np.ndarray]:
+    """(signals, wins) per row and segment: two (pairs x folds) arrays"""
+    move = _moves(f["close"], expiry)
+    d = directions(f, rule)[..., :move.shape[-1]]
+    taken = (d != 0) & (move == move)
+    won = taken & (move == d)
+    edges = np.linspace(0, move.shape[-1], folds + 1).astype(int)[:-1]
+    return np.add.reduceat(taken, edges, axis=-1), np.add.reduceat(won, edges, axis=-1)
+
+
+def walk_forward(signals: np.ndarray, wins: np.ndarray, min_signals: int) -> Dict[str, float]:
+    """
+    ``signals``/``wins`` are (candidates x folds) totals.  Anchored walk-forward:
+    pick on folds [0, k), score on fold k.  Candidate 0 is the baseline.
+    """
+    folds = signals.shape[1]
+    oos_signals = oos_wins = 0
+    for k in range(1, folds):
+        s, w = signals[:, :k].sum(axis=1), wins[:, :k].sum(axis=1)
+        best = _best(s, w, min_signals)
+        oos_signals += signals[best, k]
+        oos_wins += wins[best, k]
+    base_s, base_w = signals[0, 1:].sum(), wins[0, 1:].sum()
+    return {
+        "oos_hit_rate": oos_wins / oos_signals if oos_signals else float("nan"),
+        "oos_signals": int(oos_signals),
+        "default_hit_rate": base_w / base_s if base_s else float("nan"),
+        "default_signals": int(base_s),
+    }
+
+
+def beats_default(wf: Mapping[str, float], margin: float) -> bool:
+    """True when the out-of-sample hit rate is ``margin`` above DEFAULT's (NaN never is)"""
+    return bool(wf["oos_hit_rate"] > wf["default_hit_rate"] + margin)
+
+
+def _best(signals: np.ndarray, wins: np.ndarray, min_signals: int) -> int:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rate = np.where(signals >= max(min_signals, 1), wins / signals, -1.0)
+    # ties go to the earlier candidate, i.e. towards DEFAULT
+    return int(np.argmax(rate))
+
+
+# --- workers -----------------------------------------------------------------------
+
+_frames: Dict[str, FeatureFrame] = {}
+_blocks: List[shared_memory.SharedMemory] = []
+
+
+def _attach(layout: Mapping[str, Tuple[str, Tuple[int, ...]]]):
+    """Pool initializer: map every timeframe's shared OHLC block"""
+    for tf, (name, shape) in layout.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _blocks.append(shm)
+        ohlc = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        _frames[tf] = FeatureFrame(**dict(zip(_COLUMNS, ohlc)))
+
+
+def _evaluate(tf: str, chunk: Sequence[IndicatorParams], expiry: int, folds: int):
+    base = _frames[tf]
+    out = [segment_scores(base.with_params(p), expiry, folds) for p in chunk]
+    return np.stack([s for s, _ in out]), np.stack([w for _, w in out])
+
+
+def _share(histories: Mapping[Tuple[str, str], pd.DataFrame]):
+    """One shared (4 x pairs x bars) block per timeframe"""
+    by_tf: Dict[str, List[pd.DataFrame]] = {}
+    for (_, tf), df in histories.items():
+        by_tf.setdefault(tf, []).append(df)
+    blocks, layout = [], {}
+    for tf, dfs in by_tf.items():
+        frames = [FeatureFrame.of(df) for df in dfs]
+        ohlc = np.stack([kernels.stack_series([fr[c] for fr in frames]) for c in _COLUMNS])
+        shm = shared_memory.SharedMemory(create=True, size=ohlc.nbytes)
+        np.ndarray(ohlc.shape, dtype=np.float64, buffer=shm.buf)[:] = ohlc
+        blocks.append(shm)
+        layout[tf] = (shm.name, ohlc.shape)
+    return blocks, layout
+
+
+def optimize(
+    histories: Mapping[Tuple[str, str], pd.DataFrame],
+    sets: Sequence[IndicatorParams],
+    expiry: int = 1,
+    folds: int = 5,
+    min_signals: int = 100,
+    workers: int | None = None,
+    margin: float = 0.01,
+) -> Tuple[Dict[str, IndicatorParams], IndicatorParams, pd.DataFrame, Dict[str, float]]:
+    """
+    Returns (chosen set per timeframe, chosen overall set, per-timeframe report, stats).
+    A tuned set is chosen only when its walk-forward hit rate beats DEFAULT
+    by ``margin``, else DEFAULT is.  ``workers=0`` evaluates in this process.
+    ``sets[0]`` must be DEFAULT (``candidates`` puts it there).
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    blocks, layout = _share(histories)
+    start = time.perf_counter()
+    try:
+        per_chunk = max(1, len(sets) // max(workers * 4, 1))
+        chunks = [sets[i:i + per_chunk] for i in range(0, len(sets), per_chunk)]
+        jobs = [(tf, chunk) for tf in layout for chunk in chunks]
+        if workers:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(layout,)) as pool:
+                futures = [pool.submit(_evaluate, tf, chunk, expiry, folds) for tf, chunk in jobs]
+                results = [fut.result() for fut in futures]
+        else:
+            _attach(layout)
+            results = [_evaluate(tf, chunk, expiry, folds) for tf, chunk in jobs]
+    finally:
+        _frames.clear()
+        for shm in _blocks:
+            shm.close()
+        _blocks.clear()
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+    elapsed = time.perf_counter() - start
+
+    # (candidates x folds) totals per timeframe, summed over pairs
+    totals: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+    for (tf, _), (s, w) in zip(jobs, results):
+        prev = totals.get(tf, ([], []))
+        totals[tf] = (prev[0] + [s.sum(axis=1)], prev[1] + [w.sum(axis=1)])
+    totals = {tf: (np.concatenate(s), np.concatenate(w)) for tf, (s, w) in totals.items()}
+
+    best, rows = {}, []
+    for tf, (s, w) in totals.items():
+        i = _best(s.sum(axis=1), w.sum(axis=1), min_signals)
+        wf = walk_forward(s, w, min_signals)
+        if not beats_default(wf, margin):
+            i = 0
+        best[tf] = sets[i]
+        rows.append({
+            "timeframe": tf,
+            **wf,
+            "chosen": "tuned" if i else "default",
+            "in_sample_hit_rate": w[i].sum() / max(s[i].sum(), 1),
+            **sets[i].to_dict(),
+        })
+    all_s = sum(s for s, _ in totals.values())
+    all_w = sum(w for _, w in totals.values())
+    i = _best(all_s.sum(axis=1), all_w.sum(axis=1), min_signals)
+    overall = sets[i] if beats_default(walk_forward(all_s, all_w, min_signals), margin) else sets[0]
+
+    bars = sum(len(df) for df in histories.values())
+    stats = {
+        "candidates": len(sets),
+        "seconds": elapsed,
+        "bar_evaluations_per_second": bars * len(sets) / elapsed if elapsed else float("inf"),
+    }
+    return best, overall, pd.DataFrame(rows), stats
+
+
+# --- CLI -----------------------------------------------------------------------------
+
+def parse_grid(items: Sequence[str]) -> Dict[str, Sequence]:
+    """``["rsi_window=7,14", ...]`` -> GRID with those axes replaced"""
+    grid = dict(GRID)
+    for item in items:
+        name, _, values = item.partition("=")
+        kind = type(getattr(DEFAULT, name))
+        grid[name] = tuple(kind(v) for v in values.split(","))
+    return grid
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="Walk-forward search of indicator parameters")
+    parser.add_argument("--csv", nargs="*", default=[], help="imported histories, e.g. EURUSD_5m.csv")
+    parser.add_argument("--pairs", type=int, default=20, help="synthetic pairs per timeframe when no CSV is given")
+    parser.add_argument("--bars", type=int, default=5000, help="bars per synthetic pair")
+    parser.add_argument("--timeframes", default="1m,5m")
+    parser.add_argument("--grid", nargs="*", default=[], help="override grid axes, e.g. rsi_window=7,14,21")
+    parser.add_argument("--random", type=int, default=0, help="sample this many grid points instead of all")
+    parser.add_argument("--expiry", type=int, default=1, help="expiry in bars")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--min-signals", type=int, default=100)
+    parser.add_argument("--margin", type=float, default=0.01,
+                        help="out-of-sample hit rate a tuned set must gain over DEFAULT to be written")
+    parser.add_argument("--workers", type=int, default=None, help="process pool size (0 = in-process)")
+    parser.add_argument("--out", default=INDICATOR_PARAMS_FILE, help="params file the bot loads at startup")
+    args = parser.parse_args(argv)
+
+    if args.csv:
+        histories = dict(load_history(p) for p in args.csv)
+    else:
+        histories = {
+            (f"SYN{i:02d}", tf): synthetic_history(f"SYN{i:02d}", tf, args.bars, seed=i * 31 + j)
+            for j, tf in enumerate(args.timeframes.split(","))
+            for i in range(args.pairs)
+        }
+    sets = candidates(parse_grid(args.grid), args.random)
+
+    best, overall, report, stats = optimize(
+        histories, sets, expiry=args.expiry, folds=args.folds,
+        min_signals=args.min_signals, workers=args.workers, margin=args.margin,
+    )
+    print(report.to_string(index=False))
+    kept = report.loc[report["chosen"] == "default", "timeframe"].tolist()
+    if kept:
+        print(f"\nDEFAULT kept for {', '.join(kept)}: walk-forward hit rate not {args.margin:.2%} above it")
+    print(f"\n{stats['candidates']} candidates in {stats['seconds']:.2f}s "
+          f"({stats['bar_evaluations_per_second'] / 1e6:.1f}M bar-evaluations/s)")
+
+    indicator_params.save(args.out, best, default=overall, meta={
+        "generated": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "rule": "ind",
+        "expiry_bars": args.expiry,
+        "folds": args.folds,
+        "candidates": len(sets),
+        "margin": args.margin,
+        "walk_forward": report[["timeframe", "oos_hit_rate", "default_hit_rate", "chosen"]].to_dict("records"),
+    })
+    print(f"Saved {len(best)} timeframe sets to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,433 @@
+# app/analysis/outcomes.py
+"""
+Журнал прогнозов и их исходов.
+
+Every forecast the bot sends is appended to a columnar log (one typed
+array per field: time, stream, rule, direction, entry price, forecast bar,
+expiry bar).  A periodic batch job resolves everything that has expired at
+once: forecasts are grouped by stream (symbol, timeframe, otc) and matched
+to the stored candles of that stream with one ``searchsorted`` per group,
+so a stream costs one candle fetch at most, however many forecasts it has.
+
+Like the backtest, a forecast wins when the close of its expiry bar moved
+its way from the entry price.  Rolling accuracy per (rule, stream) over the
+last ``window`` seconds is recomputed after each batch and kept in a dict,
+so the bot can show a track record without touching the log.
+
+On disk the log is append-only: one ``<column>.bin`` file per field, plus
+``resolved_*.bin`` files for outcomes and ``streams.txt`` for stream names.
+A torn write after a crash is cut back to the shortest column on load, in
+memory and in the files, so later appends stay aligned.
+
+Resolved rows older than ``window`` are not read by anything, so
+``compact`` drops them (and rewrites the files) once they make up half of
+the log: memory and the per-minute scans stay bounded by the window plus
+the pending forecasts.
+"""
+from __future__ import annotations
+import logging
+import os
+import shutil
+import time
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..utils.candles import CandleSeries
+from ..utils.timeframes import tf_seconds
+
+logger = logging.getLogger(__name__)
+
+RULES = ("ind", "ta", "mtf")
+
+# outcome codes
+PENDING, WIN, LOSS, TIE, EXPIRED = 0, 1, 2, 3, 4
+
+FORECAST_COLUMNS = {
+    "ts": np.int64,         # when the forecast was sent, epoch ms
+    "stream": np.int32,     # index into streams
+    "rule": np.int8,        # index into RULES
+    "direction": np.int8,   # +1 buy, -1 sell, 0 hold
+    "price": np.float64,    # last close at forecast time
+    "bar_ts": np.int64,     # open of the bar the forecast was made on
+    "expiry_ts": np.int64,  # open of the bar whose close decides it
+}
+RESOLVED_COLUMNS = {
+    "index": np.int64,      # row of the forecast
+    "outcome": np.int8,
+    "exit": np.float64,     # close of the expiry bar
+}
+# unresolved after this long (no candles ever came), the forecast is dropped as EXPIRED
+MAX_AGE_MS = 24 * 3600 * 1000
+
+
+def direction_of(action: str) -> int:
+    """BUY/STRONG BUY/WEAK BUY -> +1, SELL variants -> -1, anything else 0"""
+    action = action.upper()
+    if "BUY" in action:
+        return 1
+    if "SELL" in action:
+        return -1
+    return 0
+
+
+class _Columns:
+    """Typed growable arrays, one per field; ``append`` is amortised O(1)"""
+
+    def __init__(self, dtypes: Mapping[str, type]):
+        self.dtypes = dict(dtypes)
+        self.data = {name: np.empty(64, dtype=dt) for name, dt in self.dtypes.items()}
+        self.size = 0
+
+    def append(self, **row):
+        if self.size == len(next(iter(self.data.values()))):
+            self.data = {name: np.resize(a, 2 * len(a)) for name, a in self.data.items()}
+        for name, a in self.data.items():
+            a[self.size] = row[name]
+        self.size += 1
+
+    def extend(self, columns: Mapping[str, np.ndarray]):
+        n = len(next(iter(columns.values())))
+        need = self.size + n
+        if need > len(next(iter(self.data.values()))):
+            cap = max(need, 2 * self.size, 64)
+            self.data = {name: np.resize(a, cap) for name, a in self.data.items()}
+        for name, a in self.data.items():
+            a[self.size:need] = columns[name]
+        self.size = need
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.data[name][:self.size]
+
+    def __len__(self) -> int:
+        return self.size
+
+
+class ForecastLog:
+    def __init__(self, path: Optional[str] = None, window: int = 24 * 3600):
+        self.path = path
+        self.window = window
+        self.forecasts = _Columns(FORECAST_COLUMNS)
+        self.outcome = np.zeros(64, dtype=np.int8)  # per forecast row, mirrors the resolved files
+        self.exit = np.full(64, np.nan)
+        self.streams: List[Tuple[str, str, bool]] = []
+        self._stream_ids: Dict[Tuple[str, str, bool], int] = {}
+        self._candles: Dict[Tuple[str, str, bool], CandleSeries] = {}
+        self._stats: Dict[Tuple[str, Tuple[str, str, bool]], Tuple[int, int]] = {}
+        # rows not yet on disk
+        self._saved_forecasts = 0
+        self._saved_streams = 0
+        self._unsaved_resolved: List[Dict[str, np.ndarray]] = []
+        if path:
+            self._load()
+
+    # --- recording ---------------------------------------------------------------------
+
+    def _stream(self, key: Tuple[str, str, bool]) -> int:
+        sid = self._stream_ids.get(key)
+        if sid is None:
+            sid = self._stream_ids[key] = len(self.streams)
+            self.streams.append(key)
+        return sid
+
+    def record(self, key: Tuple[str, str, bool], rule: str, action: str, candles,
+               expiry_bars: int = 1, ts: Optional[int] = None) -> Optional[int]:
+        """
+        Log a forecast made on the last bar of ``candles`` for stream
+        ``key`` = (symbol, timeframe, otc).  Returns the row, or None when the
+        candles carry no times to resolve against.
+        """
+        candles = CandleSeries.from_frame(candles)
+        if not candles.has_times:
+            return None
+        step = tf_seconds(key[1]) * 1000
+        bar_ts = int(candles.ts[-1])
+        self.forecasts.append(
+            ts=int(time.time() * 1000) if ts is None else ts,
+            stream=self._stream(key),
+            rule=RULES.index(rule),
+            direction=direction_of(action),
+            price=float(candles.close[-1]),
+            bar_ts=bar_ts,
+            expiry_ts=bar_ts + expiry_bars * step,
+        )
+        n = len(self.forecasts)
+        self._reserve(n)
+        self.outcome[n - 1] = PENDING
+        self.observe(key, candles)
+        return n - 1
+
+    def _reserve(self, n: int):
+        if n > len(self.outcome):
+            cap = max(64, 2 * n)
+            outcome = np.zeros(cap, dtype=np.int8)
+            exit_price = np.full(cap, np.nan)
+            outcome[:len(self.outcome)] = self.outcome
+            exit_price[:len(self.exit)] = self.exit
+            self.outcome, self.exit = outcome, exit_price
+
+    def observe(self, key: Tuple[str, str, bool], candles):
+        """Remember the newest candles of a stream for the next batch"""
+        self._candles[key] = CandleSeries.from_frame(candles)
+
+    # --- batch evaluation -------------------------------------------------------------
+
+    def _open(self, now_ms: int) -> np.ndarray:
+        """Rows still pending whose expiry bar has closed by ``now_ms``"""
+        n = len(self.forecasts)
+        f = self.forecasts
+        steps = np.array([tf_seconds(tf) * 1000 for _, tf, _ in self.streams], dtype=np.int64)
+        closes_at = f["expiry_ts"] + steps[f["stream"]] if n else np.empty(0, dtype=np.int64)
+        return np.flatnonzero((self.outcome[:n] == PENDING) & (closes_at <= now_ms))
+
+    def due_streams(self, now_ms: Optional[int] = None) -> List[Tuple[str, str, bool]]:
+        """Streams with expired forecasts that the stored candles do not cover yet"""
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        rows = self._open(now_ms)
+        out = []
+        f = self.forecasts
+        for sid in np.unique(f["stream"][rows]).tolist():
+            key = self.streams[sid]
+            candles = self._candles.get(key)
+            latest = f["expiry_ts"][rows][f["stream"][rows] == sid].max()
+            if candles is None or not len(candles) or candles.ts[-1] <= latest:
+                out.append(key)
+        return out
+
+    def evaluate(self, now_ms: Optional[int] = None) -> int:
+        """Resolve every expired forecast against the stored candles; returns how many were resolved"""
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        rows = self._open(now_ms)
+        f = self.forecasts
+        stream = f["stream"][rows]
+        resolved_rows, outcomes, exits = [], [], []
+        for sid in np.unique(stream).tolist():
+            mine = rows[stream == sid]
+            key = self.streams[sid]
+            candles = self._candles.get(key)
+            expiry = f["expiry_ts"][mine]
+            if candles is not None and len(candles):
+                ts, close = candles.ts, candles.close
+                step = tf_seconds(key[1]) * 1000
+                # last bar opening at or before the expiry bar (the expiry bar itself unless it is missing)
+                j = np.searchsorted(ts, expiry, side="right") - 1
+                # that bar must be final: a newer bar exists, or its time is over
+                final = (j < len(ts) - 1) | (ts[-1] + step <= now_ms)
+                ok = (j >= 0) & final
+                ok[ok] &= ts[j[ok]] > f["bar_ts"][mine][ok]
+                exit_price = np.where(ok, close[np.maximum(j, 0)], np.nan)
+                move = np.sign(exit_price - f["price"][mine])
+                direction = f["direction"][mine]
+                outcome = np.where(move == 0, TIE, np.where(move == direction, WIN, LOSS))
+                # HOLD forecasts are closed without a verdict
+                outcome = np.where(direction == 0, EXPIRED, outcome)
+            else:
+                ok = np.zeros(len(mine), dtype=bool)
+                exit_price = np.full(len(mine), np.nan)
+                outcome = np.full(len(mine), EXPIRED)
+            stale = ~ok & (f["ts"][mine] < now_ms - MAX_AGE_MS)
+            done = ok | stale
+            resolved_rows.append(mine[done])
+            outcomes.append(np.where(ok, outcome, EXPIRED)[done].astype(np.int8))
+            exits.append(exit_price[done])
+        if not resolved_rows:
+            self._refresh(now_ms)
+            return 0
+        index = np.concatenate(resolved_rows)
+        outcome = np.concatenate(outcomes)
+        exit_price = np.concatenate(exits)
+        self.outcome[index] = outcome
+        self.exit[index] = exit_price
+        if len(index):
+            self._unsaved_resolved.append({"index": index, "outcome": outcome, "exit": exit_price})
+        self._drop_idle_candles(now_ms)
+        self._refresh(now_ms)
+        return int(len(index))
+
+    def _drop_idle_candles(self, now_ms: int):
+        """Forget candles of streams without pending forecasts"""
+        n = len(self.forecasts)
+        busy = set(np.unique(self.forecasts["stream"][self.outcome[:n] == PENDING]).tolist())
+        for key in list(self._candles):
+            if self._stream_ids.get(key) not in busy:
+                del self._candles[key]
+
+    def _refresh(self, now_ms: int):
+        """Rolling (wins, decided) per (rule, stream) over the last ``window`` seconds"""
+        n = len(self.forecasts)
+        f = self.forecasts
+        outcome = self.outcome[:n]
+        recent = (f["ts"] >= now_ms - self.window * 1000) & ((outcome == WIN) | (outcome == LOSS) | (outcome == TIE))
+        rule, stream = f["rule"][recent].astype(np.int64), f["stream"][recent].astype(np.int64)
+        combo = rule * max(len(self.streams), 1) + stream
+        keys, inverse = np.unique(combo, return_inverse=True)
+        wins = np.bincount(inverse, outcome[recent] == WIN, minlength=len(keys))
+        total = np.bincount(inverse, minlength=len(keys))
+        width = max(len(self.streams), 1)
+        self._stats = {
+            (RULES[k // width], self.streams[k % width]): (int(w), int(t))
+            for k, w, t in zip(keys.tolist(), wins.tolist(), total.tolist())
+        }
+
+    # --- queries --------------------------------------------------------------------------
+
+    def accuracy(self, rule: str, key: Tuple[str, str, bool]) -> Tuple[int, int]:
+        """(wins, decided forecasts) of ``rule`` on a stream within the rolling window"""
+        return self._stats.get((rule, key), (0, 0))
+
+    def summary(self, by: Sequence[str] = ("rule", "timeframe")) -> Dict[Tuple, Tuple[int, int]]:
+        """Rolling (wins, decided) aggregated over any of rule/symbol/timeframe/otc"""
+        out: Dict[Tuple, Tuple[int, int]] = {}
+        for (rule, (symbol, tf, otc)), (w, t) in self._stats.items():
+            fields = {"rule": rule, "symbol": symbol, "timeframe": tf, "otc": otc}
+            group = tuple(fields[name] for name in by)
+            prev = out.get(group, (0, 0))
+            out[group] = (prev[0] + w, prev[1] + t)
+        return out
+
+    @property
+    def pending(self) -> int:
+        return int(np.count_nonzero(self.outcome[:len(self.forecasts)] == PENDING))
+
+    def __len__(self) -> int:
+        return len(self.forecasts)
+
+    # --- persistence -------------------------------------------------------------------------
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def flush(self):
+        """Append everything new since the last flush to the column files"""
+        if not self.path:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        if self._saved_streams < len(self.streams):
+            with open(self._file("streams.txt"), "a", encoding="utf-8") as fh:
+                for symbol, tf, otc in self.streams[self._saved_streams:]:
+                    fh.write(f"{symbol}\t{tf}\t{int(otc)}\n")
+            self._saved_streams = len(self.streams)
+        n = len(self.forecasts)
+        if self._saved_forecasts < n:
+            for name in FORECAST_COLUMNS:
+                with open(self._file(f"{name}.bin"), "ab") as fh:
+                    self.forecasts[name][self._saved_forecasts:n].tofile(fh)
+            self._saved_forecasts = n
+        if self._unsaved_resolved:
+            for name in RESOLVED_COLUMNS:
+                with open(self._file(f"resolved_{name}.bin"), "ab") as fh:
+                    for batch in self._unsaved_resolved:
+                        batch[name].astype(RESOLVED_COLUMNS[name]).tofile(fh)
+            self._unsaved_resolved = []
+
+    def compact(self, now_ms: Optional[int] = None, min_rows: int = 1024) -> int:
+        """
+        Drop resolved forecasts older than ``window`` once there are at
+        least ``min_rows`` of them and they are half the log; returns how
+        many were dropped.  Row numbers change, the files are rewritten.
+        """
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        n = len(self.forecasts)
+        keep = (self.outcome[:n] == PENDING) | (self.forecasts["ts"] >= now_ms - self.window * 1000)
+        kept = int(np.count_nonzero(keep))
+        dropped = n - kept
+        if dropped < max(min_rows, n // 2):
+            return 0
+        self.flush()
+        rows = np.flatnonzero(keep)
+        forecasts = _Columns(FORECAST_COLUMNS)
+        forecasts.extend({name: self.forecasts[name][rows] for name in FORECAST_COLUMNS})
+        outcome, exit_price = self.outcome[rows], self.exit[rows]
+        self.forecasts = forecasts
+        self.outcome = np.zeros(max(64, 2 * kept), dtype=np.int8)
+        self.exit = np.full(max(64, 2 * kept), np.nan)
+        self.outcome[:kept], self.exit[:kept] = outcome, exit_price
+        if self.path:
+            self._rewrite()
+        self._saved_forecasts = kept
+        self._unsaved_resolved = []
+        self._refresh(now_ms)
+        logger.info(f"Forecast log: compacted, {dropped} old forecasts dropped, {kept} kept")
+        return dropped
+
+    def _rewrite(self):
+        """
+        Write the whole log into ``<path>.compact`` and swap it in; a crash
+        between the two renames is finished by ``_load``
+        """
+        new, old = self.path + ".compact", self.path + ".old"
+        shutil.rmtree(new, ignore_errors=True)
+        os.makedirs(new)
+        shutil.copyfile(self._file("streams.txt"), os.path.join(new, "streams.txt"))
+        for name in FORECAST_COLUMNS:
+            self.forecasts[name].tofile(os.path.join(new, f"{name}.bin"))
+        n = len(self.forecasts)
+        index = np.flatnonzero(self.outcome[:n] != PENDING)
+        resolved = {"index": index, "outcome": self.outcome[index], "exit": self.exit[index]}
+        for name, dtype in RESOLVED_COLUMNS.items():
+            resolved[name].astype(dtype).tofile(os.path.join(new, f"resolved_{name}.bin"))
+        shutil.rmtree(old, ignore_errors=True)
+        os.rename(self.path, old)
+        os.rename(new, self.path)
+        shutil.rmtree(old, ignore_errors=True)
+
+    def _truncate(self, name: str, size: int):
+        path = self._file(name)
+        if os.path.exists(path) and os.path.getsize(path) > size:
+            os.truncate(path, size)
+
+    def _read(self, name: str, dtype) -> np.ndarray:
+        path = self._file(f"{name}.bin")
+        if not os.path.exists(path):
+            return np.empty(0, dtype=dtype)
+        raw = np.fromfile(path, dtype=np.uint8)
+        size = np.dtype(dtype).itemsize
+        return raw[:len(raw) // size * size].view(dtype)
+
+    def _load(self):
+        new, old = self.path + ".compact", self.path + ".old"
+        if not os.path.isdir(self.path) and os.path.isdir(new):
+            # crashed between the renames of _rewrite: the new copy is complete
+            os.rename(new, self.path)
+        shutil.rmtree(new, ignore_errors=True)
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.exists(self._file("streams.txt")):
+            with open(self._file("streams.txt"), "rb") as fh:
+                raw = fh.read()
+            # a torn last line would glue onto the next appended stream
+            self._truncate("streams.txt", raw.rfind(b"\n") + 1)
+            with open(self._file("streams.txt"), encoding="utf-8") as fh:
+                for line in fh:
+                    parts = line.rstrip("\n").split("\t")
+                    if len(parts) == 3:
+                        self._stream((parts[0], parts[1], parts[2] == "1"))
+            self._saved_streams = len(self.streams)
+        columns = {name: self._read(name, dt) for name, dt in FORECAST_COLUMNS.items()}
+        n = min(len(a) for a in columns.values())
+        # streams.txt is written first, so an unknown stream id means a damaged tail
+        unknown = columns["stream"][:n] >= len(self.streams)
+        if unknown.any():
+            n = int(np.argmax(unknown))
+        self.forecasts.extend({name: a[:n] for name, a in columns.items()})
+        self._saved_forecasts = n
+        self._reserve(n)
+        # the next flush appends after the last whole row
+        for name, dt in FORECAST_COLUMNS.items():
+            self._truncate(f"{name}.bin", n * np.dtype(dt).itemsize)
+
+        resolved = {name: self._read(f"resolved_{name}", dt) for name, dt in RESOLVED_COLUMNS.items()}
+        m = min(len(a) for a in resolved.values())
+        index = resolved["index"][:m]
+        valid = index < n
+        self.outcome[index[valid]] = resolved["outcome"][:m][valid]
+        self.exit[index[valid]] = resolved["exit"][:m][valid]
+        if valid.all():
+            for name, dt in RESOLVED_COLUMNS.items():
+                self._truncate(f"resolved_{name}.bin", m * np.dtype(dt).itemsize)
+        else:
+            # outcomes of cut-off forecasts: those row numbers will be reused
+            for name, dt in RESOLVED_COLUMNS.items():
+                resolved[name][:m][valid].astype(dt).tofile(self._file(f"resolved_{name}.bin"))
+        self._refresh(int(time.time() * 1000))
+        if n:
+            logger.info(f"Forecast log: {n} forecasts from {self.path}, {self.pending} pending")
@@ -0,0 +1,94 @@
+# app/analysis/params.py
+"""
+Indicator parameters (RSI / EMA / MACD / BB) for the live analysis.
+
+The defaults are the classic 14 / 9-21 / 12-26-9 / 20-2 settings.
+``python -m app.analysis.optimize`` writes tuned sets per timeframe to a
+JSON file; ``load()`` reads it once at startup and ``for_timeframe()``
+hands the right set to the feature frames.
+
+File format::
+
+    {"default": {...}, "timeframes": {"1m": {"rsi_window": 10, ...}, ...}}
+
+Missing fields fall back to the defaults, unknown fields are ignored.
+"""
+from __future__ import annotations
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass, fields, replace
+from typing import Dict, Mapping
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class IndicatorParams:
+    rsi_window: int = 14
+    rsi_overbought: float = 70.0
+    rsi_oversold: float = 30.0
+    ema_fast: int = 9
+    ema_slow: int = 21
+    macd_fast: int = 12
+    macd_slow: int = 26
+    macd_signal: int = 9
+    bb_window: int = 20
+    bb_dev: float = 2.0
+
+    @classmethod
+    def from_dict(cls, data: Mapping) -> "IndicatorParams":
+        known = {f.name for f in fields(cls)}
+        base = cls()
+        values = {}
+        for name, value in data.items():
+            if name in known:
+                # int fields stay int so node names like "ema_9" keep working
+                values[name] = type(getattr(base, name))(value)
+        return replace(base, **values)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+DEFAULT = IndicatorParams()
+
+_default = DEFAULT
+_by_timeframe: Dict[str, IndicatorParams] = {}
+
+
+def for_timeframe(timeframe: str | None = None) -> IndicatorParams:
+    """Parameter set for a timeframe (the file's default when it has none)"""
+    return _by_timeframe.get(timeframe, _default) if timeframe else _default
+
+
+def load(path: str) -> int:
+    """Load tuned parameter sets; returns how many timeframe sets were read"""
+    global _default, _by_timeframe
+    if not path or not os.path.exists(path):
+        return 0
+    try:
+        with open(path, encoding="utf-8") as fh:
+            data = json.load(fh)
+        default = IndicatorParams.from_dict(data.get("default", {}))
+        by_tf = {tf: IndicatorParams.from_dict(v) for tf, v in data.get("timeframes", {}).items()}
+    except (OSError, ValueError, TypeError, AttributeError) as e:
+        logger.warning(f"Indicator params file {path} ignored: {e}")
+        return 0
+    _default, _by_timeframe = default, by_tf
+    return len(by_tf)
+
+
+def save(path: str, by_timeframe: Mapping[str, IndicatorParams],
+         default: IndicatorParams = DEFAULT, meta: Mapping | None = None):
+    """Write parameter sets in the format ``load()`` reads"""
+    data = {
+        "default": default.to_dict(),
+        "timeframes": {tf: p.to_dict() for tf, p in by_timeframe.items()},
+    }
+    if meta:
+        data["meta"] = dict(meta)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(data, fh, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
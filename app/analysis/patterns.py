@@ -0,0 +1,103 @@
+# app/analysis/patterns.py
+"""
+Vectorised candlestick patterns.
+
+Each detector takes OHLC arrays and returns a boolean mask over the whole
+history in one pass (along the last axis, so a (pairs x bars) matrix works
+too).  The last-bar answer is just ``mask[..., -1]`` and historical hit
+rates come from the same masks, so scanning every pair costs about as much
+as checking one candle.
+"""
+from __future__ import annotations
+from typing import Dict
+
+import numpy as np
+
+# Direction a pattern predicts: +1 bullish, -1 bearish, 0 indecision
+DIRECTION = {
+    "hammer": 1,
+    "shooting_star": -1,
+    "bullish_engulfing": 1,
+    "bearish_engulfing": -1,
+    "doji": 0,
+    "bullish_harami": 1,
+    "bearish_harami": -1,
+    "morning_star": 1,
+    "evening_star": -1,
+    "three_white_soldiers": 1,
+    "three_black_crows": -1,
+    "long_lower_shadow": 1,
+    "long_upper_shadow": -1,
+}
+
+
+def _shift(x: np.ndarray, k: int) -> np.ndarray:
+    """Value k bars back; the first k positions are NaN so every test on them is False"""
+    out = np.full(x.shape, np.nan)
+    out[..., k:] = x[..., :-k]
+    return out
+
+
+def scan(open_, high, low, close) -> Dict[str, np.ndarray]:
+    """Boolean mask per pattern for every bar"""
+    o, h, l, c = (np.asarray(a, dtype=np.float64) for a in (open_, high, low, close))
+    body = np.abs(c - o)
+    upper = h - np.maximum(o, c)
+    lower = np.minimum(o, c) - l
+    bull = c > o
+    bear = c < o
+
+    o1, c1, o2, c2 = _shift(o, 1), _shift(c, 1), _shift(o, 2), _shift(c, 2)
+    body1, body2 = np.abs(c1 - o1), np.abs(c2 - o2)
+    bull1, bear1 = c1 > o1, c1 < o1
+    bull2, bear2 = c2 > o2, c2 < o2
+
+    masks = {
+        "hammer": (lower > body * 2) & (upper < body * 0.3),
+        "shooting_star": (upper > body * 2) & (lower < body * 0.3),
+        "bullish_engulfing": bear1 & bull & (c > o1) & (o < c1),
+        "bearish_engulfing": bull1 & bear & (c < o1) & (o > c1),
+        "doji": (h > l) & (body <= (h - l) * 0.1),
+        "bullish_harami": bear1 & bull & (o > c1) & (c < o1),
+        "bearish_harami": bull1 & bear & (o < c1) & (c > o1),
+        "morning_star": bear2 & (body1 < body2 * 0.3) & bull & (c > (o2 + c2) / 2),
+        "evening_star": bull2 & (body1 < body2 * 0.3) & bear & (c < (o2 + c2) / 2),
+        "three_white_soldiers": (
+            bull2 & bull1 & bull & (c1 > c2) & (c > c1)
+            & (o1 > o2) & (o1 < c2) & (o > o1) & (o < c1)
+        ),
+        "three_black_crows": (
+            bear2 & bear1 & bear & (c1 < c2) & (c < c1)
+            & (o1 < o2) & (o1 > c2) & (o < o1) & (o > c1)
+        ),
+        # the looser shadow checks simple_ta_signal reports
+        "long_lower_shadow": lower > body * 2,
+        "long_upper_shadow": upper > body * 2,
+    }
+    return masks
+
+
+def hit_stats(masks: Dict[str, np.ndarray], close, horizon: int = 1) -> Dict[str, Dict[str, float]]:
+    """
+    How often each directional pattern was followed by a move its way
+    ``horizon`` bars later.  Returns {pattern: {"count", "hits", "hit_rate"}};
+    for a (pairs x bars) input the numbers are per row arrays.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    move = np.zeros(close.shape)
+    move[..., :-horizon] = np.sign(close[..., horizon:] - close[..., :-horizon])
+    scored = np.zeros(close.shape, dtype=bool)
+    scored[..., :-horizon] = True
+
+    stats = {}
+    for name, mask in masks.items():
+        direction = DIRECTION.get(name, 0)
+        if not direction:
+            continue
+        seen = mask & scored
+        count = seen.sum(axis=-1)
+        hits = (seen & (move == direction)).sum(axis=-1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rate = np.where(count > 0, hits / np.maximum(count, 1), np.nan)
+        stats[name] = {"count": count, "hits": hits, "hit_rate": rate}
+    return stats
@@ -0,0 +1,427 @@
+# app/analysis/scoring.py
+"""
+Learned scoring stage next to the hand-tuned rules.
+
+Every bar gets a fixed feature vector built from the indicator and pattern
+outputs of its FeatureFrame (node ``model_features``, shape
+``(..., bars, len(FEATURES))``), and a small pure-NumPy model turns it into
+the probability that the close is higher ``expiry`` bars later.  Two model
+kinds are supported:
+
+* ``linear`` — logistic regression, one dot product per row;
+* ``stumps`` — gradient-boosted decision stumps, folded into one lookup
+  table per feature.
+
+Either way a whole batch of (pair, timeframe) rows is scored in one call.
+The probability is mapped to the 0..100 scale of
+``FastPredictionEngine._combine_signals``, so the same thresholds turn it
+into a signal.  Without a model file the rules work as before.
+
+Обучение на метках бэктеста (движение цены через ``expiry`` баров):
+
+    python -m app.analysis.scoring train [--csv EURUSD_1m.csv ...] [--kind stumps] [--out scoring_model.json]
+    python -m app.analysis.scoring bench [--rows 1000000]
+"""
+from __future__ import annotations
+import argparse
+import datetime
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import kernels
+from .backtest import _moves, load_history, synthetic_history
+from .fast_prediction import PATTERN_STRENGTH
+from .features import FeatureFrame, feature
+from .params import DEFAULT, IndicatorParams
+from ..config import SCORING_MODEL_FILE
+
+logger = logging.getLogger(__name__)
+
+FEATURES = (
+    "rsi",          # (RSI - 50) / 50
+    "ema_spread",   # (EMA fast - EMA slow) / close, per mille
+    "macd_hist",    # MACD histogram / close, per mille
+    "bb_position",  # (close - BB mid) / (BB upper - BB mid)
+    "range_20",     # position in the 20-bar high/low range, -0.5..0.5
+    "return_1",     # last bar's close-to-close return, per mille
+    "pattern",      # (pattern strength - 50) / 50
+    "volume",       # log(volume / running average volume), 0 without volume
+)
+# bars before MACD(12, 26, 9) and BB(20) are defined; not used for training
+WARMUP = 35
+
+
+@feature(
+    "model_features",
+    "close", "rsi", "ema_fast", "ema_slow", "macd_hist", "bb_upper", "bb_mid",
+    "rolling_high_20", "rolling_low_20", "patterns", "volume",
+)
+def _model_features(close, rsi, ema_fast, ema_slow, macd_hist, bb_upper, bb_mid, high_20, low_20, masks, volume):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        prev = np.full(close.shape, np.nan)
+        prev[..., 1:] = close[..., :-1]
+        width = high_20 - low_20
+        columns = [
+            (rsi - 50) / 50,
+            (ema_fast - ema_slow) / close * 1000,
+            macd_hist / close * 1000,
+            np.where(bb_upper > bb_mid, (close - bb_mid) / (bb_upper - bb_mid), 0.0),
+            np.where(width > 0, (close - low_20) / width - 0.5, 0.0),
+            (close / prev - 1) * 1000,
+            (np.select([masks[name] for name, _ in PATTERN_STRENGTH],
+                       [v for _, v in PATTERN_STRENGTH], 50) - 50) / 50,
+        ]
+        if volume is None:
+            columns.append(np.zeros(close.shape))
+        else:
+            seen = np.cumsum(volume == volume, axis=-1)
+            avg = np.cumsum(np.nan_to_num(volume), axis=-1) / np.maximum(seen, 1)
+            columns.append(np.where((avg > 0) & (volume > 0), np.log(volume / avg), 0.0))
+    # undefined values (warm-up, flat prices) are neutral
+    return np.nan_to_num(np.stack(columns, axis=-1), nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+
+# --- models ----------------------------------------------------------------------
+
+class LinearModel:
+    """Logistic regression over FEATURES"""
+    kind = "linear"
+
+    def __init__(self, weights: Sequence[float], bias: float = 0.0, meta: Optional[Mapping] = None):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        self.meta = dict(meta or {})
+
+    def decision(self, X: np.ndarray) -> np.ndarray:
+        return X @ self.weights + self.bias
+
+    def to_dict(self) -> dict:
+        return {"weights": self.weights.tolist(), "bias": self.bias}
+
+    @classmethod
+    def from_dict(cls, data: Mapping, meta: Optional[Mapping] = None) -> "LinearModel":
+        return cls(data["weights"], data.get("bias", 0.0), meta)
+
+
+class StumpModel:
+    """Gradient-boosted stumps: ``bias + sum(left if x[feature] <= threshold else right)``"""
+    kind = "stumps"
+
+    def __init__(self, feature: Sequence[int], threshold: Sequence[float], left: Sequence[float],
+                 right: Sequence[float], bias: float = 0.0, meta: Optional[Mapping] = None):
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.float64)
+        self.right = np.asarray(right, dtype=np.float64)
+        self.bias = float(bias)
+        self.meta = dict(meta or {})
+        self._tables = self._compile()
+
+    def _compile(self) -> List[Tuple[int, np.ndarray, np.ndarray]]:
+        """
+        Sum of all stumps on one feature is a step function of that feature:
+        (feature, sorted thresholds, value per interval).  Scoring is then one
+        searchsorted per used feature instead of one comparison per stump.
+        """
+        tables = []
+        for j in np.unique(self.feature):
+            mine = self.feature == j
+            cuts, inverse = np.unique(self.threshold[mine], return_inverse=True)
+            left = np.bincount(inverse, self.left[mine], minlength=len(cuts))
+            right = np.bincount(inverse, self.right[mine], minlength=len(cuts))
+            # interval i: x above the first i cuts -> their right values, left values of the rest
+            values = np.r_[0.0, np.cumsum(right)] + np.r_[np.cumsum(left[::-1])[::-1], 0.0]
+            tables.append((int(j), cuts, values))
+        return tables
+
+    def decision(self, X: np.ndarray) -> np.ndarray:
+        out = np.full(X.shape[:-1], self.bias)
+        for j, cuts, values in self._tables:
+            out += values[np.searchsorted(cuts, X[..., j], side="left")]
+        return out
+
+    def to_dict(self) -> dict:
+        return {
+            "feature": self.feature.tolist(), "threshold": self.threshold.tolist(),
+            "left": self.left.tolist(), "right": self.right.tolist(), "bias": self.bias,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Mapping, meta: Optional[Mapping] = None) -> "StumpModel":
+        return cls(data["feature"], data["threshold"], data["left"], data["right"], data.get("bias", 0.0), meta)
+
+
+MODELS = {cls.kind: cls for cls in (LinearModel, StumpModel)}
+
+_model = None
+
+
+def current():
+    """Loaded model or None (the rules decide alone)"""
+    return _model
+
+
+def load(path: str) -> bool:
+    """Load the scoring model written by ``train``; returns True when one is active"""
+    global _model
+    if not path or not os.path.exists(path):
+        return False
+    try:
+        with open(path, encoding="utf-8") as fh:
+            data = json.load(fh)
+        if list(data.get("features", ())) != list(FEATURES):
+            raise ValueError("feature set differs from this version")
+        model = MODELS[data["kind"]].from_dict(data["model"], data.get("meta"))
+    except (OSError, ValueError, TypeError, KeyError) as e:
+        logger.warning(f"Scoring model {path} ignored: {e}")
+        return False
+    _model = model
+    return True
+
+
+def save(path: str, model, meta: Optional[Mapping] = None):
+    data = {"kind": model.kind, "features": list(FEATURES), "model": model.to_dict()}
+    if meta:
+        data["meta"] = dict(meta)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(data, fh, indent=2)
+    os.replace(tmp, path)
+
+
+# --- scoring -----------------------------------------------------------------------
+
+def probability(model, X: np.ndarray) -> np.ndarray:
+    """P(close is higher after the model's expiry) for every row of ``X``"""
+    return _sigmoid(model.decision(X))
+
+
+def model_params(model) -> IndicatorParams:
+    """Indicator parameters the model was trained with (older files: the defaults)"""
+    return IndicatorParams.from_dict(model.meta.get("params", {}))
+
+
+def score_frames(frames: Sequence[FeatureFrame], model=None) -> np.ndarray:
+    """
+    0..100 score of the last bar of each frame, scored as one batch.
+    Frames may be batched themselves (one row per pair).  Features are
+    computed under the model's training parameters, not the frame's tuned
+    ones, so live rows look like the training rows.
+    """
+    model = model or _model
+    params = model_params(model)
+    X = np.concatenate([np.atleast_2d(f.with_params(params)["model_features"][..., -1, :]) for f in frames])
+    return 100.0 * probability(model, X)
+
+
+def score_label(score: float) -> str:
+    """Signal for a 0..100 score, thresholds of ``_combine_signals``"""
+    if score > 65:
+        return "📈 STRONG BUY"
+    elif score > 55:
+        return "📈 BUY"
+    elif score < 35:
+        return "📉 STRONG SELL"
+    elif score < 45:
+        return "📉 SELL"
+    return "⏸ HOLD"
+
+
+# --- training ------------------------------------------------------------------------
+
+def dataset(histories: Mapping[Tuple[str, str], pd.DataFrame], expiry: int = 1,
+            params: IndicatorParams = DEFAULT) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (X, y, t) over every history: one row per bar with a known, non-flat move
+    after ``expiry`` bars; ``t`` is the bar's position in [0, 1) of its history,
+    used for the time split.
+    """
+    frames = [FeatureFrame.of(df, params) for df in histories.values()]
+    columns = {c: kernels.stack_series([fr[c] for fr in frames]) for c in ("open", "high", "low", "close")}
+    if any(fr["volume"] is not None for fr in frames):
+        # histories without volume become NaN rows, which the volume feature reads as 0
+        columns["volume"] = kernels.stack_series([
+            fr["volume"] if fr["volume"] is not None else np.full(len(fr), np.nan) for fr in frames
+        ])
+    batch = FeatureFrame(**columns, params=params)
+    X = batch["model_features"][:, :-expiry]
+    move = _moves(batch["close"], expiry)
+    nobs = batch["nobs"][:, :-expiry]
+    keep = (move == move) & (move != 0) & (nobs > WARMUP)
+    # position inside each history (rows are left-padded to the longest one)
+    t = (nobs - 1) / np.maximum(nobs[:, -1:], 1)
+    return X[keep], (move[keep] > 0).astype(np.float64), t[keep]
+
+
+def fit_linear(X: np.ndarray, y: np.ndarray, l2: float = 1.0, iterations: int = 20) -> LinearModel:
+    """Logistic regression by Newton steps (few features, so the Hessian is tiny)"""
+    A = np.hstack([X, np.ones((len(X), 1))])
+    w = np.zeros(A.shape[1])
+    reg = np.full(A.shape[1], l2)
+    reg[-1] = 0.0  # no penalty on the bias
+    for _ in range(iterations):
+        p = _sigmoid(A @ w)
+        grad = A.T @ (p - y) + reg * w
+        hess = (A * (p * (1 - p))[:, None]).T @ A + np.diag(reg) + 1e-9 * np.eye(A.shape[1])
+        step = np.linalg.solve(hess, grad)
+        w -= step
+        if np.abs(step).max() < 1e-8:
+            break
+    return LinearModel(w[:-1], w[-1])
+
+
+def fit_stumps(X: np.ndarray, y: np.ndarray, rounds: int = 200, learning_rate: float = 0.1,
+               bins: int = 32, l2: float = 1.0) -> StumpModel:
+    """
+    Gradient boosting of depth-1 trees on the logistic loss.  Features are
+    cut into quantile bins once; each round is a bincount of gradients and
+    hessians per feature, so a round costs O(rows x features).
+    """
+    n, k = X.shape
+    edges = [np.unique(np.quantile(X[:, j], np.linspace(0, 1, bins + 1)[1:-1])) for j in range(k)]
+    codes = np.stack([np.searchsorted(edges[j], X[:, j], side="left") for j in range(k)], axis=1)
+    width = bins
+    # codes of feature j live in [j * width, (j + 1) * width)
+    flat = codes + np.arange(k) * width
+
+    prior = float(np.clip(y.mean(), 1e-6, 1 - 1e-6))
+    bias = float(np.log(prior / (1 - prior)))
+    z = np.full(n, bias)
+    stumps = []
+    for _ in range(rounds):
+        p = _sigmoid(z)
+        g, h = y - p, p * (1 - p)
+        G = np.bincount(flat.ravel(), np.repeat(g, k), minlength=k * width).reshape(k, width)
+        H = np.bincount(flat.ravel(), np.repeat(h, k), minlength=k * width).reshape(k, width)
+        GL, HL = np.cumsum(G, axis=1)[:, :-1], np.cumsum(H, axis=1)[:, :-1]
+        GR, HR = G.sum(axis=1, keepdims=True) - GL, H.sum(axis=1, keepdims=True) - HL
+        gain = GL ** 2 / (HL + l2) + GR ** 2 / (HR + l2)
+        # only cuts that exist: bin b splits at edges[j][b]
+        for j in range(k):
+            gain[j, len(edges[j]):] = -np.inf
+        j, b = np.unravel_index(int(np.argmax(gain)), gain.shape)
+        if not np.isfinite(gain[j, b]):
+            break
+        left = learning_rate * GL[j, b] / (HL[j, b] + l2)
+        right = learning_rate * GR[j, b] / (HR[j, b] + l2)
+        z += np.where(codes[:, j] <= b, left, right)
+        stumps.append((j, edges[j][b], left, right))
+    if not stumps:
+        return StumpModel([], [], [], [], bias)
+    feature, threshold, left, right = zip(*stumps)
+    return StumpModel(feature, threshold, left, right, bias)
+
+
+def evaluate(model, X: np.ndarray, y: np.ndarray, margin: float = 0.05) -> Dict[str, float]:
+    """Accuracy on every row, and hit rate where the model is confident (|p - 0.5| > margin)"""
+    p = probability(model, X)
+    confident = np.abs(p - 0.5) > margin
+    hits = (p > 0.5) == (y > 0.5)
+    return {
+        "accuracy": float(hits.mean()) if len(y) else float("nan"),
+        "signals": int(confident.sum()),
+        "hit_rate": float(hits[confident].mean()) if confident.any() else float("nan"),
+        "log_loss": float(-np.mean(y * np.log(p + 1e-12) + (1 - y) * np.log(1 - p + 1e-12))) if len(y) else float("nan"),
+    }
+
+
+def throughput(model, rows: int = 1_000_000, seed: int = 0) -> float:
+    """Rows per second for batched scoring of a random (rows x features) matrix"""
+    X = np.random.default_rng(seed).normal(size=(rows, len(FEATURES)))
+    probability(model, X[:1000])
+    start = time.perf_counter()
+    probability(model, X)
+    elapsed = time.perf_counter() - start
+    return rows / elapsed if elapsed else float("inf")
+
+
+def train(histories: Mapping[Tuple[str, str], pd.DataFrame], kind: str = "stumps", expiry: int = 1,
+          holdout: float = 0.2, params: IndicatorParams = DEFAULT, **kwargs):
+    """
+    Fit on the first ``1 - holdout`` of every history, report on the rest,
+    then refit on everything.  Returns (model, report); save ``params`` in
+    the model's meta so scoring uses the same ones.
+    """
+    X, y, t = dataset(histories, expiry, params)
+    fit = fit_stumps if kind == "stumps" else fit_linear
+    split = t < 1 - holdout
+    start = time.perf_counter()
+    model = fit(X[split], y[split], **kwargs)
+    seconds = time.perf_counter() - start
+    report = {
+        "rows": int(len(y)),
+        "fit_seconds": seconds,
+        "train": evaluate(model, X[split], y[split]),
+        "holdout": evaluate(model, X[~split], y[~split]),
+    }
+    return fit(X, y, **kwargs), report
+
+
+# --- CLI -------------------------------------------------------------------------------
+
+def _histories(args) -> Dict[Tuple[str, str], pd.DataFrame]:
+    if args.csv:
+        return dict(load_history(p) for p in args.csv)
+    return {
+        (f"SYN{i:02d}", args.timeframe): synthetic_history(f"SYN{i:02d}", args.timeframe, args.bars, seed=i)
+        for i in range(args.pairs)
+    }
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="Train or benchmark the signal scoring model")
+    parser.add_argument("command", choices=("train", "bench"))
+    parser.add_argument("--csv", nargs="*", default=[], help="imported histories, e.g. EURUSD_5m.csv")
+    parser.add_argument("--pairs", type=int, default=20, help="synthetic pairs when no CSV is given")
+    parser.add_argument("--bars", type=int, default=5000, help="bars per synthetic pair")
+    parser.add_argument("--timeframe", default="1m")
+    parser.add_argument("--kind", choices=tuple(MODELS), default="stumps")
+    parser.add_argument("--expiry", type=int, default=1, help="label horizon in bars")
+    parser.add_argument("--rounds", type=int, default=200, help="boosting rounds (stumps)")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="rows for the throughput benchmark")
+    parser.add_argument("--model", default=SCORING_MODEL_FILE, help="model to benchmark")
+    parser.add_argument("--out", default=SCORING_MODEL_FILE)
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        if load(args.model):
+            models = [current()]
+        else:
+            k = len(FEATURES)
+            models = [LinearModel(np.zeros(k)), StumpModel(np.arange(200) % k, np.zeros(200), np.zeros(200), np.zeros(200))]
+        for model in models:
+            print(f"{model.kind}: {throughput(model, args.rows) / 1e6:.1f}M rows/s")
+        return
+
+    kwargs = {"rounds": args.rounds} if args.kind == "stumps" else {}
+    model, report = train(_histories(args), args.kind, args.expiry, **kwargs)
+    for part in ("train", "holdout"):
+        r = report[part]
+        print(f"{part:8s} accuracy {r['accuracy']:.4f}  hit rate {r['hit_rate']:.4f} "
+              f"on {r['signals']} confident rows  log loss {r['log_loss']:.4f}")
+    rate = throughput(model)
+    print(f"\n{report['rows']:,} rows, fit {report['fit_seconds']:.2f}s, scoring {rate / 1e6:.1f}M rows/s")
+
+    save(args.out, model, meta={
+        "generated": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "expiry_bars": args.expiry,
+        "params": DEFAULT.to_dict(),
+        "rows": report["rows"],
+        "holdout": report["holdout"],
+        "rows_per_second": rate,
+    })
+    print(f"Saved {args.kind} model to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -39,6 +39,50 @@ CACHE_TTL_SECONDS  = _env_int("CACHE_TTL_SECONDS", 60)
 ENABLE_CHARTS      = _env_bool("ENABLE_CHARTS", False)
 PAIR_TIMEFRAME     = _env_str("PAIR_TIMEFRAME", "15m")
 
+# -----------------------
+# Доставка апдейтов: webhook, если задан публичный URL, иначе long polling
+# -----------------------
+WEBHOOK_URL         = _env_str("WEBHOOK_URL", "").rstrip("/")       # https://bot.example.com
+WEBHOOK_PATH        = _env_str("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET      = _env_str("WEBHOOK_SECRET", "")                 # пусто — случайный при каждом старте
+WEBHOOK_CONCURRENCY = _env_int("WEBHOOK_CONCURRENCY", 32)            # апдейтов в обработке одновременно
+HTTP_PORT           = _env_int("PORT", 8080)                         # /metrics и webhook
+TG_RATE             = _env_float("TG_RATE", 25.0)                    # исходящих сообщений/с на бота
+TG_CHAT_RATE        = _env_float("TG_CHAT_RATE", 1.0)                # сообщений/с в один чат
+TG_CHAT_BURST       = _env_float("TG_CHAT_BURST", 3.0)               # сколько можно отправить в чат подряд
+
+# -----------------------
+# Очередь прогнозов: сколько считается одновременно и сколько может ждать
+# -----------------------
+FORECAST_WORKERS    = _env_int("FORECAST_WORKERS", 4)
+FORECAST_QUEUE_SIZE = _env_int("FORECAST_QUEUE_SIZE", 64)           # больше — сразу «занято, попробуйте позже»
+MAX_CONCURRENT_FETCHES = _env_int("MAX_CONCURRENT_FETCHES", 3)      # прогнозов мимо кеша, фетчащих одновременно
+USER_FORECASTS_PER_MIN = _env_float("USER_FORECASTS_PER_MIN", 6.0)  # фетчей на пользователя в минуту, дальше — кеш
+USER_FORECAST_BURST    = _env_float("USER_FORECAST_BURST", 3.0)
+CACHE_STALE_SECONDS    = _env_int("CACHE_STALE_SECONDS", 900)        # сколько ещё хранить свечи после CACHE_TTL_SECONDS
+
+# -----------------------
+# /scan: все пары категории за один проход
+# -----------------------
+SCAN_CONCURRENCY = _env_int("SCAN_CONCURRENCY", 2)        # загрузок свечей одного скана одновременно
+SCAN_BUDGET_SEC  = _env_float("SCAN_BUDGET_SEC", 20.0)    # дальше — частичный результат
+SCAN_TOP         = _env_int("SCAN_TOP", 5)                # сколько сетапов BUY и SELL показывать
+
+# -----------------------
+# FSM-хранилище: общее для нескольких процессов и переживает рестарт
+# -----------------------
+FSM_STORAGE         = _env_str("FSM_STORAGE", "sqlite:///fsm.sqlite3")  # memory | sqlite:///path | redis://host:6379/0
+FSM_TTL             = _env_int("FSM_TTL", 86400)                     # секунд с последней записи; 0 — без срока
+
+# -----------------------
+# Analysis
+# -----------------------
+INDICATOR_BACKEND  = _env_str("INDICATOR_BACKEND", "auto").lower()   # auto | numpy | numba
+INDICATOR_PARAMS_FILE = _env_str("INDICATOR_PARAMS_FILE", "indicator_params.json")  # см. app.analysis.optimize
+SCORING_MODEL_FILE = _env_str("SCORING_MODEL_FILE", "scoring_model.json")  # см. app.analysis.scoring
+FORECAST_LOG_DIR   = _env_str("FORECAST_LOG_DIR", "forecast_log")   # журнал прогнозов и исходов; пусто — только в памяти
+SPIKE_FILTER       = _env_str("SPIKE_FILTER", "clamp").lower()      # clamp | drop | flag | off — выбросы во входящих свечах
+
 # -----------------------
 # PocketOption UI-scraping
 # -----------------------
@@ -92,6 +136,12 @@ PO_FETCH_ORDER     = _env_str("PO_FETCH_ORDER", "po,interceptor,ocr").split(",")
 PO_USE_INTERCEPTOR = _env_bool("PO_USE_INTERCEPTOR", True)
 PO_USE_OCR         = _env_bool("PO_USE_OCR", False)
 
+# -----------------------
+# Доступность пар (таблица активов)
+# -----------------------
+AVAILABILITY_REFRESH_SEC = _env_int("AVAILABILITY_REFRESH_SEC", 60)
+AVAILABILITY_TIMEOUT     = _env_float("AVAILABILITY_TIMEOUT", 8.0)
+
 # -----------------------
 # Public API keys
 # -----------------------
@@ -116,6 +166,15 @@ def _mask_proxy(proxy: str) -> str:
     except:
         return proxy
 
+def _mask_url(url: str) -> str:
+    try:
+        u = urlparse(url)
+        if u.password:
+            return url.replace(f":{u.password}@", ":******@", 1)
+        return url
+    except:
+        return url
+
 # -----------------------
 # Log config summary
 # -----------------------
@@ -127,6 +186,32 @@ try:
         "CACHE_TTL_SECONDS": CACHE_TTL_SECONDS,
         "ENABLE_CHARTS": ENABLE_CHARTS,
         "PAIR_TIMEFRAME": PAIR_TIMEFRAME,
+        "WEBHOOK_URL": WEBHOOK_URL,
+        "WEBHOOK_PATH": WEBHOOK_PATH,
+        "WEBHOOK_SECRET": _mask_secret(WEBHOOK_SECRET),
+        "WEBHOOK_CONCURRENCY": WEBHOOK_CONCURRENCY,
+        "HTTP_PORT": HTTP_PORT,
+        "TG_RATE": TG_RATE,
+        "TG_CHAT_RATE": TG_CHAT_RATE,
+        "TG_CHAT_BURST": TG_CHAT_BURST,
+        "FORECAST_WORKERS": FORECAST_WORKERS,
+        "FORECAST_QUEUE_SIZE": FORECAST_QUEUE_SIZE,
+        "MAX_CONCURRENT_FETCHES": MAX_CONCURRENT_FETCHES,
+        "USER_FORECASTS_PER_MIN": USER_FORECASTS_PER_MIN,
+        "USER_FORECAST_BURST": USER_FORECAST_BURST,
+        "CACHE_STALE_SECONDS": CACHE_STALE_SECONDS,
+        "SCAN_CONCURRENCY": SCAN_CONCURRENCY,
+        "SCAN_BUDGET_SEC": SCAN_BUDGET_SEC,
+        "SCAN_TOP": SCAN_TOP,
+        "FSM_STORAGE": _mask_url(FSM_STORAGE),
+        "FSM_TTL": FSM_TTL,
+        "AVAILABILITY_REFRESH_SEC": AVAILABILITY_REFRESH_SEC,
+        "AVAILABILITY_TIMEOUT": AVAILABILITY_TIMEOUT,
+        "INDICATOR_BACKEND": INDICATOR_BACKEND,
+        "INDICATOR_PARAMS_FILE": INDICATOR_PARAMS_FILE,
+        "SCORING_MODEL_FILE": SCORING_MODEL_FILE,
+        "FORECAST_LOG_DIR": FORECAST_LOG_DIR,
+        "SPIKE_FILTER": SPIKE_FILTER,
         "PO_ENABLE_SCRAPE": PO_ENABLE_SCRAPE,
         "PO_PROXY_FIRST": PO_PROXY_FIRST,
         "PO_PROXY": _mask_proxy(PO_PROXY),
@@ -0,0 +1,247 @@
+# app/data_sources/asset_status.py
+"""
+Торговый статус всех активов PocketOption за один проход.
+
+Right after a socket.io session is set up the PocketOption server pushes
+``updateAssets`` — one table with every asset — and pushes it again when
+something opens or closes.  So one session answers for every pair in
+``ALL_PAIRS`` and ``OTC_PAIRS`` at once, and later refreshes only read the
+table that the pushes keep current; nothing is probed per pair or per user.
+
+The table belongs to its session: it is cleared when the session drops
+(a reconnect starts empty and waits for its own push), and a table older than ``max_age`` whose session cannot be
+confirmed alive is not used.  Only a push with the whole table
+(``FULL_TABLE_ROWS`` assets or more) says anything about assets it does
+not list; smaller pushes are deltas and update just their rows.
+
+Sources, tried in order:
+
+- the candle WebSocket session (``PO_USE_WS_FETCHER``), shared with
+  ``WebSocketFetcher``;
+- one warm browser page (``PO_USE_BROWSER_WS``) that listens to the
+  site's own socket.
+
+A table row is a list, ``[id, symbol, name, type, group, payout, ...]``,
+with the "open for trading" flag at index 14; OTC symbols end in
+``_otc`` (``EURUSD_otc``).  Dict rows with ``symbol`` / ``is_active`` are
+accepted too.
+"""
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from ..config import (
+    AVAILABILITY_REFRESH_SEC, PO_ENTRY_URL, PO_NAV_TIMEOUT_MS, PO_USE_BROWSER_WS, PO_USE_WS_FETCHER,
+)
+from .ws_fetcher import WebSocketFetcher, shared_fetcher
+
+logger = logging.getLogger(__name__)
+
+# (po symbol, otc) -> open for trading
+Status = Dict[Tuple[str, bool], bool]
+# status plus whether it is the whole table (False: only the listed assets are known)
+Table = Tuple[Status, bool]
+
+_SYMBOL, _PAYOUT, _ACTIVE = 1, 5, 14
+# PocketOption's table lists a few hundred assets; a push with fewer is a delta
+FULL_TABLE_ROWS = 50
+
+
+def _decode(payload: Any) -> Any:
+    if isinstance(payload, (bytes, bytearray)):
+        payload = bytes(payload)
+        # engine.io v3 prefixes binary frames with 0x04
+        if payload[:1] == b"\x04":
+            payload = payload[1:]
+        payload = payload.decode("utf-8")
+    if isinstance(payload, str):
+        payload = json.loads(payload)
+    return payload
+
+
+def parse_assets(payload: Any) -> Status:
+    """``updateAssets`` payload -> status per (symbol, otc); unknown rows are skipped"""
+    status: Status = {}
+    for row in _decode(payload) or ():
+        try:
+            if isinstance(row, dict):
+                symbol, active = row["symbol"], row.get("is_active", True)
+            else:
+                symbol = row[_SYMBOL]
+                active = row[_ACTIVE] if len(row) > _ACTIVE and isinstance(row[_ACTIVE], bool) else row[_PAYOUT] > 0
+        except (IndexError, KeyError, TypeError):
+            continue
+        if not isinstance(symbol, str) or symbol.startswith("#"):
+            continue  # stocks, indices ...
+        otc = symbol.lower().endswith("_otc")
+        status[(symbol[:-4] if otc else symbol).upper(), otc] = bool(active)
+    return status
+
+
+class AssetTable:
+    """Latest status per asset of one session, merged from every push"""
+
+    def __init__(self):
+        self.status: Status = {}
+        self.full = False  # a whole-table push arrived in this session
+        self.updated_at = 0.0  # last push, or last time the session was seen alive
+        self.pushes = 0
+
+    def clear(self):
+        """Session dropped or restarted: its table no longer holds"""
+        self.status = {}
+        self.full = False
+        self.updated_at = 0.0
+
+    def update(self, payload: Any):
+        try:
+            status = parse_assets(payload)
+        except Exception as e:
+            logger.warning("Bad updateAssets payload: %s", e)
+            return
+        if not status:
+            return
+        if len(status) >= FULL_TABLE_ROWS:
+            self.status = status
+            self.full = True
+        else:
+            self.status.update(status)
+        self.updated_at = time.monotonic()
+        self.pushes += 1
+
+    def confirm(self):
+        """The session is alive, so pushes keep the table current"""
+        if self.status:
+            self.updated_at = time.monotonic()
+
+    async def wait(self, deadline: float, max_age: float) -> Optional[Table]:
+        while not self.status and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if not self.status:
+            return None
+        if time.monotonic() - self.updated_at > max_age:
+            logger.warning("Asset status: table is %.0fs old, ignored", time.monotonic() - self.updated_at)
+            return None
+        return dict(self.status), self.full
+
+
+class WSAssetStatus:
+    """Asset table from the candle WebSocket session"""
+
+    def __init__(self, fetcher: WebSocketFetcher):
+        self.fetcher = fetcher
+        self.table = AssetTable()
+        fetcher.sio.on("updateAssets", self.table.update)
+        fetcher.disconnect_hooks.append(self.table.clear)
+
+    async def probe(self, timeout: float, max_age: float) -> Optional[Table]:
+        deadline = time.monotonic() + timeout
+        try:
+            await asyncio.wait_for(self.fetcher.connect(), timeout)
+        except Exception as e:
+            logger.warning("Asset status: WS session unavailable: %s", e)
+            return None
+        if self.fetcher.sio.connected:
+            self.table.confirm()
+        return await self.table.wait(deadline, max_age)
+
+
+class BrowserAssetStatus:
+    """Asset table from one browser page kept open between refreshes"""
+
+    def __init__(self):
+        self.table = AssetTable()
+        self._pw = None
+        self._browser = None
+        self._page = None
+        self._binary_next = False
+        self._socket = None
+        self._lock = asyncio.Lock()
+
+    def _on_socket(self, ws):
+        self._socket = ws
+        self.table.clear()
+        ws.on("framereceived", self._on_frame)
+        ws.on("close", lambda _: self.table.clear())
+
+    def _on_frame(self, data: Any):
+        try:
+            if isinstance(data, (bytes, bytearray)) or (isinstance(data, str) and data[:1] == "["):
+                if self._binary_next:
+                    # the table itself, sent as a socket.io binary attachment
+                    self._binary_next = False
+                    self.table.update(data)
+                return
+            if '"updateAssets"' in data:
+                body = json.loads(data[data.index("["):])
+                if isinstance(body[1], dict) and body[1].get("_placeholder"):
+                    self._binary_next = True
+                else:
+                    self.table.update(body[1])
+        except Exception as e:
+            logger.debug("Asset status: skipped frame: %s", e)
+
+    async def _open(self):
+        from playwright.async_api import async_playwright
+        self._pw = await async_playwright().start()
+        self._browser = await self._pw.chromium.launch()
+        self._page = await self._browser.new_page()
+        self._page.on("websocket", self._on_socket)
+        await self._page.goto(PO_ENTRY_URL, timeout=PO_NAV_TIMEOUT_MS)
+
+    async def probe(self, timeout: float, max_age: float) -> Optional[Table]:
+        deadline = time.monotonic() + timeout
+        async with self._lock:
+            if self._page is None or self._page.is_closed():
+                try:
+                    await asyncio.wait_for(self._open(), timeout)
+                except Exception as e:
+                    logger.warning("Asset status: browser page unavailable: %s", e)
+                    await self.close()
+                    return None
+        if self._socket is not None and not self._socket.is_closed():
+            self.table.confirm()
+        return await self.table.wait(deadline, max_age)
+
+    async def close(self):
+        for closer in (self._browser, self._pw):
+            if closer is not None:
+                try:
+                    await (closer.close() if closer is self._browser else closer.stop())
+                except Exception:
+                    pass
+        self._pw = self._browser = self._page = self._socket = None
+        self.table.clear()
+
+
+_sources: Optional[list] = None
+
+
+def sources() -> list:
+    global _sources
+    if _sources is None:
+        _sources = []
+        if PO_USE_WS_FETCHER:
+            _sources.append(WSAssetStatus(shared_fetcher()))
+        if PO_USE_BROWSER_WS:
+            _sources.append(BrowserAssetStatus())
+    return _sources
+
+
+async def probe(timeout: float = 8.0, max_age: float = AVAILABILITY_REFRESH_SEC) -> Optional[Table]:
+    """
+    (status, full) from the first source that answers within ``timeout``
+    with a table no older than ``max_age``; None if none does
+    """
+    deadline = time.monotonic() + timeout
+    for source in sources():
+        left = deadline - time.monotonic()
+        if left <= 0:
+            break
+        table = await source.probe(left, max_age)
+        if table:
+            return table
+    return None
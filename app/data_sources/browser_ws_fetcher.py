@@ -4,12 +4,13 @@ import asyncio
 import pandas as pd
 from playwright.async_api import async_playwright
 from ..config import PO_BROWSER_WS_URL, PO_ENTRY_URL, PO_NAV_TIMEOUT_MS, PO_IDLE_TIMEOUT_MS
+from ..utils.candles import CandleSeries
 
 class BrowserWebSocketFetcher:
     def __init__(self):
         self._lock = asyncio.Lock()
 
-    async def fetch(self, symbol: str, timeframe: str, otc: bool=False) -> pd.DataFrame:
+    async def fetch(self, symbol: str, timeframe: str, otc: bool=False) -> CandleSeries:
         async with self._lock:
             async with async_playwright() as pw:
                 browser = await pw.chromium.launch()
@@ -53,8 +54,6 @@ class BrowserWebSocketFetcher:
                             continue
 
                 if not raw:
-                    return pd.DataFrame()
+                    return CandleSeries.empty_series()
 
-                df = pd.DataFrame(raw, columns=["timestamp","open","high","low","close"])
-                df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms")
-                return df
+                return CandleSeries.from_records(raw)
@@ -0,0 +1,114 @@
+# app/data_sources/canonical.py
+"""
+Нормализация свечей от любого провайдера — один проход на результат фетча.
+
+Every provider result goes through ``canonicalize`` before it leaves
+CompositeFetcher, so analysis always sees the same thing: a CandleSeries
+with float64 OHLC, int64 epoch-ms timestamps in strictly increasing order,
+no rows without a close, and High/Low enclosing Open/Close.  Each step is a
+couple of array operations and is skipped (no copy) when the data is
+already clean, which is the normal case for the WebSocket feed.  Bad
+ticks (price spikes, wild wicks) are then clamped, dropped or only counted
+by the streaming median/MAD filter in spikes.py (``SPIKE_FILTER``).
+
+Stage timings (plus the provider call itself, stage "fetch") go to
+``bot_candle_stage_seconds{stage}``, fixes to ``bot_candle_fixes_total{kind}``
+and filtered bars per provider to ``bot_candle_spikes_total{source,kind}``.
+"""
+from __future__ import annotations
+import logging
+import time
+from typing import Dict, Tuple
+
+import numpy as np
+from prometheus_client import Counter, Histogram
+
+from ..config import SPIKE_FILTER
+from ..utils.candles import CandleSeries
+from ..utils.timeframes import tf_seconds
+from .spikes import filter_spikes
+
+logger = logging.getLogger(__name__)
+
+CANDLE_STAGE_TIME = Histogram(
+    "bot_candle_stage_seconds", "Time per candle pipeline stage", ["stage"],
+    buckets=(1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30),
+)
+CANDLE_FIXES = Counter("bot_candle_fixes_total", "Bars fixed or dropped by canonicalization", ["kind"])
+CANDLE_SPIKES = Counter("bot_candle_spikes_total", "Bad ticks found by the spike filter per provider", ["source", "kind"])
+
+def canonicalize(data, timeframe: str, source: str = "unknown",
+                 spike_mode: str = SPIKE_FILTER) -> Tuple[CandleSeries, Dict[str, int]]:
+    """
+    Provider result (CandleSeries or any DataFrame schema) -> canonical series.
+    Returns the series and counts of what was fixed:
+    ``unsorted``, ``duplicates``, ``dropped``, ``high_low``, ``spikes``, ``wicks``, ``unconfirmed``,
+    ``gaps``, ``missing_bars``.
+    """
+    report = dict.fromkeys(
+        ("unsorted", "duplicates", "dropped", "high_low", "spikes", "wicks", "unconfirmed", "gaps", "missing_bars"), 0
+    )
+    timings = {}
+
+    t0 = time.perf_counter()
+    # rename + dtype coercion (no-op for a CandleSeries)
+    candles = CandleSeries.from_frame(data)
+    t1 = time.perf_counter()
+    timings["convert"] = t1 - t0
+
+    close = candles.close
+    missing = close != close
+    if missing.any():
+        report["dropped"] = int(np.count_nonzero(missing))
+        candles = candles.take(~missing)
+        close = candles.close
+    # absent open/high/low fall back to the close
+    for column in (candles.open, candles.high, candles.low):
+        np.copyto(column, close, where=column != column)
+    candles.mark_dirty()
+    t2 = time.perf_counter()
+    timings["clean"] = t2 - t1
+
+    if candles.has_times and len(candles) > 1:
+        ts = candles.ts
+        step = np.diff(ts)
+        if not (step > 0).all():
+            report["unsorted"] = int(np.count_nonzero(step < 0))
+            order = np.argsort(ts, kind="stable")
+            ts = ts[order]
+            # keep the last copy of a repeated bar: it is the freshest tick
+            keep = np.empty(len(ts), dtype=bool)
+            keep[-1] = True
+            np.not_equal(ts[1:], ts[:-1], out=keep[:-1])
+            report["duplicates"] = int(len(ts) - np.count_nonzero(keep))
+            candles = candles.take(order[keep])
+    t3 = time.perf_counter()
+    timings["order"] = t3 - t2
+
+    report["high_low"] = candles.repair_high_low()
+    t4 = time.perf_counter()
+    timings["repair"] = t4 - t3
+
+    candles, spikes = filter_spikes(candles, spike_mode)
+    report.update(spikes)
+    for kind, count in spikes.items():
+        if count:
+            CANDLE_SPIKES.labels(source=source, kind=kind).inc(count)
+    t5 = time.perf_counter()
+    timings["spikes"] = t5 - t4
+
+    if candles.has_times and len(candles) > 1:
+        bar_ms = tf_seconds(timeframe) * 1000
+        step = np.diff(candles.ts)
+        gaps = step > bar_ms * 1.5
+        if gaps.any():
+            report["gaps"] = int(np.count_nonzero(gaps))
+            report["missing_bars"] = int(np.rint(step[gaps] / bar_ms).sum()) - report["gaps"]
+    timings["gaps"] = time.perf_counter() - t5
+
+    for stage, seconds in timings.items():
+        CANDLE_STAGE_TIME.labels(stage=stage).observe(seconds)
+    for kind, count in report.items():
+        if count:
+            CANDLE_FIXES.labels(kind=kind).inc(count)
+    return candles, report
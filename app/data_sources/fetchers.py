@@ -1,43 +1,45 @@
 # app/data_sources/fetchers.py
 import logging
-import pandas as pd
+import time
 from ..config import (
     PO_FETCH_ORDER,
     PO_USE_INTERCEPTOR,
     PO_USE_OCR,
     PO_USE_WS_FETCHER,
 )
-from .ws_fetcher import WebSocketFetcher
+from .ws_fetcher import shared_fetcher
 from .pocketoption_scraper import fetch_po_ohlc_async
 from .po_interceptor import PocketOptionInterceptor
 from .po_screenshot_ocr import ScreenshotAnalyzer
+from ..utils.candles import CandleSeries
+from .canonical import CANDLE_STAGE_TIME, canonicalize
 
 logger = logging.getLogger(__name__)
 
 class PocketOptionFetcher:
-    async def fetch(self, symbol: str, timeframe: str, otc: bool=False):
-        df = await fetch_po_ohlc_async(symbol, timeframe, otc)
+    async def fetch(self, symbol: str, timeframe: str, otc: bool=False, count: int | None=None):
+        df = await fetch_po_ohlc_async(symbol, timeframe, otc, count=count)
         return df, "po"
 
 class InterceptorFetcher:
     def __init__(self):
         self._i = PocketOptionInterceptor()
-    async def fetch(self, symbol: str, timeframe: str, otc: bool=False):
+    async def fetch(self, symbol: str, timeframe: str, otc: bool=False, count: int | None=None):
         df = await self._i.intercept_chart_data(symbol, timeframe, otc)
         return df, "interceptor"
 
 class OCRFetcher:
     def __init__(self):
         self._o = ScreenshotAnalyzer()
-    async def fetch(self, symbol: str, timeframe: str, otc: bool=False):
+    async def fetch(self, symbol: str, timeframe: str, otc: bool=False, count: int | None=None):
         df = await self._o.capture_and_analyze(symbol, timeframe, otc)
         return df, "ocr"
 
 class WebSocketWrapper:
     def __init__(self):
-        self._w = WebSocketFetcher()
-    async def fetch(self, symbol: str, timeframe: str, otc: bool=False):
-        df = await self._w.fetch(symbol, timeframe, otc)
+        self._w = shared_fetcher()
+    async def fetch(self, symbol: str, timeframe: str, otc: bool=False, count: int | None=None):
+        df = await self._w.fetch(symbol, timeframe, otc, count=count or 100)
         return df, "ws"
 
 class CompositeFetcher:
@@ -60,28 +62,38 @@ class CompositeFetcher:
         self.fetchers = [(k, providers[k]) for k in order]
         logger.debug("CompositeFetcher order: %s", [k for k,_ in self.fetchers])
 
-    async def fetch(self, symbol: str, timeframe: str, otc: bool=False):
+    async def fetch(self, symbol: str, timeframe: str, otc: bool=False, count: int | None=None):
         """
-        Returns: (df, source) where source is one of 'ws','po','interceptor','ocr' or 'generated'
+        Returns: (candles, source) where candles is a CandleSeries and source is one of
+        'ws','po','interceptor','ocr' or 'generated'.
+        ``count`` asks for a longer history where the provider supports it (ws, generator).
         """
         for name, f in self.fetchers:
             try:
                 logger.debug("Trying fetcher: %s for %s %s", name, symbol, timeframe)
-                result = await f.fetch(symbol, timeframe, otc)
+                started = time.perf_counter()
+                result = await f.fetch(symbol, timeframe, otc, count=count)
+                CANDLE_STAGE_TIME.labels(stage="fetch").observe(time.perf_counter() - started)
                 if isinstance(result, tuple):
                     df, source = result
                 else:
                     df, source = result, name
+                if df is not None and not df.empty:
+                    df, fixes = canonicalize(df, timeframe, source)
+                    if any(fixes.values()):
+                        logger.info("Fetcher %s data fixed for %s %s: %s", source, symbol, timeframe,
+                                    {k: v for k, v in fixes.items() if v})
                 if df is not None and not df.empty:
                     logger.info("Fetcher %s returned %d rows for %s %s", source, len(df), symbol, timeframe)
-                    try:
-                        logger.debug("Sample rows from %s:\n%s", source, df.head(3).to_dict(orient="records"))
-                    except Exception as e:
-                        logger.debug("Failed to serialize df head: %s", e)
+                    if logger.isEnabledFor(logging.DEBUG):
+                        try:
+                            logger.debug("Sample rows from %s:\n%s", source, df[:3].to_frame().to_dict(orient="records"))
+                        except Exception as e:
+                            logger.debug("Failed to serialize df head: %s", e)
                     return df, source
                 else:
                     logger.warning("Fetcher %s returned empty for %s %s", name, symbol, timeframe)
             except Exception as e:
                 logger.error("Fetcher %s error for %s %s: %s", name, symbol, timeframe, e)
-        logger.info("All fetchers failed — returning empty DataFrame (will trigger realistic generator upstream)")
-        return pd.DataFrame(), "generated"
+        logger.info("All fetchers failed — returning empty series (will trigger realistic generator upstream)")
+        return CandleSeries.empty_series(), "generated"
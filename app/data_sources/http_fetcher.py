@@ -1,16 +1,16 @@
 import time
 import httpx
-import pandas as pd
 from ..config import PO_ENTRY_URL, PO_HTTP_API_URL, PO_HTTPX_TIMEOUT
+from ..utils.candles import CandleSeries
 
 class HTTPFetcher:
-    async def fetch(self, symbol: str, timeframe: str, otc: bool=False) -> pd.DataFrame:
+    async def fetch(self, symbol: str, timeframe: str, otc: bool=False) -> CandleSeries:
         """
         1) Заливаем страницу, чтобы собрать куки
         2) Повторяем XHR-запрос с теми же куками и заголовками
         """
         if not PO_HTTP_API_URL:
-            return pd.DataFrame()
+            return CandleSeries.empty_series()
 
         # рассчитываем period в мс
         now = int(time.time() * 1000)
@@ -50,11 +50,6 @@ class HTTPFetcher:
 
         candles = data.get("candles") or []
         if not candles:
-            return pd.DataFrame()
+            return CandleSeries.empty_series()
 
-        df = pd.DataFrame(
-            candles,
-            columns=["timestamp","open","high","low","close"]
-        )
-        df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms")
-        return df
+        return CandleSeries.from_records(candles)
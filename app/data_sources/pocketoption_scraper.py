@@ -20,6 +20,8 @@ from ..config import (
     LOG_LEVEL,
 )
 from ..utils.logging import setup
+from ..utils.candles import CandleSeries
+from ..utils.timeframes import tf_seconds
 
 logger = setup(LOG_LEVEL)
 
@@ -34,8 +36,8 @@ PAIR_PRICES = {
 }
 
 async def generate_realistic_data(
-    symbol: str, timeframe: str, otc: bool
-) -> pd.DataFrame:
+    symbol: str, timeframe: str, otc: bool, count: Optional[int] = None
+) -> CandleSeries:
     """Генерация реалистичных данных для быстрого прогноза"""
     logger.info(f"Generating realistic data for {symbol} {timeframe}")
 
@@ -53,14 +55,14 @@ async def generate_realistic_data(
         "30m": 30,
         "1h": 24,
     }
-    num_bars = tf_bars.get(timeframe, 60)
+    num_bars = count or tf_bars.get(timeframe, 60)
 
     trend = random.choice(["up", "down", "sideways"])
     trend_strength = (
         0.0003 if trend == "up" else -0.0003 if trend == "down" else 0
     )
 
-    ohlc_data = []
+    ohlc = np.empty((4, num_bars))
     current_price = base_price
 
     for i in range(num_bars):
@@ -86,32 +88,18 @@ async def generate_realistic_data(
             elif pattern == "shooting_star":
                 high_price = max(open_price, close_price) * (1 + volatility * 2)
 
-        decimals = 3 if "JPY" in symbol else 5
-        ohlc_data.append({
-            "Open": round(open_price, decimals),
-            "High": round(high_price, decimals),
-            "Low": round(low_price, decimals),
-            "Close": round(close_price, decimals),
-        })
+        ohlc[:, i] = (open_price, high_price, low_price, close_price)
         current_price = close_price
 
-    df = pd.DataFrame(ohlc_data)
-    freq_map = {
-        "30s": "30s",
-        "1m": "1min",
-        "2m": "2min",
-        "3m": "3min",
-        "5m": "5min",
-        "10m": "10min",
-        "15m": "15min",
-        "30m": "30min",
-        "1h": "1h",
-    }
-    freq = freq_map.get(timeframe, "1min")
-    df.index = pd.date_range(end=pd.Timestamp.now(tz="UTC"), periods=len(df), freq=freq)
+    decimals = 3 if "JPY" in symbol else 5
+    ohlc = np.round(ohlc, decimals)
+    # метки баров по границам таймфрейма, последний бар — текущий
+    step_ms = tf_seconds(timeframe) * 1000
+    last_open = int(time.time() * 1000) // step_ms * step_ms
+    ts = last_open - step_ms * np.arange(num_bars - 1, -1, -1, dtype=np.int64)
 
-    logger.info(f"Generated {len(df)} bars with trend: {trend}")
-    return df
+    logger.info(f"Generated {num_bars} bars with trend: {trend}")
+    return CandleSeries(ts, *ohlc)
 
 def _proxy_dict() -> Optional[dict]:
     """Конвертация прокси для Playwright"""
@@ -193,12 +181,13 @@ async def fetch_po_fast_scraping(
 async def fetch_po_ohlc_async(
     symbol: str,
     timeframe: Literal["30s","1m","2m","3m","5m","10m","15m","30m","1h"] = "1m",
-    otc: bool = False
-) -> pd.DataFrame:
+    otc: bool = False,
+    count: Optional[int] = None,
+) -> CandleSeries:
     """Главная функция получения данных с гарантированным результатом"""
     if not PO_ENABLE_SCRAPE:
         logger.warning("PO scraping disabled, using generated data")
-        return await generate_realistic_data(symbol, timeframe, otc)
+        return await generate_realistic_data(symbol, timeframe, otc, count)
 
     # Попытка быстрого скрапинга
     try:
@@ -206,10 +195,8 @@ async def fetch_po_ohlc_async(
             fetch_po_fast_scraping(symbol, timeframe, otc), timeout=8.0
         )
         if result is not None and not result.empty:
-            if 'close' in result.columns:
-                result.columns = ['Open','High','Low','Close']
             logger.info(f"Using real scraped data: {len(result)} bars")
-            return result
+            return CandleSeries.from_frame(result)
     except asyncio.TimeoutError:
         logger.warning("Scraping timeout reached")
     except Exception as e:
@@ -217,4 +204,4 @@ async def fetch_po_ohlc_async(
 
     # Fallback на синтетические данные
     logger.info("Using generated realistic data")
-    return await generate_realistic_data(symbol, timeframe, otc)
+    return await generate_realistic_data(symbol, timeframe, otc, count)
@@ -0,0 +1,203 @@
+# app/data_sources/spikes.py
+"""
+Фильтр выбросов (bad ticks) во входящих свечах.
+
+OCR and intercepted candles occasionally carry a bogus bar: a close off by
+a digit, a wick to zero.  One such bar poisons the EMA/RSI recursions for
+dozens of bars, so bars are checked as they stream in: the return from
+the last accepted close must stay inside a robust band built from the
+recent accepted returns,
+
+    median(last w returns) +- k * 1.4826 * MAD(last w returns)
+
+The window is kept sorted (``bisect``), so a bar costs an O(log w) search
+for the insert/evict position plus an O(log w) selection for the MAD; the
+list insert/delete itself is a memmove of at most ``w`` pointers.
+
+A close outside the band marks a spike bar; an open, high or low beyond
+the band's price range is a bad wick.  Depending on the mode the bar is
+clamped into the band, dropped, or only counted (``flag``).  ``persist``
+outliers in a row are a real level shift rather than spikes: those bars
+are kept and the window moves to the new level.
+
+The window is seeded with the returns of the first ``window`` bars (a bad
+bar there is two outlying returns, which median and MAD shrug off), so
+the warm-up bars are checked like the rest; leading bars far from the
+median close of that stretch are spikes too, and the first close near it
+is the starting point.
+
+Outliers on the newest bars cannot be told apart yet: a bad tick and the
+first bars of a real breakout look the same.  They are counted as
+``unconfirmed`` and, unless the mode is ``flag``, clamped into the band
+(a breakout shows up muted, a bad tick does not reach the indicators).
+Only the returned copy is edited, so the next fetch sees the raw bars
+again and either confirms the move (``persist`` bars) or finds a normal
+bar after them and rejects them as spikes.
+"""
+from __future__ import annotations
+from bisect import bisect_left, insort
+from collections import deque
+from typing import Dict, Tuple
+
+import numpy as np
+
+from ..utils.candles import CandleSeries
+
+# MAD -> standard deviation for normal data
+_MAD_SIGMA = 1.4826
+
+
+class RollingMedianMAD:
+    """Median and MAD of the last ``window`` values"""
+    __slots__ = ("window", "_fifo", "_sorted")
+
+    def __init__(self, window: int):
+        self.window = window
+        self._fifo: deque = deque()
+        self._sorted: list = []
+
+    def push(self, x: float):
+        self._fifo.append(x)
+        insort(self._sorted, x)
+        if len(self._fifo) > self.window:
+            old = self._fifo.popleft()
+            del self._sorted[bisect_left(self._sorted, old)]
+
+    def reset(self, values=()):
+        self._fifo.clear()
+        self._sorted.clear()
+        for x in values:
+            self.push(x)
+
+    def values(self) -> list:
+        """Window contents, oldest first"""
+        return list(self._fifo)
+
+    def __len__(self) -> int:
+        return len(self._sorted)
+
+    @property
+    def median(self) -> float:
+        s = self._sorted
+        n = len(s)
+        mid = n // 2
+        return s[mid] if n % 2 else 0.5 * (s[mid - 1] + s[mid])
+
+    def mad(self, median: float | None = None) -> float:
+        """Median of |x - median|: k-th smallest of two sorted runs, O(log w)"""
+        m = self.median if median is None else median
+        n = len(self._sorted)
+        k = n // 2
+        if n % 2:
+            return self._kth(m, k)
+        return 0.5 * (self._kth(m, k - 1) + self._kth(m, k))
+
+    def _kth(self, m: float, k: int) -> float:
+        # distances below the median, nearest first: m - s[p-1], m - s[p-2], ...
+        # distances above it, nearest first:         s[p] - m, s[p+1] - m, ...
+        s = self._sorted
+        p = bisect_left(s, m)
+        na, nb = p, len(s) - p
+        lo, hi = max(0, k + 1 - nb), min(k + 1, na)
+        # smallest count i taken from below such that the (k+1-i)-th from above is no larger than the next below
+        while lo < hi:
+            i = (lo + hi) // 2
+            j = k + 1 - i
+            if j > 0 and s[p + j - 1] - m > m - s[p - 1 - i]:
+                lo = i + 1
+            else:
+                hi = i
+        i, j = lo, k + 1 - lo
+        below = m - s[p - i] if i > 0 else float("-inf")
+        above = s[p + j - 1] - m if j > 0 else float("-inf")
+        return max(below, above)
+
+
+def filter_spikes(candles: CandleSeries, mode: str = "clamp", window: int = 51, k: float = 8.0,
+                  persist: int = 3, min_periods: int = 10, min_scale: float = 1e-5
+                  ) -> Tuple[CandleSeries, Dict[str, int]]:
+    """
+    Run the filter over ``candles`` bar by bar.  Returns the (possibly
+    edited or shortened) series and counts ``spikes`` (bad closes),
+    ``wicks`` (bad open/high/low on an otherwise good bar) and
+    ``unconfirmed`` (outliers on the newest bars, clamped in any mode but ``flag``).
+    ``min_scale`` floors the return scale, so a flat stretch (MAD = 0)
+    does not turn every tick into a spike.
+    """
+    counts = {"spikes": 0, "wicks": 0, "unconfirmed": 0}
+    n = len(candles)
+    if mode == "off" or n <= min_periods:
+        return candles, counts
+    o = candles.open.tolist()
+    h = candles.high.tolist()
+    l = candles.low.tolist()
+    c = candles.close.tolist()
+    stats = RollingMedianMAD(window)
+    keep = [True] * n
+    edits: Dict[int, Tuple[float, float, float, float]] = {}
+    pending = []  # (bar, lo, hi) of consecutive outlier bars not yet confirmed as spikes
+
+    def reject(bars):
+        counts["spikes"] += len(bars)
+        for j, lo, hi in bars:
+            if mode == "drop":
+                keep[j] = False
+            elif mode == "clamp":
+                edits[j] = tuple(min(max(x[j], lo), hi) for x in (o, h, l, c))
+
+    head = c[:window]
+    stats.reset(b / a - 1 for a, b in zip(head, head[1:]))
+    # leading bars: against the median close, with room for a random walk over the stretch
+    ref = float(np.median(head))
+    tol = k * max(_MAD_SIGMA * stats.mad(), min_scale) * len(head) ** 0.5
+    lo, hi = ref * (1 - tol), ref * (1 + tol)
+    start = next((i for i, x in enumerate(head) if lo <= x <= hi), 0)
+    reject([(j, lo, hi) for j in range(start)])
+
+    prev = c[start]  # last accepted close
+    for i in range(start + 1, n):
+        close = c[i]
+        med = stats.median
+        width = k * max(_MAD_SIGMA * stats.mad(med), min_scale)
+        lo, hi = prev * (1 + med - width), prev * (1 + med + width)
+        if not lo <= close <= hi:
+            pending.append((i, lo, hi))
+            if len(pending) >= persist:
+                # a run of outliers: the level moved, take those bars as they are
+                for j, _, _ in pending:
+                    stats.push(c[j] / prev - 1)
+                    prev = c[j]
+                pending = []
+            continue
+        if pending:
+            reject(pending)
+            pending = []
+        # wicks and the open may stretch as far as the close could
+        top = max(hi, close)
+        bottom = min(lo, close)
+        if not (bottom <= o[i] <= top and l[i] >= bottom and h[i] <= top):
+            counts["wicks"] += 1
+            if mode == "clamp":
+                edits[i] = (min(max(o[i], bottom), top), min(h[i], top), max(l[i], bottom), close)
+        stats.push(close / prev - 1)
+        prev = close
+    # outliers at the end: a spike or the start of a move, not known until later bars
+    counts["unconfirmed"] = len(pending)
+    if mode != "flag":
+        # clamp, even in drop mode: the newest bar is the one the forecast is made from
+        for j, lo, hi in pending:
+            edits[j] = tuple(min(max(x[j], lo), hi) for x in (o, h, l, c))
+
+    if mode == "flag" or not (edits or not all(keep)):
+        return candles, counts
+    if edits:
+        rows = np.fromiter(edits, dtype=np.intp, count=len(edits))
+        values = np.array(list(edits.values()))
+        # own copy: the fetcher's buffer may be shared with cached views
+        candles = candles.copy()
+        candles.open[rows], candles.high[rows], candles.low[rows], candles.close[rows] = values.T
+        candles.repair_high_low()
+        candles.mark_dirty()
+    if not all(keep):
+        candles = candles.take(np.flatnonzero(keep))
+    return candles, counts
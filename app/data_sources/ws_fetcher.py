@@ -2,9 +2,9 @@
 import asyncio
 import logging
 import httpx
-import pandas as pd
 import socketio
 from ..config import PO_WS_URL, PO_ENTRY_URL
+from ..utils.candles import CandleSeries
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +15,8 @@ class WebSocketFetcher:
         self._buffers = {}
         self._lock = asyncio.Lock()
         self._connected = False
+        # called when the session drops (before any reconnect)
+        self.disconnect_hooks = []
         self._setup_handlers()
 
     def _setup_handlers(self):
@@ -31,6 +33,8 @@ class WebSocketFetcher:
         @self.sio.event
         async def disconnect():
             logger.info("WS disconnected")
+            for hook in self.disconnect_hooks:
+                hook()
 
     async def connect(self):
         async with self._lock:
@@ -48,18 +52,18 @@ class WebSocketFetcher:
                 logger.error("WS connect failed: %s", e)
                 raise
 
-    async def fetch(self, symbol: str, timeframe: str, otc: bool=False, count: int=100) -> pd.DataFrame:
+    async def fetch(self, symbol: str, timeframe: str, otc: bool=False, count: int=100) -> CandleSeries:
         key = f"{symbol}_{timeframe}"
         try:
             await self.connect()
         except Exception:
-            return pd.DataFrame()
+            return CandleSeries.empty_series()
         self._buffers.pop(key, None)
         try:
             await self.sio.emit("get_candles", [symbol, timeframe, count])
         except Exception as e:
             logger.error("WS emit error: %s", e)
-            return pd.DataFrame()
+            return CandleSeries.empty_series()
         for _ in range(100):  # wait up to 10s
             if key in self._buffers:
                 break
@@ -67,12 +71,21 @@ class WebSocketFetcher:
         raw = self._buffers.pop(key, [])
         if not raw:
             logger.warning("No WS candles for %s after wait", key)
-            return pd.DataFrame()
-        df = pd.DataFrame(raw, columns=["timestamp","open","high","low","close"])
-        df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms")
-        return df
+            return CandleSeries.empty_series()
+        return CandleSeries.from_records(raw)
 
     async def close(self):
         if self._connected:
             await self.sio.disconnect()
             self._connected = False
+
+
+_shared: "WebSocketFetcher | None" = None
+
+
+def shared_fetcher() -> WebSocketFetcher:
+    """One session per process: candles and the asset table share it"""
+    global _shared
+    if _shared is None:
+        _shared = WebSocketFetcher()
+    return _shared
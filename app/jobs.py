@@ -0,0 +1,136 @@
+# app/jobs.py
+"""
+Очередь тяжёлых задач (прогнозов) с фиксированным пулом воркеров.
+
+Update handlers only enqueue: at most ``workers`` jobs run at a time, so a
+burst of users cannot start an unbounded number of fetches.  The queue
+holds at most ``max_depth`` waiting jobs; past that ``submit`` returns
+None and the caller answers "busy" right away instead of making the user
+wait behind a queue that will not drain in time.
+
+Jobs with a lower ``priority`` go first (ties in arrival order), e.g. a
+forecast whose candles are already cached before one that has to fetch.
+"""
+from __future__ import annotations
+import asyncio
+import itertools
+import time
+from typing import Any, Awaitable, Callable, List, Optional, Set
+
+from loguru import logger
+from prometheus_client import Counter, Gauge, Histogram
+
+JOB_QUEUE_DEPTH = Gauge("bot_job_queue_depth", "Jobs waiting for a worker", ["queue"])
+JOB_RUNNING = Gauge("bot_job_running", "Jobs being run by workers", ["queue"])
+JOB_WAIT_TIME = Histogram("bot_job_wait_seconds", "Time a job waited in the queue", ["queue"],
+                          buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+JOB_SERVICE_TIME = Histogram("bot_job_service_seconds", "Time a worker spent on a job", ["queue"],
+                             buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+JOBS = Counter("bot_jobs_total", "Jobs by outcome", ["queue", "status"])
+
+
+class Job:
+    """One queued call; ``await job`` gives its result"""
+    __slots__ = ("order", "fn", "args", "enqueued", "future")
+
+    def __init__(self, priority: int, seq: int, fn: Callable[..., Awaitable[Any]], args: tuple):
+        self.order = (priority, seq)
+        self.fn = fn
+        self.args = args
+        self.enqueued = time.monotonic()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def __lt__(self, other: "Job") -> bool:
+        return self.order < other.order
+
+    def __await__(self):
+        return self.future.__await__()
+
+
+class JobQueue:
+    """Bounded priority queue drained by ``workers`` tasks; workers start with the first job"""
+
+    def __init__(self, name: str, workers: int = 4, max_depth: int = 64):
+        self.name = name
+        self.workers = max(1, workers)
+        self.max_depth = max(0, max_depth)
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._waiting: Set[Job] = set()
+        self._seq = itertools.count()
+        self.running = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self._waiting)
+
+    def start(self):
+        if self._tasks and not all(task.done() for task in self._tasks):
+            return
+        # first job, or the loop that ran the workers is gone
+        self._queue = asyncio.PriorityQueue()
+        self._waiting.clear()
+        self.running = 0
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks, self._queue = [], None
+        for job in self._waiting:
+            job.future.cancel()
+        self._waiting.clear()
+        JOB_QUEUE_DEPTH.labels(queue=self.name).set(0)
+
+    def submit(self, fn: Callable[..., Awaitable[Any]], *args: Any, priority: int = 0) -> Optional[Job]:
+        """Enqueue ``fn(*args)``; None when ``max_depth`` jobs are already waiting"""
+        self.start()
+        if len(self._waiting) >= self.max_depth:
+            JOBS.labels(queue=self.name, status="rejected").inc()
+            return None
+        job = Job(priority, next(self._seq), fn, args)
+        self._waiting.add(job)
+        self._queue.put_nowait(job)
+        JOB_QUEUE_DEPTH.labels(queue=self.name).set(len(self._waiting))
+        return job
+
+    def position(self, job: Job) -> int:
+        """
+        Place of ``job`` in line: 0 if a free worker takes it right away,
+        otherwise how many jobs have to finish first, counting itself.
+        """
+        if job not in self._waiting:
+            return 0
+        ahead = sum(1 for other in self._waiting if other.order < job.order)
+        return max(0, ahead + 1 - (self.workers - self.running))
+
+    async def _worker(self):
+        while True:
+            job: Job = await self._queue.get()
+            self._waiting.discard(job)
+            JOB_QUEUE_DEPTH.labels(queue=self.name).set(len(self._waiting))
+            if job.future.cancelled():
+                continue
+            started = time.monotonic()
+            JOB_WAIT_TIME.labels(queue=self.name).observe(started - job.enqueued)
+            self.running += 1
+            JOB_RUNNING.labels(queue=self.name).inc()
+            try:
+                result = await job.fn(*job.args)
+            except asyncio.CancelledError:
+                job.future.cancel()
+                raise
+            except Exception as e:
+                logger.exception(f"{self.name} job failed")
+                JOBS.labels(queue=self.name, status="failed").inc()
+                job.future.set_exception(e)
+                # nobody may await the job: mark the exception as retrieved
+                job.future.exception()
+            else:
+                JOBS.labels(queue=self.name, status="done").inc()
+                job.future.set_result(result)
+            finally:
+                self.running -= 1
+                JOB_RUNNING.labels(queue=self.name).dec()
+                JOB_SERVICE_TIME.labels(queue=self.name).observe(time.monotonic() - started)
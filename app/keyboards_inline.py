@@ -1,17 +1,20 @@
 # app/keyboards_inline.py
 # -*- coding: utf-8 -*-
 
-from typing import Sequence, Iterable
+from typing import Dict, Hashable, Sequence, Tuple
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.types import InlineKeyboardMarkup
 
+from .pairs import pair_registry
+
 def get_mode_keyboard() -> InlineKeyboardMarkup:
     """
-    Single button: Analysis
+    Analysis (one timeframe) / Multi-TF (confluence of the chosen and higher timeframes)
     """
     kb = InlineKeyboardBuilder()
     kb.button(text="Analysis", callback_data="analysis")
-    kb.adjust(1)
+    kb.button(text="Multi-TF", callback_data="mtf")
+    kb.adjust(2)
     return kb.as_markup()
 
 def get_category_keyboard() -> InlineKeyboardMarkup:
@@ -29,24 +32,41 @@ def get_category_keyboard() -> InlineKeyboardMarkup:
 
 def get_pairs_keyboard(pairs: Sequence[str]) -> InlineKeyboardMarkup:
     """
-    List of pairs + Back/Restart
+    List of pairs + Back/Restart; buttons carry the compact pair id ("p12")
     """
     kb = InlineKeyboardBuilder()
     for p in pairs:
-        kb.button(text=p, callback_data=p)
+        kb.button(text=p, callback_data=pair_registry.by_name[p].callback)
     kb.adjust(2 if len(pairs) > 1 else 1)
     kb.button(text="⬅️ Back", callback_data="back")
     kb.button(text="🔄 Restart", callback_data="restart")
     kb.adjust(2)
     return kb.as_markup()
 
+# (category, snapshot version) -> клавиатура; живёт, пока не сменится снимок доступности
+_pairs_keyboards: Dict[Tuple[str, Hashable], InlineKeyboardMarkup] = {}
+
+def get_pairs_keyboard_cached(category: str, version: Hashable, pairs: Sequence[str]) -> InlineKeyboardMarkup:
+    """
+    get_pairs_keyboard built once per (category, version); keyboards of
+    older versions are dropped when a new version shows up
+    """
+    key = (category, version)
+    kb = _pairs_keyboards.get(key)
+    if kb is None:
+        for old in [k for k in _pairs_keyboards if k[0] == category]:
+            del _pairs_keyboards[old]
+        kb = _pairs_keyboards[key] = get_pairs_keyboard(pairs)
+    return kb
+
+TIMEFRAMES: Tuple[str, ...] = ("1m", "2m", "3m", "5m", "10m", "15m", "30m", "1h")
+
 def get_timeframe_keyboard() -> InlineKeyboardMarkup:
     """
     Timeframes grid + Back/Restart
     """
-    tfs: Iterable[str] = ("1m", "2m", "3m", "5m", "10m", "15m", "30m", "1h")
     kb = InlineKeyboardBuilder()
-    for tf in tfs:
+    for tf in TIMEFRAMES:
         kb.button(text=tf, callback_data=tf)
     kb.adjust(4)
     kb.button(text="⬅️ Back", callback_data="back")
@@ -63,3 +83,13 @@ def get_restart_keyboard() -> InlineKeyboardMarkup:
     kb.button(text="⬅️ Back", callback_data="back")
     kb.adjust(2)
     return kb.as_markup()
+
+def get_result_keyboard(repeat_data: str) -> InlineKeyboardMarkup:
+    """
+    Repeat the same forecast + Restart
+    """
+    kb = InlineKeyboardBuilder()
+    kb.button(text="🔁 Repeat", callback_data=repeat_data)
+    kb.button(text="🔄 Restart", callback_data="restart")
+    kb.adjust(2)
+    return kb.as_markup()
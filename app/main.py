@@ -3,13 +3,14 @@
 
 import asyncio
 import datetime
+import math
+import re
 import time
-from typing import Optional
+from typing import Optional, Tuple
 
 from aiogram import Bot, Dispatcher, F, types
-from aiogram.filters import Command, StateFilter
+from aiogram.filters import Command, CommandObject, CommandStart, StateFilter
 from aiogram.fsm.context import FSMContext
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import CallbackQuery
 from prometheus_client import Counter, Histogram, Gauge, generate_latest
 from aiohttp import web
@@ -20,21 +21,59 @@ from .config import (
     PO_ENABLE_SCRAPE,
     ENABLE_CHARTS,
     LOG_LEVEL,
+    INDICATOR_BACKEND,
+    INDICATOR_PARAMS_FILE,
+    SCORING_MODEL_FILE,
+    FORECAST_LOG_DIR,
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_CONCURRENCY,
+    HTTP_PORT,
+    FSM_STORAGE,
+    FSM_TTL,
+    FORECAST_WORKERS,
+    FORECAST_QUEUE_SIZE,
+    TG_RATE,
+    TG_CHAT_RATE,
+    TG_CHAT_BURST,
+    CACHE_STALE_SECONDS,
+    USER_FORECASTS_PER_MIN,
+    USER_FORECAST_BURST,
+    MAX_CONCURRENT_FETCHES,
+    SCAN_CONCURRENCY,
+    SCAN_BUDGET_SEC,
+    SCAN_TOP,
 )
 from .states import ForecastStates
 from .keyboards_inline import (
     get_mode_keyboard,
     get_category_keyboard,
-    get_pairs_keyboard,
+    get_pairs_keyboard_cached,
     get_timeframe_keyboard,
     get_restart_keyboard,
+    get_result_keyboard,
+    TIMEFRAMES,
 )
-from .utils.cache import TTLCache
+from .utils.cache import TTLCache, VersionedCache
 from .utils.logging import setup
-from .pairs import get_available_pairs, availability_checker, get_pair_info
+from .pairs import Pair, availability_checker, pair_registry
+from .analysis import kernels
+from .analysis import params as indicator_params
+from .analysis.features import FeatureFrame, bar_stamp
 from .analysis.indicators import compute_indicators
 from .analysis.decision import signal_from_indicators, simple_ta_signal
+from .analysis.levels import levels, level_notes
+from .analysis import confluence
+from .analysis import scoring
+from .analysis.outcomes import ForecastLog
 from .data_sources.fetchers import CompositeFetcher
+from . import webhook
+from .jobs import JobQueue
+from .admission import ADMISSION, Admission
+from . import outbound
+from .storage import create_storage, install_batching
+from .scanner import Scan, Setup
 
 logger = setup(LOG_LEVEL)
 
@@ -46,13 +85,35 @@ FORECAST_COUNT = Counter("bot_forecasts_total", "Total number of forecasts", ["p
 ERROR_COUNT = Counter("bot_errors_total", "Total number of errors", ["error_type"])
 CACHE_HITS = Counter("bot_cache_hits_total", "Total number of cache hits")
 CACHE_MISSES = Counter("bot_cache_misses_total", "Total number of cache misses")
+ANALYSIS_CACHE_HITS = Counter("bot_analysis_cache_hits_total", "Forecasts served from the analysis result cache")
+ANALYSIS_CACHE_MISSES = Counter("bot_analysis_cache_misses_total", "Forecasts that had to be analysed")
+ANALYSIS_CACHE_HIT_RATIO = Gauge("bot_analysis_cache_hit_ratio", "Hit ratio of the analysis result cache")
+FORECAST_ACCURACY = Gauge("bot_forecast_accuracy", "Rolling share of forecasts that came true", ["rule", "timeframe"])
+FORECASTS_RESOLVED = Counter("bot_forecasts_resolved_total", "Forecasts evaluated at expiry")
+KERNEL_COMPILE_TIME = Gauge("bot_kernel_compile_seconds", "Startup compile time of indicator kernels", ["backend"])
 
 # Core setup
 bot = Bot(token=TELEGRAM_TOKEN)
-dp = Dispatcher(storage=MemoryStorage())
-cache = TTLCache(ttl_seconds=CACHE_TTL_SECONDS)
+# лимиты Telegram, склейка правок одного сообщения, ожидание retry_after
+governor = outbound.OutboundGovernor(TG_RATE, TG_CHAT_RATE, TG_CHAT_BURST)
+bot.session.middleware(governor)
+dp = Dispatcher(storage=create_storage(FSM_STORAGE, ttl=FSM_TTL))
+# одно чтение и одна запись состояния на апдейт
+install_batching(dp)
+cache = TTLCache(ttl_seconds=CACHE_TTL_SECONDS, stale_seconds=CACHE_STALE_SECONDS)
+# (symbol, timeframe, otc[, mode]) -> значение для последнего бара; новый бар инвалидирует запись
+feature_cache = VersionedCache(ttl_seconds=CACHE_TTL_SECONDS)
+analysis_cache = VersionedCache(ttl_seconds=CACHE_TTL_SECONDS)
 _fetcher = CompositeFetcher()
+# что предсказали и сбылось ли — пакетная проверка в evaluate_forecasts()
+forecast_log = ForecastLog(FORECAST_LOG_DIR or None)
 active_users: set[int] = set()
+# фетч + анализ выполняются здесь, а не в хендлере: не больше FORECAST_WORKERS одновременно
+forecast_jobs = JobQueue("forecast", workers=FORECAST_WORKERS, max_depth=FORECAST_QUEUE_SIZE)
+# токены пользователей и потолок одновременных фетчей для прогнозов мимо кеша
+admission = Admission(USER_FORECASTS_PER_MIN, USER_FORECAST_BURST, MAX_CONCURRENT_FETCHES)
+# сканы долгие (до SCAN_BUDGET_SEC) — отдельная маленькая очередь, чтобы не занимать воркеры прогнозов
+scan_jobs = JobQueue("scan", workers=2, max_depth=8)
 
 def track_time(method_name: str):
     def decorator(func):
@@ -79,6 +140,7 @@ def format_forecast_message(
     action: str,
     data: Optional[dict] = None,
     notes: Optional[list[str]] = None,
+    track: Optional[Tuple[int, int]] = None,
 ) -> str:
     tf_upper = timeframe.upper()
     # Включаем пару в заголовок
@@ -111,10 +173,148 @@ def format_forecast_message(
     if notes and mode == "ind":
         parts.extend(["", "ℹ️ Additional Notes:"])
         parts.extend([f"• {n}" for n in notes])
+    parts.extend(format_track_record(track))
     parts.append("")
     parts.append("_Analysis based on market data patterns_")
     return "\n".join(parts)
 
+def format_track_record(track: Optional[Tuple[int, int]]) -> list[str]:
+    if not track or not track[1]:
+        return []
+    wins, total = track
+    return ["", f"📈 Track record (24h): {wins / total:.0%} of {total} forecasts came true"]
+
+def format_confluence_message(pair: str, report: dict, track: Optional[Tuple[int, int]] = None) -> str:
+    rows = report["timeframes"]
+    agree = round(report["agreement"] * len(rows))
+    parts = [
+        f"🎯 CONFLUENCE for {pair} " + " · ".join(r["timeframe"].upper() for r in rows),
+        "",
+        f"💡 Recommendation: {report['verdict']} ({agree}/{len(rows)} timeframes agree)",
+        "",
+        "📊 Timeframes:",
+    ]
+    for r in rows:
+        ind = r["indicators"]
+        if ind:
+            trend = "up" if ind["EMA_fast"] > ind["EMA_slow"] else "down"
+            parts.append(f"• {r['timeframe'].upper()}: {r['action']} — RSI {ind['RSI']:.1f}, EMA trend {trend}")
+        else:
+            parts.append(f"• {r['timeframe'].upper()}: {r['action']} — not enough bars")
+    parts.extend(format_track_record(track))
+    parts.append("")
+    parts.append("_Analysis based on market data patterns_")
+    return "\n".join(parts)
+
+FORECAST_USAGE = (
+    "Usage: /f EURUSD 5m [otc] [mtf]\n"
+    f"Timeframes: {', '.join(TIMEFRAMES)}"
+)
+
+def parse_forecast_args(args: Optional[str]) -> Optional[Tuple[str, Pair, str]]:
+    """
+    "EURUSD 5m otc" (/f) or "EURUSD_otc_5m" (deep link) -> (mode, pair, tf);
+    None if the pair or the timeframe is not recognised
+    """
+    tokens = [t for t in re.split(r"[\s_]+", args or "") if t]
+    if len(tokens) < 2:
+        return None
+    flags = {t.lower() for t in tokens[1:]}
+    tfs = flags.intersection(TIMEFRAMES)
+    if len(tfs) != 1 or flags - tfs - {"otc", "mtf"}:
+        return None
+    pair = pair_registry.find(tokens[0], "otc" in flags)
+    if pair is None:
+        return None
+    return ("mtf" if "mtf" in flags else "ind"), pair, tfs.pop()
+
+def repeat_data(mode: str, pair: Pair, tf: str) -> str:
+    """Callback data of the 🔁 Repeat button: f:<pair id>:<tf>:<mode>"""
+    return f"f:{pair.id}:{tf}:{mode}"
+
+def fin_closed(cat: str) -> bool:
+    return cat == "fin" and datetime.datetime.utcnow().weekday() in (5, 6)
+
+async def forecast_from_args(message: types.Message, args: Optional[str]):
+    """/f и deep link: сразу в очередь прогнозов, без шагов меню"""
+    parsed = parse_forecast_args(args)
+    if parsed is None:
+        return await message.answer(FORECAST_USAGE)
+    mode, pair, tf = parsed
+    cat = "otc" if pair.otc else "fin"
+    if fin_closed(cat):
+        return await message.answer("Financial market is closed on weekends. Please try again on Monday.")
+    if not await availability_checker.is_available(pair.name):
+        return await message.answer("⚠️ This pair is unavailable.")
+    announced, place, text = submit_forecast(message.from_user.id, mode, cat, pair, tf)
+    if announced is None:
+        return await message.answer(text)
+    status = None
+    try:
+        status = await message.answer(text)
+    finally:
+        announced.set_result((status, place))
+
+@dp.message(CommandStart(deep_link=True))
+@track_time("deep_link")
+async def cmd_start_link(message: types.Message, command: CommandObject, **kwargs):
+    """t.me/<bot>?start=EURUSD_otc_5m"""
+    await forecast_from_args(message, command.args)
+
+@dp.message(Command("f"))
+@track_time("forecast_command")
+async def cmd_forecast(message: types.Message, command: CommandObject, **kwargs):
+    await forecast_from_args(message, command.args)
+
+@dp.callback_query(F.data.startswith("f:"))
+@track_time("forecast_repeat")
+async def repeat_forecast(callback: CallbackQuery, **kwargs):
+    """🔁 Repeat under a forecast: the same pair/timeframe/mode as a new message"""
+    try:
+        _, pair_id, tf, mode = callback.data.split(":")
+        pair = pair_registry.get(int(pair_id))
+    except ValueError:
+        pair = None
+    if pair is None or tf not in TIMEFRAMES or mode not in ("ind", "mtf"):
+        return await callback.answer("⚠️ This button is outdated, please use /start.", show_alert=True)
+    cat = "otc" if pair.otc else "fin"
+    if fin_closed(cat) or not await availability_checker.is_available(pair.name):
+        return await callback.answer("⚠️ This pair is unavailable right now.", show_alert=True)
+    announced, place, text = submit_forecast(callback.from_user.id, mode, cat, pair, tf)
+    if announced is None:
+        return await callback.answer(text, show_alert=True)
+    outbound.post(callback.answer("⏳ Analyzing..."))
+    status = None
+    try:
+        # новое сообщение: прошлый прогноз остаётся для сравнения
+        status = await callback.message.answer(text)
+    finally:
+        announced.set_result((status, place))
+
+SCAN_USAGE = f"Usage: /scan <fin|otc> <timeframe>\nTimeframes: {', '.join(TIMEFRAMES)}"
+
+@dp.message(Command("scan"))
+@track_time("scan_command")
+async def cmd_scan(message: types.Message, command: CommandObject, **kwargs):
+    args = (command.args or "").lower().split()
+    if len(args) != 2 or args[0] not in ("fin", "otc") or args[1] not in TIMEFRAMES:
+        return await message.answer(SCAN_USAGE)
+    cat, tf = args
+    if fin_closed(cat):
+        return await message.answer("Financial market is closed on weekends. Please try again on Monday.")
+    pairs = [pair_registry.by_name[name] for name in (await availability_checker.current()).pairs(cat)]
+    if not pairs:
+        return await message.answer("No pairs available at the moment. Please try later.")
+    wait = admission.allow_user(message.from_user.id)
+    if wait:
+        ADMISSION.labels(decision="shed", reason="user").inc()
+        return await message.answer(f"🚦 You are requesting too fast. Please try again in {math.ceil(wait)}s.")
+    status = await message.answer(f"🔎 Scanning {len(pairs)} {cat.upper()} pairs on {tf}...")
+    if scan_jobs.submit(run_scan, status, cat, tf, pairs) is None:
+        admission.refund_user(message.from_user.id)
+        ADMISSION.labels(decision="shed", reason="queue").inc()
+        outbound.post(status.edit_text("🚦 Too many scans right now. Please try again in a minute."))
+
 @dp.message(Command("start"))
 @track_time("start_command")
 async def cmd_start(message: types.Message, state: FSMContext, **kwargs):
@@ -126,11 +326,11 @@ async def cmd_start(message: types.Message, state: FSMContext, **kwargs):
     await message.answer("Hello! Choose analysis mode:", reply_markup=get_mode_keyboard())
     await state.set_state(ForecastStates.Mode)
 
-@dp.callback_query(F.data == "analysis", StateFilter(ForecastStates.Mode))
+@dp.callback_query(F.data.in_({"analysis", "mtf"}), StateFilter(ForecastStates.Mode))
 @track_time("mode_selection")
 async def set_mode(callback: CallbackQuery, state: FSMContext, **kwargs):
     await callback.answer()
-    await state.update_data(mode="ind")
+    await state.update_data(mode="mtf" if callback.data == "mtf" else "ind")
     await callback.message.edit_text("Choose asset category:", reply_markup=get_category_keyboard())
     await state.set_state(ForecastStates.Category)
 
@@ -143,21 +343,24 @@ async def set_category(callback: CallbackQuery, state: FSMContext, **kwargs):
 
     cat = callback.data
     # блокируем fin по выходным
-    if cat == "fin" and datetime.datetime.utcnow().weekday() in (5, 6):
+    if fin_closed(cat):
         return await callback.message.edit_text(
             "Financial market is closed on weekends. Please try again on Monday.",
             reply_markup=get_restart_keyboard()
         )
 
     await state.update_data(category=cat)
-    pairs = await get_available_pairs(cat)
+    snapshot = await availability_checker.current()
+    pairs = snapshot.pairs(cat)
     if not pairs:
         return await callback.message.edit_text(
             "No pairs available at the moment. Please try later.",
             reply_markup=get_restart_keyboard()
         )
 
-    await callback.message.edit_text("Choose pair:", reply_markup=get_pairs_keyboard(pairs))
+    await callback.message.edit_text(
+        "Choose pair:", reply_markup=get_pairs_keyboard_cached(cat, snapshot.version, pairs)
+    )
     await state.set_state(ForecastStates.Pair)
 
 @dp.callback_query(StateFilter(ForecastStates.Pair))
@@ -167,88 +370,311 @@ async def set_pair(callback: CallbackQuery, state: FSMContext, **kwargs):
     if callback.data == "back":
         return await set_category(callback, state)
 
-    pair_name = callback.data
-    pair_info = get_pair_info(pair_name)
-    if not pair_info or not await availability_checker.is_available(pair_name):
+    pair = pair_registry.from_callback(callback.data)
+    if pair is None or not await availability_checker.is_available(pair.name):
         return await callback.message.edit_text(
             "⚠️ This pair is unavailable.", reply_markup=get_restart_keyboard()
         )
 
-    await state.update_data(pair=pair_name)
+    await state.update_data(pair=pair.name)
     await callback.message.edit_text("Choose timeframe:", reply_markup=get_timeframe_keyboard())
     await state.set_state(ForecastStates.Timeframe)
 
+def candles_key(symbol: str, tf: str, cat: str, count: Optional[int] = None) -> str:
+    return f"{symbol}_{tf}_{cat}" + (f"_{count}" if count else "")
+
+def forecast_candles_key(mode: str, cat: str, pair: Optional[Pair], tf: str) -> Optional[str]:
+    if pair is None:
+        return None
+    count = confluence.base_bars(confluence.ladder(tf)) if mode == "mtf" else None
+    return candles_key(pair.po, tf, cat, count)
+
 @dp.callback_query(StateFilter(ForecastStates.Timeframe))
 @track_time("forecast_generation")
 async def set_timeframe(callback: CallbackQuery, state: FSMContext, **kwargs):
-    await callback.answer("⏳ Analyzing...")
-    processing_msg = await callback.message.edit_text("⏳ Analyzing PocketOption data...")
-
     data = await state.get_data()
     mode = data.get("mode", "ind")
     cat = data.get("category", "fin")
-    pair_human = data.get("pair")
+    pair = pair_registry.by_name.get(data.get("pair"))
     tf = callback.data
 
+    announced, place, text = submit_forecast(callback.from_user.id, mode, cat, pair, tf)
+    if announced is None:
+        # отказ: состояние остаётся — можно нажать таймфрейм ещё раз
+        return await callback.answer(text, show_alert=True)
+    await state.clear()
+    # не ждём Telegram: если прогноз готов раньше, чем ушла эта правка, уйдёт только он
+    outbound.post(callback.answer("⏳ Analyzing..."))
+    outbound.post(callback.message.edit_text(text))
+    announced.set_result((callback.message, place))
+
+def submit_forecast(user_id: int, mode: str, cat: str, pair: Optional[Pair],
+                    tf: str) -> Tuple[Optional[asyncio.Future], int, str]:
+    """
+    Допуск и постановка прогноза в очередь: (announced, место, текст
+    статуса).  Вызывающий показывает текст и кладёт в ``announced``
+    (сообщение для результата, место).  Прогноз не принят — (None, 0,
+    текст отказа).
+    """
+    # свечи в кеше — прогноз дешёвый и идёт первым; иначе тратится токен пользователя
+    key = forecast_candles_key(mode, cat, pair, tf)
+    cached = key is None or cache.get(key) is not None
+    fresh = True
+    spent = False
+    if not cached:
+        wait = admission.allow_user(user_id)
+        if wait:
+            if cache.get_stale(key) is None:
+                ADMISSION.labels(decision="shed", reason="user").inc()
+                return None, 0, f"🚦 You are requesting too fast. Please try again in {math.ceil(wait)}s."
+            fresh = False
+        else:
+            spent = True
+
+    announced = asyncio.get_running_loop().create_future()
+    job = forecast_jobs.submit(run_forecast, mode, cat, pair, tf, fresh, announced, priority=0 if cached else 1)
+    if job is None:
+        # очередь полна — токен пользователя не сгорает
+        if spent:
+            admission.refund_user(user_id)
+        ADMISSION.labels(decision="shed", reason="queue").inc()
+        return None, 0, "🚦 Too many requests right now. Please try again in a minute."
+    place = forecast_jobs.position(job)
+    if place:
+        return announced, place, f"⏳ You are #{place} in the queue. The forecast will start shortly..."
+    return announced, place, "⏳ Analyzing PocketOption data..."
+
+async def run_forecast(mode: str, cat: str, pair: Optional[Pair], tf: str,
+                       fresh: bool, announced: asyncio.Future):
+    """
+    Прогноз в воркере очереди.  ``fresh=False`` — у пользователя кончились
+    токены: только кеш свечей, пусть и устаревший.  ``announced`` —
+    сообщение, которое правится результатом, и место в очереди, которое
+    хендлер уже показал.
+    """
+    message, place = await announced
+    if message is None:
+        # статус не отправился — результат показать негде
+        return
     try:
-        cache_key = f"{get_pair_info(pair_human)['po']}_{tf}_{cat}"
+        if place:
+            outbound.post(message.edit_text("⏳ Analyzing PocketOption data..."))
+        if pair is None:
+            raise RuntimeError("Unknown pair, please choose it again")
+        symbol = pair.po
+        # multi-TF: одна длинная история базового таймфрейма на все старшие
+        timeframes = confluence.ladder(tf) if mode == "mtf" else [tf]
+        count = confluence.base_bars(timeframes) if mode == "mtf" else None
+        cache_key = candles_key(symbol, tf, cat, count)
         df = cache.get(cache_key)
+        stale_age = None
         if df is None or df.empty:
-            CACHE_MISSES.inc()
-            df = await _fetcher.fetch(
-                get_pair_info(pair_human)["po"], timeframe=tf, otc=(cat == "otc")
-            )
-            if df is not None and not df.empty:
-                cache.set(cache_key, df)
+            stale = cache.get_stale(cache_key)
+            reason = "user" if not fresh else ("global" if stale is not None and not admission.fetch_free() else None)
+            if reason and stale is not None:
+                df, stale_age = stale
+                ADMISSION.labels(decision="downgraded", reason=reason).inc()
+            elif reason:
+                # устаревшие свечи успели выпасть из кеша
+                ADMISSION.labels(decision="shed", reason=reason).inc()
+                raise RuntimeError("Too many requests, please try again in a minute")
+            else:
+                CACHE_MISSES.inc()
+                ADMISSION.labels(decision="admitted", reason="").inc()
+                async with admission.fetch_slot():
+                    df, _source = await _fetcher.fetch(symbol, timeframe=tf, otc=(cat == "otc"), count=count)
+                if df is not None and not df.empty:
+                    cache.set(cache_key, df)
         else:
             CACHE_HITS.inc()
 
         if df is None or df.empty:
             raise RuntimeError("No data received from PocketOption")
 
-        if mode == "ind":
-            ind = compute_indicators(df)
-            action, notes = signal_from_indicators(df, ind)
-            text = format_forecast_message(pair_human, mode, tf, action, ind, notes)
+        otc = cat == "otc"
+        stamp = bar_stamp(df)
+        result = analysis_cache.get((symbol, tf, otc, mode), stamp)
+        if result is None and mode == "mtf":
+            ANALYSIS_CACHE_MISSES.inc()
+            report = confluence.analyze(df, tf, timeframes, indicator_params.for_timeframe)
+            result = (report, report["verdict"], ())
+            analysis_cache.set((symbol, tf, otc, mode), stamp, result)
+        elif result is None:
+            ANALYSIS_CACHE_MISSES.inc()
+            # Признаки считаются один раз на бар и переиспользуются всеми пользователями
+            frame = feature_cache.get((symbol, tf, otc), stamp)
+            if frame is None:
+                # уровни ведутся инкрементально: в трекер попадают только новые бары
+                tracker = levels.sync((symbol, tf, otc), df)
+                frame = FeatureFrame.of(df, indicator_params.for_timeframe(tf)).provide(
+                    high_20=tracker.resistance(20), low_20=tracker.support(20), levels=tracker,
+                )
+                feature_cache.set((symbol, tf, otc), stamp, frame)
+
+            if mode == "ind":
+                ind = compute_indicators(frame)
+                action, notes = signal_from_indicators(frame, ind)
+                model = scoring.current()
+                if model is not None:
+                    score = float(scoring.score_frames([frame], model)[0])
+                    expiry = model.meta.get("expiry_bars", 1)
+                    notes = list(notes) + [f"Model: {score:.0f}% chance of a higher close in {expiry} bar(s)"]
+            else:
+                ind = {}
+                action, notes = simple_ta_signal(frame)
+                notes = list(notes) + level_notes(frame["levels"])
+            result = (ind, action, tuple(notes))
+            analysis_cache.set((symbol, tf, otc, mode), stamp, result)
+        else:
+            ANALYSIS_CACHE_HITS.inc()
+        ANALYSIS_CACHE_HIT_RATIO.set(analysis_cache.hit_ratio)
+
+        ind, action, notes = result
+        track = forecast_log.accuracy(mode, (symbol, tf, otc))
+        if mode == "mtf":
+            text = format_confluence_message(pair.name, ind, track)
         else:
-            action, notes = simple_ta_signal(df)
-            text = format_forecast_message(pair_human, mode, tf, action, {}, notes)
+            text = format_forecast_message(pair.name, mode, tf, action, ind, list(notes), track)
+        if stale_age is not None:
+            text += f"\n\n♻️ Based on cached data from {stale_age / 60:.0f} min ago: too many requests right now"
 
-        FORECAST_COUNT.labels(pair=pair_human, timeframe=tf, action=action).inc()
-        await processing_msg.edit_text(text, reply_markup=get_restart_keyboard())
+        FORECAST_COUNT.labels(pair=pair.name, timeframe=tf, action=action).inc()
+        outbound.post(message.edit_text(text, reply_markup=get_result_keyboard(repeat_data(mode, pair, tf))))
 
     except Exception as e:
         ERROR_COUNT.labels(error_type="analysis_error").inc()
-        await processing_msg.edit_text(
+        outbound.post(message.edit_text(
             f"❌ Analysis error\n\nReason: {e}\nTry another pair or timeframe",
             reply_markup=get_restart_keyboard()
-        )
+        ))
+        return
 
-    await state.clear()
+    # прогноз уже у пользователя: сбой журнала только в лог
+    if stale_age is None:
+        try:
+            forecast_log.record((symbol, tf, otc), mode, action, df)
+        except Exception:
+            ERROR_COUNT.labels(error_type="forecast_log").inc()
+            logger.exception("Forecast log: record failed")
+
+async def scan_candles(pair: Pair, tf: str):
+    """Свечи для скана: кеш, при занятых слотах — устаревший кеш, иначе фетч в слоте admission"""
+    key = candles_key(pair.po, tf, "otc" if pair.otc else "fin")
+    df = cache.get(key)
+    if df is not None and not df.empty:
+        CACHE_HITS.inc()
+        return df
+    stale = cache.get_stale(key)
+    if stale is not None and not admission.fetch_free():
+        return stale[0]
+    CACHE_MISSES.inc()
+    async with admission.fetch_slot():
+        df, _source = await _fetcher.fetch(pair.po, timeframe=tf, otc=pair.otc)
+    if df is not None and not df.empty:
+        cache.set(key, df)
+        return df
+    return stale[0] if stale is not None else None
+
+def format_scan_message(scan: Scan, cat: str, final: bool) -> str:
+    buys, sells = scan.top(SCAN_TOP)
+
+    def lines(setups: list[Setup]) -> list[str]:
+        return [f"{i}. {s.pair.name} — {s.action} (RSI {s.rsi:.1f})" for i, s in enumerate(setups, 1)] or ["—"]
+
+    head = "🔎 SCAN" if final else "🔎 Scanning"
+    text = [f"{head} {cat.upper()} · {scan.tf.upper()} — {scan.done}/{scan.total} pairs", ""]
+    text += ["🟢 BUY"] + lines(buys) + ["", "🔴 SELL"] + lines(sells)
+    if final:
+        text.append("")
+        text.append(f"⏱ {scan.elapsed:.1f}s")
+        if scan.skipped:
+            text[-1] += f", partial: {scan.skipped} pairs did not load within {scan.budget:.0f}s"
+        if scan.failed:
+            text.append(f"⚠️ No data for {scan.failed} pairs")
+    return "\n".join(text)
+
+async def run_scan(message: types.Message, cat: str, tf: str, pairs: list[Pair]):
+    """Скан в воркере очереди сканов; промежуточные рейтинги правят одно сообщение (правки склеиваются)"""
+    def show(scan: Scan, final: bool):
+        outbound.post(message.edit_text(
+            format_scan_message(scan, cat, final), reply_markup=get_restart_keyboard() if final else None
+        ))
+
+    async def load(pair: Pair):
+        return await scan_candles(pair, tf)
+
+    await Scan(pairs, tf, load, concurrency=SCAN_CONCURRENCY, budget=SCAN_BUDGET_SEC).run(show)
 
 async def metrics_handler(request):
     return web.Response(body=generate_latest(), content_type="text/plain")
 
-async def start_metrics_server():
+def build_http_app(webhook_secret: Optional[str] = None) -> web.Application:
+    """/metrics, plus the Telegram webhook route when a secret is given"""
     app = web.Application()
     app.router.add_get("/metrics", metrics_handler)
-    runner = web.AppRunner(app)
+    if webhook_secret:
+        webhook.mount(app, dp, bot, WEBHOOK_PATH, webhook_secret, WEBHOOK_CONCURRENCY)
+    return app
+
+async def start_metrics_server(webhook_secret: Optional[str] = None, port: int = HTTP_PORT) -> web.AppRunner:
+    runner = web.AppRunner(build_http_app(webhook_secret))
     await runner.setup()
-    site = web.TCPSite(runner, "0.0.0.0", 8080)
+    site = web.TCPSite(runner, "0.0.0.0", port)
     await site.start()
+    return runner
 
 async def auto_update_availability():
     while True:
         await availability_checker.update_availability()
-        await asyncio.sleep(300)
+        # клавиатуры новой версии строятся здесь, а не на первом нажатии категории
+        snapshot = availability_checker.snapshot
+        for cat in ("fin", "otc"):
+            get_pairs_keyboard_cached(cat, snapshot.version, snapshot.pairs(cat))
+        await asyncio.sleep(availability_checker.check_interval.total_seconds())
+
+async def evaluate_forecasts(interval: int = 60):
+    """Раз в минуту: свечи по потокам с истёкшими прогнозами (один фетч на поток) и пакетная проверка"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            for symbol, tf, otc in forecast_log.due_streams():
+                async with admission.fetch_slot():
+                    df, _source = await _fetcher.fetch(symbol, timeframe=tf, otc=otc)
+                if df is not None and not df.empty:
+                    forecast_log.observe((symbol, tf, otc), df)
+            FORECASTS_RESOLVED.inc(forecast_log.evaluate())
+            for (rule, tf), (wins, total) in forecast_log.summary(("rule", "timeframe")).items():
+                FORECAST_ACCURACY.labels(rule=rule, timeframe=tf).set(wins / total if total else 0.0)
+            forecast_log.flush()
+            forecast_log.compact()
+        except Exception:
+            logger.exception("Forecast evaluation failed")
 
 async def main():
     if not TELEGRAM_TOKEN:
         raise SystemExit("TELEGRAM_TOKEN env var is required")
     logger.info("Starting Telegram bot...")
-    asyncio.create_task(start_metrics_server())
+    backend = kernels.use_backend(INDICATOR_BACKEND)
+    KERNEL_COMPILE_TIME.labels(backend=backend).set(kernels.compile_seconds)
+    logger.info(f"Indicator backend: {backend} (compile {kernels.compile_seconds:.2f}s)")
+    tuned = indicator_params.load(INDICATOR_PARAMS_FILE)
+    logger.info(f"Indicator params: {tuned} tuned timeframe sets from {INDICATOR_PARAMS_FILE}")
+    if scoring.load(SCORING_MODEL_FILE):
+        logger.info(f"Scoring model: {scoring.current().kind} from {SCORING_MODEL_FILE}")
     asyncio.create_task(auto_update_availability())
-    await dp.start_polling(bot)
+    asyncio.create_task(evaluate_forecasts())
+    if not WEBHOOK_URL:
+        # нет публичного адреса — long polling, HTTP-сервер только для /metrics
+        asyncio.create_task(start_metrics_server())
+        await dp.start_polling(bot)
+        return
+    secret = WEBHOOK_SECRET or webhook.new_secret()
+    runner = await start_metrics_server(secret)
+    try:
+        await webhook.register(bot, dp, WEBHOOK_URL + WEBHOOK_PATH, secret)
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
 
 if __name__ == "__main__":
     asyncio.run(main())
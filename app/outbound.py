@@ -0,0 +1,212 @@
+# app/outbound.py
+"""
+Исходящие запросы к Telegram: лимиты, склейка правок, ``retry_after``.
+
+``OutboundGovernor`` is a request middleware of the bot's session, so every
+call that targets a chat passes through it:
+
+- a global token bucket (Telegram allows ~30 messages/s per bot) and one
+  bucket per chat (about one message per second, short bursts are fine);
+  a request sleeps for its reservation instead of running into a 429;
+- successive ``editMessageText`` calls for the same message collapse:
+  while an edit waits for its token, a newer edit replaces its text and
+  both callers get the one result — "⏳ Analyzing..." followed by the
+  forecast within the same second costs one request;
+- a 429 blocks the chat's bucket (the global one for chatless calls) for
+  ``retry_after`` seconds and the request is retried after that, so other
+  chats keep going instead of queueing behind it.
+
+``post`` hands a call to the governor without waiting for it: handlers
+and forecast workers should not sit on a Telegram throttle.
+"""
+from __future__ import annotations
+import asyncio
+import time
+from typing import Any, Awaitable, Dict, Hashable, Optional, Set
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import EditMessageText, TelegramMethod
+from loguru import logger
+from prometheus_client import Counter, Histogram
+
+OUTBOUND_REQUESTS = Counter("bot_outbound_requests_total", "Telegram API calls by outcome", ["method", "status"])
+OUTBOUND_WAIT = Histogram("bot_outbound_wait_seconds", "Time a Telegram call waited for the rate limit",
+                          buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+
+
+class TokenBucket:
+    """
+    ``rate`` tokens/s, at most ``burst`` saved.  ``reserve`` takes a token
+    at once and returns how long to wait for it: the balance may go
+    negative, so callers queue up in reservation order.
+    """
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate: float, burst: float, now: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic() if now is None else now
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def reserve(self, now: float) -> float:
+        self._refill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def take(self, now: float) -> float:
+        """Take a token if one is there (0.0), else only say how long until one is"""
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def refund(self, now: float):
+        """Give back a token taken for work that was not done"""
+        self._refill(now)
+        self.tokens = min(self.burst, self.tokens + 1)
+
+    def block(self, now: float, seconds: float):
+        """No token for ``seconds`` (``retry_after``)"""
+        self._refill(now)
+        self.tokens = min(self.tokens, 1 - self.rate * seconds)
+
+    def idle(self, now: float) -> bool:
+        return self.tokens + (now - self.stamp) * self.rate >= self.burst
+
+
+class _Edit:
+    """An editMessageText waiting for its token; newer edits replace ``method``"""
+    __slots__ = ("method", "future", "sending")
+
+    def __init__(self, method: EditMessageText):
+        self.method = method
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.sending = False
+
+
+class OutboundGovernor(BaseRequestMiddleware):
+    def __init__(self, rate: float = 25.0, chat_rate: float = 1.0, chat_burst: float = 3.0,
+                 max_retries: int = 5, max_chats: int = 10_000):
+        self.rate = rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self._global = TokenBucket(rate, max(1.0, rate))
+        self._chats: Dict[Hashable, TokenBucket] = {}
+        self._edits: Dict[Hashable, _Edit] = {}
+
+    def _chat(self, chat_id: Hashable, now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.max_chats:
+                # buckets that refilled completely hold no state worth keeping
+                self._chats = {k: b for k, b in self._chats.items() if not b.idle(now)}
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst, now)
+        return bucket
+
+    async def _wait(self, chat_id: Hashable):
+        """Sleep for a token of the chat, then for a global one"""
+        started = time.monotonic()
+        delay = self._chat(chat_id, started).reserve(started)
+        if delay:
+            await asyncio.sleep(delay)
+        now = time.monotonic()
+        delay = self._global.reserve(now)
+        if delay:
+            await asyncio.sleep(delay)
+        OUTBOUND_WAIT.observe(time.monotonic() - started)
+
+    async def _send(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod,
+                    chat_id: Optional[Hashable]) -> Any:
+        name = type(method).__name__
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    OUTBOUND_REQUESTS.labels(method=name, status="error").inc()
+                    raise
+                OUTBOUND_REQUESTS.labels(method=name, status="retry_after").inc()
+                now = time.monotonic()
+                (self._chat(chat_id, now) if chat_id is not None else self._global).block(now, e.retry_after)
+                logger.warning(f"{name}: flood control, retry in {e.retry_after}s")
+                if chat_id is not None:
+                    await self._wait(chat_id)
+                else:
+                    await asyncio.sleep(e.retry_after)
+                continue
+            except Exception:
+                OUTBOUND_REQUESTS.labels(method=name, status="error").inc()
+                raise
+            OUTBOUND_REQUESTS.labels(method=name, status="sent").inc()
+            return result
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod) -> Any:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            # answerCallbackQuery, getMe ... do not count against chat limits
+            return await self._send(make_request, bot, method, None)
+        if not isinstance(method, EditMessageText) or method.message_id is None:
+            await self._wait(chat_id)
+            return await self._send(make_request, bot, method, chat_id)
+
+        key = (chat_id, method.message_id)
+        pending = self._edits.get(key)
+        if pending is not None and not pending.sending:
+            # still waiting for a token: send the newer text instead
+            pending.method = method
+            OUTBOUND_REQUESTS.labels(method="EditMessageText", status="coalesced").inc()
+            return await asyncio.shield(pending.future)
+        edit = self._edits[key] = _Edit(method)
+        try:
+            if pending is not None:
+                # one edit of this message in flight at a time, in call order
+                await asyncio.wait([pending.future])
+            await self._wait(chat_id)
+            edit.sending = True
+            result = await self._send(make_request, bot, edit.method, chat_id)
+            edit.future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            edit.future.cancel()
+            raise
+        except Exception as e:
+            if not edit.future.done():
+                edit.future.set_exception(e)
+                # coalesced callers may be gone: mark the exception as retrieved
+                edit.future.exception()
+            raise
+        finally:
+            if self._edits.get(key) is edit:
+                del self._edits[key]
+
+
+_posted: Set[asyncio.Task] = set()
+
+
+async def _logged(call: Awaitable[Any]) -> Any:
+    try:
+        return await call
+    except Exception as e:
+        logger.warning(f"Telegram call failed: {e}")
+
+
+def post(call: Awaitable[Any]) -> asyncio.Task:
+    """Send ``call`` in the background; calls posted in order reach the governor in order"""
+    task = asyncio.create_task(_logged(call))
+    _posted.add(task)
+    task.add_done_callback(_posted.discard)
+    return task
+
+
+def pending() -> int:
+    """Posted calls not finished yet"""
+    return len(_posted)
@@ -3,12 +3,18 @@
 Full list of PocketOption pairs with real availability checking
 """
 import asyncio
+import time
 import aiohttp
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from types import MappingProxyType
+from typing import Dict, FrozenSet, Iterator, List, Mapping, Optional, Tuple
 from loguru import logger
 from playwright.async_api import async_playwright
 
+from .config import AVAILABILITY_REFRESH_SEC, AVAILABILITY_TIMEOUT
+from .data_sources import asset_status
+
 # Complete list of all pairs
 ALL_PAIRS = {
     # Major pairs (FIN)
@@ -106,58 +112,164 @@ OTC_PAIRS = {
     "SAR/CNY OTC": {"po": "SARCNY", "category": "otc", "otc": True},
 }
 
+@dataclass(frozen=True)
+class Pair:
+    """One registry entry; ``id`` is its place in the registry, ``callback`` the button payload"""
+    id: int
+    name: str
+    po: str
+    category: str
+    otc: bool
+    callback: str
+    info: Mapping[str, object]
+
+
+class PairRegistry:
+    """
+    All pairs, frozen at import: compact integer ids and indexes by display
+    name, PO code (with the OTC flag), category and OTC flag.  Lookups
+    return prebuilt objects, nothing is allocated per call.
+    """
+    CALLBACK_PREFIX = "p"
+
+    def __init__(self, *groups: Mapping[str, Dict]):
+        pairs: List[Pair] = []
+        for group in groups:
+            for name, info in group.items():
+                n = len(pairs)
+                pairs.append(Pair(n, name, info["po"], info["category"], bool(info.get("otc")),
+                                  f"{self.CALLBACK_PREFIX}{n}", MappingProxyType(info)))
+        self.pairs: Tuple[Pair, ...] = tuple(pairs)
+        self.by_name: Mapping[str, Pair] = MappingProxyType({p.name: p for p in pairs})
+        self.by_po: Mapping[Tuple[str, bool], Pair] = MappingProxyType({(p.po, p.otc): p for p in pairs})
+        if len(self.by_name) != len(pairs) or len(self.by_po) != len(pairs):
+            raise ValueError("Duplicate pair name or PO code")
+        categories: Dict[str, List[Pair]] = {}
+        for p in pairs:
+            categories.setdefault(p.category, []).append(p)
+        self.by_category: Mapping[str, Tuple[Pair, ...]] = MappingProxyType(
+            {c: tuple(ps) for c, ps in categories.items()})
+        self.by_otc: Mapping[bool, Tuple[Pair, ...]] = MappingProxyType(
+            {otc: tuple(p for p in pairs if p.otc == otc) for otc in (False, True)})
+        self._by_callback: Mapping[str, Pair] = MappingProxyType({p.callback: p for p in pairs})
+
+    def __len__(self) -> int:
+        return len(self.pairs)
+
+    def __iter__(self) -> Iterator[Pair]:
+        return iter(self.pairs)
+
+    def get(self, pair_id: int) -> Optional[Pair]:
+        return self.pairs[pair_id] if 0 <= pair_id < len(self.pairs) else None
+
+    def find(self, symbol: str, otc: bool = False) -> Optional[Pair]:
+        """Pair by PO code typed by a user: EURUSD, eurusd, EUR/USD"""
+        return self.by_po.get((symbol.upper().replace("/", ""), otc))
+
+    def from_callback(self, data: Optional[str]) -> Optional[Pair]:
+        """Pair of a button; buttons on older messages carry the display name"""
+        return self._by_callback.get(data) or self.by_name.get(data)
+
+
+pair_registry = PairRegistry(ALL_PAIRS, OTC_PAIRS)
+_ALL_INFO: Mapping[str, Mapping] = MappingProxyType({p.name: p.info for p in pair_registry})
+
+@dataclass(frozen=True)
+class AvailabilitySnapshot:
+    """
+    Immutable view of pair availability.  ``version`` changes only when the
+    set of unavailable pairs does, so anything derived from a snapshot
+    (keyboards) can be cached per version.
+    """
+    version: int
+    checked_at: Optional[datetime]
+    unavailable: FrozenSet[str]
+    by_category: Mapping[str, Mapping[str, Dict]]
+
+    @classmethod
+    def build(cls, version: int, unavailable: FrozenSet[str], checked_at: Optional[datetime] = None):
+        def available(pairs: Dict) -> Mapping[str, Dict]:
+            return MappingProxyType({n: i for n, i in pairs.items() if n not in unavailable})
+        return cls(version, checked_at, unavailable, MappingProxyType({
+            "fin": available(ALL_PAIRS),
+            "otc": available(OTC_PAIRS),
+            "all": available(_ALL_INFO),
+        }))
+
+    def is_available(self, pair_name: str) -> bool:
+        return pair_name not in self.unavailable
+
+    def pairs(self, category: str) -> Mapping[str, Dict]:
+        """Available pairs of ``category`` (fin | otc | anything else — all)"""
+        return self.by_category.get(category, self.by_category["all"])
+
+
 class PairAvailability:
     """
-    Class for checking real pair availability on PocketOption
+    Pair availability on PocketOption.  One pass over the asset table
+    (``asset_status.probe``) covers every pair; ``auto_update_availability``
+    repeats it every ``check_interval``, handlers only read the snapshot.
     """
-    def __init__(self):
-        self.unavailable_pairs = set()
+    def __init__(self, check_interval: float = AVAILABILITY_REFRESH_SEC, timeout: float = AVAILABILITY_TIMEOUT):
         self.last_check = None
-        self.check_interval = timedelta(minutes=10)
+        self.check_interval = timedelta(seconds=check_interval)
+        self.timeout = timeout
         self.checking = False
+        self.snapshot = AvailabilitySnapshot.build(0, frozenset())
+        self._refresh: Optional[asyncio.Task] = None
+
+    @property
+    def unavailable_pairs(self) -> FrozenSet[str]:
+        return self.snapshot.unavailable
+
+    def publish(self, unavailable) -> AvailabilitySnapshot:
+        """Swap in a new snapshot; same set of unavailable pairs — same version"""
+        unavailable = frozenset(unavailable)
+        self.last_check = datetime.now()
+        if unavailable != self.snapshot.unavailable:
+            self.snapshot = AvailabilitySnapshot.build(self.snapshot.version + 1, unavailable, self.last_check)
+        return self.snapshot
     
     async def check_pair_availability(self, pair_name: str) -> bool:
         """
-        Check if specific pair is available on PocketOption
-        For now returns True for all pairs - real check would need browser automation
+        Check if specific pair is available on PocketOption (current snapshot)
         """
-        # Remove this hardcoded list after implementing real check
-        # This was just for testing
-        return True
+        return self.snapshot.is_available(pair_name)
     
     async def check_all_availability_real(self):
         """
-        Real availability check using browser automation
-        This is a simplified version - full implementation would check actual PocketOption
+        Trading status of every pair from one asset-table pass.  A pair the
+        whole table does not list, or lists as closed, is unavailable; a
+        partial table only changes the pairs it lists.  When no source
+        answers the previous snapshot stays.
         """
         logger.info("Checking real pair availability on PocketOption...")
-        
+        started = time.monotonic()
         try:
-            # For now, we'll assume all standard pairs are available
-            # and some exotic OTC pairs might be unavailable
-            
-            # These are commonly unavailable during certain hours
-            potentially_unavailable = [
-                "USD/DZD OTC",
-                "YER/USD OTC", 
-                "LBP/USD OTC",
-                "NGN/USD OTC"
-            ]
-            
-            # Random simulation for testing
-            import random
-            unavailable = set()
-            for pair in potentially_unavailable:
-                if random.random() < 0.3:  # 30% chance of being unavailable
-                    unavailable.add(pair)
-            
-            self.unavailable_pairs = unavailable
-            self.last_check = datetime.now()
-            
-            logger.info(f"Availability check complete. {len(unavailable)} pairs unavailable")
-            
+            table = await asset_status.probe(self.timeout, self.check_interval.total_seconds())
         except Exception as e:
             logger.error(f"Failed to check availability: {e}")
+            table = None
+        if not table:
+            self.last_check = datetime.now()
+            logger.warning("Availability check: no asset table, keeping the previous snapshot")
+            return
+
+        status, full = table
+        known = {p.name: status.get((p.po, p.otc)) for p in pair_registry}
+        if all(active is None for active in known.values()):
+            # none of our pairs in the table: its format changed, do not hide everything
+            self.last_check = datetime.now()
+            logger.warning(f"Availability check: {len(status)} assets, none of them ours; snapshot kept")
+            return
+        if full:
+            unavailable = {name for name, active in known.items() if not active}
+        else:
+            unavailable = {name for name, active in known.items()
+                           if active is False or (active is None and name in self.snapshot.unavailable)}
+        snapshot = self.publish(unavailable)
+        logger.info(f"Availability check complete in {time.monotonic() - started:.2f}s: "
+                    f"{len(unavailable)}/{len(pair_registry)} pairs unavailable (v{snapshot.version})")
     
     async def update_availability(self):
         """
@@ -172,21 +284,26 @@ class PairAvailability:
         finally:
             self.checking = False
     
+    async def current(self) -> AvailabilitySnapshot:
+        """
+        Current snapshot, never waits for a check: a stale one starts a
+        refresh in the background (normally the scheduler is ahead of it)
+        """
+        if ((self.last_check is None or datetime.now() - self.last_check > self.check_interval)
+                and not self.checking and (self._refresh is None or self._refresh.done())):
+            self._refresh = asyncio.create_task(self.update_availability())
+        return self.snapshot
+
     async def is_available(self, pair_name: str) -> bool:
         """
         Check if pair is available with caching
         """
-        # Update if needed
-        if (self.last_check is None or 
-            datetime.now() - self.last_check > self.check_interval):
-            await self.update_availability()
-        
-        return pair_name not in self.unavailable_pairs
+        return (await self.current()).is_available(pair_name)
 
 # Global instance
 availability_checker = PairAvailability()
 
-def all_pairs(category: str) -> Dict:
+def all_pairs(category: str) -> Mapping[str, Mapping]:
     """
     Return pairs by category
     """
@@ -195,27 +312,20 @@ def all_pairs(category: str) -> Dict:
     elif category == "otc":
         return OTC_PAIRS
     else:
-        return {**ALL_PAIRS, **OTC_PAIRS}
+        return _ALL_INFO
 
-async def get_available_pairs(category: str) -> Dict:
+async def get_available_pairs(category: str) -> Mapping[str, Dict]:
     """
-    Return only available pairs
+    Return only available pairs (read-only, from the current snapshot)
     """
-    pairs = all_pairs(category)
-    available = {}
-    
-    for name, info in pairs.items():
-        if await availability_checker.is_available(name):
-            available[name] = info
-    
-    return available
+    return (await availability_checker.current()).pairs(category)
 
-def get_pair_info(pair_name: str) -> Optional[Dict]:
+def get_pair_info(pair_name: str) -> Optional[Mapping]:
     """
-    Get pair information
+    Get pair information (read-only, from the registry)
     """
-    all_pairs_combined = {**ALL_PAIRS, **OTC_PAIRS}
-    return all_pairs_combined.get(pair_name)
+    pair = pair_registry.by_name.get(pair_name)
+    return pair.info if pair is not None else None
 
 # Backwards compatibility
 PAIRS_FIN = ALL_PAIRS
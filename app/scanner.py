@@ -0,0 +1,142 @@
+# app/scanner.py
+"""
+Сканер рынка (/scan): сигналы по всем парам категории за один проход.
+
+Candles are loaded for every pair at once, at most ``concurrency`` loads in
+flight (the loader itself goes through the candle cache and the admission
+fetch slots, so a scan cannot starve single forecasts).  Whatever arrived
+since the last round is scored together: one ``compute_indicators_batch``
+over a (pairs x bars) matrix, then ``signal_from_indicators`` per row.
+
+Every ``update_every`` seconds ``on_update`` gets the ranking so far, and
+once more at the end; the scan stops at ``budget`` seconds, pairs still
+loading are dropped and the result is marked partial.
+"""
+from __future__ import annotations
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Sequence, Tuple
+
+from loguru import logger
+from prometheus_client import Counter, Histogram
+
+from .analysis import kernels
+from .analysis import params as indicator_params
+from .analysis.decision import signal_from_indicators
+from .analysis.features import FeatureFrame
+from .analysis.indicators import compute_indicators_batch
+from .pairs import Pair
+
+SCAN_PAIRS = Counter("bot_scan_pairs_total", "Pairs processed by /scan", ["outcome"])
+SCAN_TIME = Histogram("bot_scan_seconds", "Wall time of a /scan", buckets=(0.5, 1, 2.5, 5, 10, 20, 30, 60))
+
+# STRONG BUY ... STRONG SELL -> сторона и сила; HOLD в рейтинг не попадает
+STRENGTH = {"STRONG BUY": 2, "BUY": 1, "SELL": -1, "STRONG SELL": -2}
+MIN_BARS = 30
+
+
+@dataclass(frozen=True)
+class Setup:
+    pair: Pair
+    action: str
+    level: int  # +2 .. -2
+    rsi: float
+
+    @property
+    def rank(self) -> Tuple[int, float]:
+        """Stronger signal first, then the RSI further from 50"""
+        return abs(self.level), abs(self.rsi - 50)
+
+
+def score_batch(items: Sequence[Tuple[Pair, Any]], tf: str) -> List[Setup]:
+    """BUY/SELL setups of ``(pair, candles)`` items, indicators computed in one batch"""
+    if not items:
+        return []
+    params = indicator_params.for_timeframe(tf)
+    frames = [FeatureFrame.of(df) for _, df in items]
+    rows = compute_indicators_batch(kernels.stack_series([f["close"] for f in frames]), params)
+    setups = []
+    for (pair, _), ind in zip(items, rows):
+        if ind["RSI"] != ind["RSI"]:
+            continue
+        action, _notes = signal_from_indicators(None, ind, params)
+        level = STRENGTH.get(action)
+        if level:
+            setups.append(Setup(pair, action, level, ind["RSI"]))
+    return setups
+
+
+class Scan:
+    def __init__(self, pairs: Sequence[Pair], tf: str, load: Callable[[Pair], Awaitable[Any]],
+                 concurrency: int = 2, budget: float = 20.0, update_every: float = 1.0):
+        self.pairs = list(pairs)
+        self.tf = tf
+        self.load = load
+        self.concurrency = max(1, concurrency)
+        self.budget = budget
+        self.update_every = update_every
+        self.setups: Dict[int, Setup] = {}
+        self.done = 0
+        self.failed = 0
+        self.skipped = 0
+        self.elapsed = 0.0
+        self._arrived: List[Tuple[Pair, Any]] = []
+
+    @property
+    def total(self) -> int:
+        return len(self.pairs)
+
+    def top(self, n: int) -> Tuple[List[Setup], List[Setup]]:
+        """``n`` strongest BUY and ``n`` strongest SELL setups so far"""
+        ranked = sorted(self.setups.values(), key=lambda s: s.rank, reverse=True)
+        return [s for s in ranked if s.level > 0][:n], [s for s in ranked if s.level < 0][:n]
+
+    async def _one(self, pair: Pair, slots: asyncio.Semaphore):
+        async with slots:
+            try:
+                df = await self.load(pair)
+            except Exception as e:
+                logger.warning(f"Scan: {pair.name} {self.tf} failed: {e}")
+                df = None
+        self.done += 1
+        if df is None or len(df) < MIN_BARS:
+            self.failed += 1
+            SCAN_PAIRS.labels(outcome="failed").inc()
+        else:
+            self._arrived.append((pair, df))
+
+    def _score(self):
+        batch, self._arrived = self._arrived, []
+        for setup in score_batch(batch, self.tf):
+            self.setups[setup.pair.id] = setup
+        SCAN_PAIRS.labels(outcome="scored").inc(len(batch))
+
+    async def run(self, on_update: Callable[["Scan", bool], Any]) -> "Scan":
+        """Scan until every pair is in or ``budget`` runs out; ``on_update(scan, final)``"""
+        started = time.monotonic()
+        deadline = started + self.budget
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = [asyncio.create_task(self._one(pair, slots)) for pair in self.pairs]
+        try:
+            pending = set(tasks)
+            while pending:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                _, pending = await asyncio.wait(pending, timeout=min(self.update_every, left))
+                if pending and self._arrived:
+                    self._score()
+                    self.elapsed = time.monotonic() - started
+                    on_update(self, False)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self.skipped = sum(1 for task in tasks if task.cancelled())
+        SCAN_PAIRS.labels(outcome="timeout").inc(self.skipped)
+        self._score()
+        self.elapsed = time.monotonic() - started
+        SCAN_TIME.observe(self.elapsed)
+        on_update(self, True)
+        return self
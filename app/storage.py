@@ -0,0 +1,491 @@
+# app/storage.py
+"""
+FSM-хранилище, общее для нескольких процессов бота.
+
+``MemoryStorage`` keeps every conversation inside one process: a restart
+loses it and a second replica never sees it.  The backends here keep one
+record (state + data) per ``StorageKey`` outside the process:
+
+- ``SQLiteStorage`` — a WAL-mode SQLite file, for one host (several
+  processes may share the file);
+- ``RedisStorage`` — anything that speaks the Redis protocol (Redis,
+  KeyDB, Valkey, Dragonfly ...), over a small built-in RESP client, so no
+  extra package is needed.  ``app.utils.resp_server`` is a local stand-in.
+
+Both read state and data in one round trip and write any number of
+changes in one round trip.  Inside ``batch()`` — one per update, see
+``install_batching`` — the record is read once and every change the
+handlers make goes out together when the update is done.  State and data
+expire ``state_ttl`` / ``data_ttl`` seconds after the last write.
+
+Because the write comes at the end of the update, updates of one
+``StorageKey`` run one after another (``BatchedEventIsolation``): a
+second quick tap waits until the first one's changes are stored and then
+reads them.  The lock is per process; replicas behind one webhook must
+route a user to the same process for the same guarantee.
+
+``FSM_STORAGE``: ``memory`` | ``sqlite:///fsm.sqlite3`` | ``redis://[:password@]host:6379/0``
+"""
+from __future__ import annotations
+import asyncio
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import unquote, urlparse
+
+from aiogram import Dispatcher
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseEventIsolation, BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+# "field not touched" in a pending change
+KEEP: Any = object()
+
+Record = Tuple[Optional[str], Dict[str, Any]]
+Change = Tuple[Any, Any]  # (state | None | KEEP, data | KEEP)
+
+
+class _Batch:
+    """Records read and changes made while one update is handled"""
+    __slots__ = ("storage", "records", "changes")
+
+    def __init__(self, storage: "PipelinedStorage"):
+        self.storage = storage
+        self.records: Dict[str, list] = {}
+        self.changes: Dict[str, list] = {}
+
+
+_batch: ContextVar[Optional[_Batch]] = ContextVar("fsm_batch", default=None)
+
+
+def _state_name(state: StateType) -> Optional[str]:
+    return state.state if isinstance(state, State) else state
+
+
+class PipelinedStorage(BaseStorage):
+    """Base of the shared backends: ``read`` and ``write`` take many keys per round trip"""
+
+    def __init__(self, state_ttl: Optional[int] = None, data_ttl: Optional[int] = None, prefix: str = "fsm"):
+        self.state_ttl = state_ttl or None
+        self.data_ttl = data_ttl or None
+        self.prefix = prefix
+
+    def key_name(self, key: StorageKey) -> str:
+        parts = [self.prefix, str(key.bot_id), str(key.chat_id), str(key.user_id)]
+        if key.thread_id:
+            parts.append(str(key.thread_id))
+        parts.append(key.destiny)
+        return ":".join(parts)
+
+    # --- backend round trips ---
+    async def read(self, names: Sequence[str]) -> List[Record]:
+        """(state, data) for every name; a missing or expired field is None / {}"""
+        raise NotImplementedError
+
+    async def write(self, changes: Dict[str, Change]):
+        """Apply all changes; state None and empty data delete the field"""
+        raise NotImplementedError
+
+    async def merge(self, name: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """update_data outside a batch; backends may make it atomic"""
+        _, current = (await self.read([name]))[0]
+        current.update(data)
+        await self.write({name: (KEEP, current)})
+        return dict(current)
+
+    # --- batching ---
+    @asynccontextmanager
+    async def batch(self):
+        """Read each record once, send all changes in one write on exit"""
+        if self._current() is not None:
+            yield self._current()
+            return
+        batch = _Batch(self)
+        token = _batch.set(batch)
+        try:
+            yield batch
+        finally:
+            _batch.reset(token)
+            if batch.changes:
+                await self.write({name: tuple(change) for name, change in batch.changes.items()})
+
+    def _current(self) -> Optional[_Batch]:
+        batch = _batch.get()
+        return batch if batch is not None and batch.storage is self else None
+
+    async def _record(self, name: str) -> list:
+        batch = self._current()
+        if batch is None:
+            return list((await self.read([name]))[0])
+        record = batch.records.get(name)
+        if record is None:
+            record = list((await self.read([name]))[0])
+            # changes made before the first read win over what is stored
+            for i, value in enumerate(batch.changes.get(name, (KEEP, KEEP))):
+                if value is not KEEP:
+                    record[i] = value
+            batch.records[name] = record
+        return record
+
+    async def _change(self, name: str, state: Any = KEEP, data: Any = KEEP):
+        batch = self._current()
+        if batch is None:
+            await self.write({name: (state, data)})
+            return
+        change = batch.changes.setdefault(name, [KEEP, KEEP])
+        record = batch.records.get(name)
+        for i, value in enumerate((state, data)):
+            if value is not KEEP:
+                change[i] = value
+                if record is not None:
+                    record[i] = value
+
+    # --- BaseStorage ---
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._change(self.key_name(key), state=_state_name(state))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._record(self.key_name(key)))[0]
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self._change(self.key_name(key), data=dict(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return dict((await self._record(self.key_name(key)))[1])
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        name = self.key_name(key)
+        if self._current() is None:
+            return await self.merge(name, data)
+        current = dict((await self._record(name))[1])
+        current.update(data)
+        await self._change(name, data=current)
+        return dict(current)
+
+
+# -----------------------
+# SQLite (WAL)
+# -----------------------
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fsm (
+    key TEXT PRIMARY KEY,
+    state TEXT, state_expires REAL,
+    data TEXT, data_expires REAL
+) WITHOUT ROWID
+"""
+_SET_STATE = ("INSERT INTO fsm (key, state, state_expires) VALUES (?, ?, ?) "
+              "ON CONFLICT(key) DO UPDATE SET state = excluded.state, state_expires = excluded.state_expires")
+_SET_DATA = ("INSERT INTO fsm (key, data, data_expires) VALUES (?, ?, ?) "
+             "ON CONFLICT(key) DO UPDATE SET data = excluded.data, data_expires = excluded.data_expires")
+_DROP_EMPTY = "DELETE FROM fsm WHERE key = ? AND state IS NULL AND data IS NULL"
+
+
+class SQLiteStorage(PipelinedStorage):
+    """
+    One SQLite file in WAL mode: readers never block the writer, and
+    several bot processes on the same host can share the file.  Queries
+    run on one background thread so the event loop never waits on disk.
+    """
+
+    def __init__(self, path: str, state_ttl: Optional[int] = None, data_ttl: Optional[int] = None,
+                 prefix: str = "fsm", purge_interval: int = 3600):
+        super().__init__(state_ttl, data_ttl, prefix)
+        self.path = path
+        self.purge_interval = purge_interval
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fsm-sqlite")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._next_purge = 0.0
+
+    async def _run(self, fn: Callable, *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _fields(row: Optional[tuple], now: float) -> Record:
+        if row is None:
+            return None, {}
+        state, state_expires, data, data_expires = row
+        if state_expires is not None and state_expires <= now:
+            state = None
+        if data is None or (data_expires is not None and data_expires <= now):
+            return state, {}
+        return state, json.loads(data)
+
+    def _read(self, names: Sequence[str]) -> List[Record]:
+        now = time.time()
+        placeholders = ",".join("?" * len(names))
+        rows = {r[0]: r[1:] for r in self._db().execute(
+            f"SELECT key, state, state_expires, data, data_expires FROM fsm WHERE key IN ({placeholders})",
+            list(names),
+        )}
+        return [self._fields(rows.get(name), now) for name in names]
+
+    def _apply(self, db: sqlite3.Connection, changes: Dict[str, Change], now: float):
+        state_expires = now + self.state_ttl if self.state_ttl else None
+        data_expires = now + self.data_ttl if self.data_ttl else None
+        for name, (state, data) in changes.items():
+            if state is not KEEP:
+                db.execute(_SET_STATE, (name, state, state_expires if state is not None else None))
+            if data is not KEEP:
+                db.execute(_SET_DATA, (name, json.dumps(data) if data else None, data_expires if data else None))
+            if state is None or (data is not KEEP and not data):
+                db.execute(_DROP_EMPTY, (name,))
+
+    def _write(self, changes: Dict[str, Change]):
+        db = self._db()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            self._apply(db, changes, now)
+            if now >= self._next_purge:
+                self._purge(db, now)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _merge(self, name: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        db = self._db()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            _, current = self._read([name])[0]
+            current.update(data)
+            self._apply(db, {name: (KEEP, current)}, now)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return dict(current)
+
+    def _purge(self, db: sqlite3.Connection, now: float):
+        db.execute("UPDATE fsm SET state = NULL, state_expires = NULL WHERE state_expires <= ?", (now,))
+        db.execute("UPDATE fsm SET data = NULL, data_expires = NULL WHERE data_expires <= ?", (now,))
+        db.execute("DELETE FROM fsm WHERE state IS NULL AND data IS NULL")
+        self._next_purge = now + self.purge_interval
+
+    async def read(self, names: Sequence[str]) -> List[Record]:
+        return await self._run(self._read, names)
+
+    async def write(self, changes: Dict[str, Change]):
+        if changes:
+            await self._run(self._write, changes)
+
+    async def merge(self, name: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._run(self._merge, name, data)
+
+    async def close(self) -> None:
+        def _close():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        await self._run(_close)
+        self._executor.shutdown(wait=True)
+
+
+# -----------------------
+# Redis protocol
+# -----------------------
+class RespError(Exception):
+    """Error reply from the server"""
+
+
+def _encode(command: Sequence[Any]) -> bytes:
+    out = [b"*%d\r\n" % len(command)]
+    for arg in command:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode()
+        out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(out)
+
+
+async def _read_reply(reader: asyncio.StreamReader) -> Any:
+    line = await reader.readuntil(b"\r\n")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode()
+    if kind == b"-":
+        return RespError(rest.decode())
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        n = int(rest)
+        return None if n < 0 else (await reader.readexactly(n + 2))[:-2]
+    if kind == b"*":
+        n = int(rest)
+        return None if n < 0 else [await _read_reply(reader) for _ in range(n)]
+    raise RespError(f"unexpected reply {line[:40]!r}")
+
+
+class RespClient:
+    """
+    Minimal RESP2 client: ``execute`` sends a pipeline of commands in one
+    write and reads all replies back.  Connections are pooled; a broken one
+    is dropped and the next call reconnects.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6379, db: int = 0,
+                 username: Optional[str] = None, password: Optional[str] = None,
+                 pool_size: int = 8, timeout: float = 5.0):
+        self.host, self.port, self.db = host, port, db
+        self.username, self.password = username, password
+        self.timeout = timeout
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._slots = asyncio.Semaphore(max(1, pool_size))
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs: Any) -> "RespClient":
+        u = urlparse(url)
+        db = int(u.path.lstrip("/") or 0)
+        return cls(u.hostname or "127.0.0.1", u.port or 6379, db,
+                   unquote(u.username) if u.username else None,
+                   unquote(u.password) if u.password else None, **kwargs)
+
+    async def _connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.username, self.password) if self.username else ("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            writer.write(b"".join(_encode(c) for c in setup))
+            await writer.drain()
+            for _ in setup:
+                reply = await _read_reply(reader)
+                if isinstance(reply, RespError):
+                    writer.close()
+                    raise reply
+        return reader, writer
+
+    @staticmethod
+    async def _replies(reader: asyncio.StreamReader, n: int) -> List[Any]:
+        return [await _read_reply(reader) for _ in range(n)]
+
+    async def execute(self, *commands: Sequence[Any]) -> List[Any]:
+        async with self._slots:
+            conn = self._idle.pop() if self._idle else await self._connect()
+            reader, writer = conn
+            try:
+                writer.write(b"".join(_encode(c) for c in commands))
+                await writer.drain()
+                replies = await asyncio.wait_for(self._replies(reader, len(commands)), self.timeout)
+            except BaseException:
+                writer.close()
+                raise
+            self._idle.append(conn)
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    async def close(self):
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+
+class RedisStorage(PipelinedStorage):
+    """
+    State and data under ``<prefix>:<bot>:<chat>:<user>[:<thread>]:<destiny>:state|data``
+    with ``SET ... EX`` TTLs; reads are one ``MGET``, writes one pipeline.
+    """
+
+    def __init__(self, client: RespClient, state_ttl: Optional[int] = None, data_ttl: Optional[int] = None,
+                 prefix: str = "fsm"):
+        super().__init__(state_ttl, data_ttl, prefix)
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs: Any) -> "RedisStorage":
+        return cls(RespClient.from_url(url), **kwargs)
+
+    async def read(self, names: Sequence[str]) -> List[Record]:
+        keys = [f"{name}:{field}" for name in names for field in ("state", "data")]
+        values = (await self.client.execute(("MGET", *keys)))[0]
+        return [
+            (state.decode() if state is not None else None, json.loads(data) if data else {})
+            for state, data in zip(values[::2], values[1::2])
+        ]
+
+    def _set(self, key: str, value: Any, ttl: Optional[int]) -> tuple:
+        if value is None:
+            return ("DEL", key)
+        return ("SET", key, value, "EX", ttl) if ttl else ("SET", key, value)
+
+    async def write(self, changes: Dict[str, Change]):
+        commands = []
+        for name, (state, data) in changes.items():
+            if state is not KEEP:
+                commands.append(self._set(f"{name}:state", state, self.state_ttl))
+            if data is not KEEP:
+                commands.append(self._set(f"{name}:data", json.dumps(data) if data else None, self.data_ttl))
+        if commands:
+            await self.client.execute(*commands)
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+# -----------------------
+# Wiring
+# -----------------------
+def create_storage(url: str, ttl: Optional[int] = None) -> BaseStorage:
+    """``FSM_STORAGE`` -> storage; ``ttl`` applies to both state and data"""
+    url = (url or "memory").strip()
+    if url == "memory":
+        return MemoryStorage()
+    if url.startswith("sqlite:///"):
+        return SQLiteStorage(url[len("sqlite:///"):], state_ttl=ttl, data_ttl=ttl)
+    if url.startswith("redis://"):
+        return RedisStorage.from_url(url, state_ttl=ttl, data_ttl=ttl)
+    raise ValueError(f"Unsupported FSM_STORAGE: {url!r} (memory | sqlite:///path | redis://host:port/db)")
+
+
+class BatchedEventIsolation(BaseEventIsolation):
+    """
+    Updates of one StorageKey one at a time, each in ``storage.batch()``:
+    the batch is written before the next update of that key reads.
+    """
+
+    def __init__(self, storage: PipelinedStorage):
+        self.storage = storage
+        self._locks: Dict[StorageKey, list] = {}  # key -> [lock, updates holding or waiting]
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncIterator[None]:
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self.storage.batch():
+                    yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def close(self) -> None:
+        self._locks.clear()
+
+
+def install_batching(dp: Dispatcher) -> bool:
+    """One read and one write per update for a PipelinedStorage; False for other storages"""
+    storage = dp.fsm.storage
+    if not isinstance(storage, PipelinedStorage):
+        return False
+    # the FSM middleware reads the state and runs the handler inside this lock
+    dp.fsm.events_isolation = BatchedEventIsolation(storage)
+    return True
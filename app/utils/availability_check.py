@@ -0,0 +1,167 @@
+"""
+Проверка доступности пар (app.pairs + app.data_sources.asset_status) на
+локальном сервере socket.io.
+
+The server answers the cookie request on ``PO_ENTRY_URL`` and, like
+PocketOption, pushes ``updateAssets`` with the whole asset table to every
+new session.  Checked:
+
+- one pass covers every pair of ``ALL_PAIRS`` and ``OTC_PAIRS`` within a
+  few seconds, pairs listed as closed or not listed at all are
+  unavailable;
+- a later push (one pair closes) shows up on the next refresh without a
+  new connection, and bumps the snapshot version;
+- a refresh with nothing changed keeps the version;
+- every refresh used the one session;
+- after the session drops, the reconnect pushes only two rows: the old
+  table is gone, the two listed pairs change and the rest keep their
+  state;
+- a table older than the refresh interval is not used.
+
+Запуск: python -m app.utils.availability_check
+"""
+from __future__ import annotations
+import asyncio
+import os
+import socket
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+PORT = _free_port()
+# the client backs off before reconnecting; give it a few attempts
+RECONNECT_TIMEOUT = 10.0
+os.environ["PO_USE_WS_FETCHER"] = "1"
+os.environ["PO_USE_BROWSER_WS"] = "0"
+os.environ["PO_ENTRY_URL"] = f"http://127.0.0.1:{PORT}/en/cabinet/demo-quick-high-low/"
+# the client adds /socket.io/?EIO=4 itself; python-socketio rejects the repeated query
+os.environ["PO_WS_URL"] = f"http://127.0.0.1:{PORT}"
+
+import socketio
+from aiohttp import web
+
+from app.data_sources import asset_status
+from app.data_sources.asset_status import AssetTable
+from app.pairs import ALL_PAIRS, OTC_PAIRS, PairAvailability
+
+
+def asset_row(n: int, symbol: str, active: bool) -> list:
+    """Row in PocketOption's layout: [id, symbol, name, type, group, payout, ..., is_active at 14, ...]"""
+    return [n, symbol, symbol, "currency", 1, 92 if active else 0, 60, 30, 3, 0, 0, 0, [], 0, active, [], 0]
+
+
+def asset_table(closed: set, unlisted: set) -> list:
+    rows = [asset_row(0, "#AAPL", True)]
+    for name, info in {**ALL_PAIRS, **OTC_PAIRS}.items():
+        if name in unlisted:
+            continue
+        symbol = info["po"] + ("_otc" if info.get("otc") else "")
+        rows.append(asset_row(len(rows), symbol, name not in closed))
+    return rows
+
+
+async def run() -> bool:
+    # short pings, so the client notices a dropped transport within a couple of seconds
+    sio = socketio.AsyncServer(async_mode="aiohttp", ping_interval=1, ping_timeout=1)
+    app = web.Application()
+    app.router.add_get("/en/cabinet/demo-quick-high-low/", lambda r: web.Response(text="ok"))
+    sio.attach(app)
+    sessions = []
+    closed = {"YER/USD OTC", "EUR/USD"}
+    unlisted = {"LBP/USD OTC"}
+    first_push = []  # rows of the next session's first push; empty — the whole table
+
+    @sio.event
+    async def connect(sid, environ):
+        sessions.append(sid)
+        await sio.emit("updateAssets", first_push or asset_table(closed, unlisted), to=sid)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", PORT).start()
+
+    checker = PairAvailability(check_interval=60, timeout=5)
+    ok = True
+    try:
+        t = time.monotonic()
+        await checker.update_availability()
+        first = time.monotonic() - t
+        snap = checker.snapshot
+        expected = closed | unlisted
+        good = snap.unavailable == expected and snap.version == 1
+        ok &= good and first < 5
+        print(f"first pass: {len(ALL_PAIRS) + len(OTC_PAIRS)} pairs in {first:.2f}s, "
+              f"unavailable {sorted(snap.unavailable)} (v{snap.version}) — {'OK' if good else 'FAILED'}")
+
+        closed.add("GBP/USD")
+        await sio.emit("updateAssets", [asset_row(99, "GBPUSD", False)])
+        await asyncio.sleep(0.2)
+        t = time.monotonic()
+        await checker.update_availability()
+        second = time.monotonic() - t
+        snap = checker.snapshot
+        good = snap.unavailable == closed | unlisted and snap.version == 2
+        ok &= good
+        print(f"after push: refresh in {second * 1000:.1f}ms, GBP/USD unavailable={not snap.is_available('GBP/USD')} "
+              f"(v{snap.version}) — {'OK' if good else 'FAILED'}")
+
+        await checker.update_availability()
+        good = checker.snapshot.version == 2
+        ok &= good
+        print(f"unchanged table: v{checker.snapshot.version} — {'OK' if good else 'FAILED'}")
+
+        good = len(sessions) == 1
+        ok &= good
+        print(f"sessions opened: {len(sessions)} — {'OK' if good else 'FAILED'}")
+
+        # GBP/USD reopens and EUR/USD OTC closes while the session is down
+        closed.discard("GBP/USD")
+        closed.add("EUR/USD OTC")
+        first_push[:] = [asset_row(0, "GBPUSD", True), asset_row(1, "EURUSD_otc", False)]
+        # drop the transport without a close packet, as a network failure would; the client reconnects
+        for eio_socket in list(sio.eio.sockets.values()):
+            await eio_socket.close(wait=False, abort=True)
+        deadline = time.monotonic() + RECONNECT_TIMEOUT
+        while len(sessions) < 2 and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if len(sessions) < 2:
+            ok = False
+            print(f"reconnect: no new session in {RECONNECT_TIMEOUT:.0f}s — FAILED")
+        else:
+            await asyncio.sleep(0.2)
+            await checker.update_availability()
+            snap = checker.snapshot
+            rows = len(asset_status.sources()[0].table.status)
+            good = snap.unavailable == closed | unlisted and rows == 2
+            ok &= good
+            print(f"reconnect, 2-row push: table has {rows} rows, {len(snap.unavailable)} unavailable "
+                  f"{sorted(snap.unavailable)} — {'OK' if good else 'FAILED'}")
+
+        table = AssetTable()
+        table.update(asset_table(set(), set()))
+        table.updated_at -= 120
+        good = await table.wait(time.monotonic() + 0.1, max_age=60) is None
+        ok &= good
+        print(f"table 120s old, refresh every 60s: ignored={good} — {'OK' if good else 'FAILED'}")
+    finally:
+        from app.data_sources.ws_fetcher import shared_fetcher
+        await shared_fetcher().close()
+        await runner.cleanup()
+    print("OK" if ok else "FAILED")
+    return ok
+
+
+def main():
+    sys.exit(0 if asyncio.run(run()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,66 @@
 import time
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, Hashable, Optional, Tuple
 
 class TTLCache:
-    def __init__(self, ttl_seconds: int = 60):
+    """
+    Values fresh for ``ttl_seconds``; expired ones are still kept for
+    ``stale_seconds`` more, for ``get_stale`` (a fallback when fetching
+    anew is not allowed).
+    """
+    def __init__(self, ttl_seconds: int = 60, stale_seconds: int = 0):
         self.ttl = ttl_seconds
+        self.stale = stale_seconds
         self.store: Dict[str, Tuple[float, Any]] = {}
 
     def get(self, key: str):
-        now = time.time()
-        if key in self.store:
-            ts, val = self.store[key]
-            if now - ts < self.ttl:
-                return val
-            else:
-                self.store.pop(key, None)
+        found = self.get_stale(key)
+        if found is not None and found[1] < self.ttl:
+            return found[0]
         return None
 
+    def get_stale(self, key: str) -> Optional[Tuple[Any, float]]:
+        """(value, age in seconds), fresh or stale; None if gone"""
+        entry = self.store.get(key)
+        if entry is None:
+            return None
+        ts, val = entry
+        age = time.time() - ts
+        if age >= self.ttl + self.stale:
+            self.store.pop(key, None)
+            return None
+        return val, age
+
     def set(self, key: str, value: Any):
         self.store[key] = (time.time(), value)
+
+class VersionedCache:
+    """
+    One value per key, tagged with the version of the data it was built from
+    (e.g. the last bar of a candle series).  A lookup with another version
+    misses and drops the stale value, so entries invalidate themselves as
+    soon as the underlying series moves on.
+    """
+    def __init__(self, ttl_seconds: int = 60):
+        self.ttl = ttl_seconds
+        self.store: Dict[Hashable, Tuple[float, Hashable, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, version: Hashable):
+        entry = self.store.get(key)
+        if entry is not None:
+            ts, ver, val = entry
+            if ver == version and time.time() - ts < self.ttl:
+                self.hits += 1
+                return val
+            self.store.pop(key, None)
+        self.misses += 1
+        return None
+
+    def set(self, key: Hashable, version: Hashable, value: Any):
+        self.store[key] = (time.time(), version, value)
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
@@ -0,0 +1,255 @@
+# app/utils/candles.py
+"""
+CandleSeries — компактный контейнер свечей на непрерывных массивах.
+
+Fetchers, validation and analysis pass candles around as one CandleSeries
+instead of DataFrames with varying schemas (``timestamp`` + lowercase from
+the WebSocket, capitalised columns + DatetimeIndex from the generator).
+Columns are float64 (OHLC, volume) and int64 (``ts``, epoch milliseconds
+UTC, or bar numbers when the source has no times).  Slices are views,
+``append`` grows the buffer geometrically, and a pandas DataFrame is only
+built when something asks for ``to_frame()``.
+"""
+from __future__ import annotations
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# rows of the price buffer
+_OPEN, _HIGH, _LOW, _CLOSE, _VOLUME = range(5)
+
+_ALIASES = {
+    "open": _OPEN, "o": _OPEN,
+    "high": _HIGH, "h": _HIGH,
+    "low": _LOW, "l": _LOW,
+    "close": _CLOSE, "c": _CLOSE,
+    "volume": _VOLUME, "v": _VOLUME,
+}
+_TIME_COLUMNS = ("timestamp", "time", "ts", "t", "datetime", "date")
+
+
+class _Buffer:
+    """Storage shared by a series and its views; ``used`` is the filled length"""
+    __slots__ = ("ts", "px", "used")
+
+    def __init__(self, ts: np.ndarray, px: np.ndarray, used: int):
+        self.ts = ts
+        self.px = px
+        self.used = used
+
+
+class CandleSeries:
+    __slots__ = ("_buf", "_lo", "_hi", "has_volume", "_frame")
+
+    def __init__(self, ts, open, high, low, close, volume=None):
+        close = np.asarray(close, dtype=np.float64)
+        n = close.shape[0]
+        px = np.empty((5, n))
+        px[_OPEN] = open
+        px[_HIGH] = high
+        px[_LOW] = low
+        px[_CLOSE] = close
+        px[_VOLUME] = np.nan if volume is None else volume
+        ts = np.arange(n, dtype=np.int64) if ts is None else np.asarray(ts, dtype=np.int64)
+        self._buf = _Buffer(ts, px, n)
+        self._lo = 0
+        self._hi = n
+        self.has_volume = volume is not None
+        self._frame: Optional[pd.DataFrame] = None
+
+    # --- constructors -----------------------------------------------------------
+
+    @classmethod
+    def from_records(cls, rows: Sequence[Sequence[float]], volume: bool = False) -> "CandleSeries":
+        """``[[ts_ms, open, high, low, close(, volume)], ...]`` as sent by PocketOption"""
+        if not len(rows):
+            return cls.empty_series()
+        data = np.asarray(rows, dtype=np.float64)
+        return cls(
+            data[:, 0].astype(np.int64), data[:, 1], data[:, 2], data[:, 3], data[:, 4],
+            data[:, 5] if volume and data.shape[1] > 5 else None,
+        )
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "CandleSeries":
+        """Any of the repo's DataFrame schemas (case-insensitive, timestamp column or DatetimeIndex)"""
+        if isinstance(df, cls):
+            return df
+        if df is None or df.empty:
+            return cls.empty_series()
+        cols = {}
+        ts = None
+        for col in df.columns:
+            key = str(col).lower()
+            if key in _ALIASES and _ALIASES[key] not in cols:
+                cols[_ALIASES[key]] = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+            elif key in _TIME_COLUMNS and ts is None:
+                ts = _to_epoch_ms(df[col])
+        if _CLOSE not in cols:
+            raise KeyError("Close")
+        if ts is None and isinstance(df.index, pd.DatetimeIndex):
+            ts = _to_epoch_ms(df.index)
+        close = cols[_CLOSE]
+        return cls(
+            ts, cols.get(_OPEN, close), cols.get(_HIGH, close), cols.get(_LOW, close), close,
+            cols.get(_VOLUME),
+        )
+
+    @classmethod
+    def empty_series(cls) -> "CandleSeries":
+        return cls(np.empty(0, dtype=np.int64), (), (), (), ())
+
+    # --- columns (views into the buffer) ------------------------------------------
+
+    @property
+    def ts(self) -> np.ndarray:
+        return self._buf.ts[self._lo:self._hi]
+
+    @property
+    def open(self) -> np.ndarray:
+        return self._buf.px[_OPEN, self._lo:self._hi]
+
+    @property
+    def high(self) -> np.ndarray:
+        return self._buf.px[_HIGH, self._lo:self._hi]
+
+    @property
+    def low(self) -> np.ndarray:
+        return self._buf.px[_LOW, self._lo:self._hi]
+
+    @property
+    def close(self) -> np.ndarray:
+        return self._buf.px[_CLOSE, self._lo:self._hi]
+
+    @property
+    def volume(self) -> Optional[np.ndarray]:
+        return self._buf.px[_VOLUME, self._lo:self._hi] if self.has_volume else None
+
+    def column(self, name: str) -> Optional[np.ndarray]:
+        """Column by any of the usual names (``Close``, ``close``, ``c``); None if absent"""
+        key = name.lower()
+        if key in _TIME_COLUMNS:
+            return self.ts
+        row = _ALIASES.get(key)
+        if row is None or (row == _VOLUME and not self.has_volume):
+            return None
+        return self._buf.px[row, self._lo:self._hi]
+
+    # --- sequence protocol ----------------------------------------------------------
+
+    def __len__(self) -> int:
+        return self._hi - self._lo
+
+    @property
+    def empty(self) -> bool:
+        return self._hi == self._lo
+
+    def __getitem__(self, key: slice) -> "CandleSeries":
+        """Slice of bars as a view (no copy)"""
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            raise TypeError("CandleSeries supports contiguous slices only")
+        lo, hi, _ = key.indices(len(self))
+        view = CandleSeries.__new__(CandleSeries)
+        view._buf = self._buf
+        view._lo = self._lo + lo
+        view._hi = self._lo + max(lo, hi)
+        view.has_volume = self.has_volume
+        view._frame = None
+        return view
+
+    def tail(self, n: int) -> "CandleSeries":
+        return self[-n:] if n > 0 else self[len(self):]
+
+    def __repr__(self) -> str:
+        last = f", last close {self.close[-1]}" if len(self) else ""
+        return f"CandleSeries({len(self)} bars{last})"
+
+    # --- growth --------------------------------------------------------------------
+
+    def append(self, ts: int, open: float, high: float, low: float, close: float,
+               volume: float = np.nan):
+        """Add one bar; amortised O(1).  Views taken earlier keep their bars."""
+        buf = self._buf
+        if self._hi != buf.used or buf.used == buf.ts.shape[0]:
+            # another view already wrote past our end, or the buffer is full
+            self._grow(max(8, 2 * len(self)))
+            buf = self._buf
+        i = self._hi
+        buf.ts[i] = ts
+        buf.px[:, i] = (open, high, low, close, volume)
+        buf.used = self._hi = i + 1
+        self._frame = None
+
+    def extend(self, rows: Iterable[Sequence[float]]):
+        for row in rows:
+            self.append(*row)
+
+    def _grow(self, capacity: int):
+        n = len(self)
+        ts = np.empty(max(capacity, n + 1), dtype=np.int64)
+        px = np.empty((5, ts.shape[0]))
+        ts[:n] = self.ts
+        px[:, :n] = self._buf.px[:, self._lo:self._hi]
+        self._buf = _Buffer(ts, px, n)
+        self._lo, self._hi = 0, n
+
+    def copy(self) -> "CandleSeries":
+        """Detached copy with a tight buffer"""
+        return CandleSeries(self.ts.copy(), self.open.copy(), self.high.copy(), self.low.copy(),
+                            self.close.copy(), self.volume.copy() if self.has_volume else None)
+
+    def take(self, index: np.ndarray) -> "CandleSeries":
+        """New series with the bars at ``index`` (fancy indexing, so a copy)"""
+        return CandleSeries(self.ts[index], self.open[index], self.high[index], self.low[index],
+                            self.close[index], self.volume[index] if self.has_volume else None)
+
+    def repair_high_low(self) -> int:
+        """
+        Clamp High up to max(Open, Close) and Low down to min(Open, Close)
+        in place; returns the number of bars touched.
+        """
+        o, h, l, c = self.open, self.high, self.low, self.close
+        top = np.maximum(o, c)
+        bottom = np.minimum(o, c)
+        bad_high = h < top
+        bad_low = l > bottom
+        touched = int(np.count_nonzero(bad_high | bad_low))
+        if touched:
+            np.copyto(h, top, where=bad_high)
+            np.copyto(l, bottom, where=bad_low)
+            self._frame = None
+        return touched
+
+    def mark_dirty(self):
+        """Call after editing the arrays in place so ``to_frame()`` is rebuilt"""
+        self._frame = None
+
+    # --- pandas ---------------------------------------------------------------------
+
+    def to_frame(self) -> pd.DataFrame:
+        """Open/High/Low/Close(/Volume) DataFrame on a UTC DatetimeIndex; built once and cached"""
+        if self._frame is None:
+            data = {"Open": self.open, "High": self.high, "Low": self.low, "Close": self.close}
+            if self.has_volume:
+                data["Volume"] = self.volume
+            index = pd.to_datetime(self.ts, unit="ms", utc=True) if self.has_times else None
+            self._frame = pd.DataFrame(data, index=index, copy=True)
+        return self._frame
+
+    @property
+    def has_times(self) -> bool:
+        """False when ``ts`` only numbers the bars (source had no timestamps)"""
+        ts = self.ts
+        return len(ts) > 0 and ts[0] > 10 ** 11
+
+
+def _to_epoch_ms(values) -> np.ndarray:
+    """Datetime-like (or numeric ms/s) values to int64 epoch milliseconds"""
+    values = pd.Series(values) if not isinstance(values, pd.Series) else values
+    if pd.api.types.is_numeric_dtype(values):
+        ts = values.to_numpy(dtype=np.int64)
+        # seconds -> milliseconds
+        return ts * 1000 if len(ts) and ts.max() < 10 ** 11 else ts
+    dt = pd.to_datetime(values, utc=True)
+    return ((dt - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(milliseconds=1)).to_numpy(dtype=np.int64)
@@ -5,14 +5,17 @@ import pandas as pd
 from typing import Optional
 import logging
 
+from .candles import CandleSeries
+
 logger = logging.getLogger(__name__)
 
 def fix_ohlc_columns(df: pd.DataFrame) -> pd.DataFrame:
     """
     Исправляет названия колонок OHLC данных
     Приводит к стандартному формату: Open, High, Low, Close
+    (CandleSeries уже в нём и возвращается как есть)
     """
-    if df is None or df.empty:
+    if df is None or isinstance(df, CandleSeries) or df.empty:
         return df
     
     # Словарь возможных вариантов названий
@@ -57,6 +60,8 @@ def validate_ohlc_data(df: pd.DataFrame) -> bool:
     """
     if df is None or df.empty:
         return False
+    if isinstance(df, CandleSeries):
+        return _validate_candles(df)
     
     required_columns = ['Open', 'High', 'Low', 'Close']
     
@@ -86,3 +91,10 @@ def validate_ohlc_data(df: pd.DataFrame) -> bool:
         return False
     
     return True
+
+def _validate_candles(candles: CandleSeries) -> bool:
+    """validate_ohlc_data для CandleSeries: исправление High/Low прямо в массивах"""
+    invalid = candles.repair_high_low()
+    if invalid:
+        logger.warning(f"Found {invalid} invalid OHLC rows")
+    return True
@@ -0,0 +1,125 @@
+"""
+Проверка журнала прогнозов (app.analysis.outcomes.ForecastLog) на диске.
+
+Checked in a temporary directory:
+
+1. torn forecast row — ``ts.bin`` got one more value than the other
+   columns (crash mid-flush); after a reload and one new forecast, the
+   columns must stay aligned across another reload;
+2. torn outcome — a half-written ``resolved_*`` row is cut, outcomes
+   already on disk survive;
+3. compaction — old resolved forecasts are dropped, pending ones and the
+   rolling accuracy survive a reload; a crash between the directory
+   renames of the rewrite is finished on load.
+
+Запуск: python -m app.utils.forecast_log_check
+"""
+from __future__ import annotations
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+import numpy as np
+
+from app.analysis.outcomes import PENDING, ForecastLog
+from app.utils.candles import CandleSeries
+
+KEY = ("EURUSD", "1m", False)
+T0 = 1_700_000_000_000
+STEP = 60_000
+
+
+def candles(bars: int, start: int = T0, price: float = 1.08) -> CandleSeries:
+    ts = start + STEP * np.arange(bars, dtype=np.int64)
+    close = price + 0.0001 * np.arange(bars)
+    return CandleSeries(ts, close, close, close, close)
+
+
+def report(name: str, good: bool, detail: str) -> bool:
+    print(f"{name}: {detail} — {'OK' if good else 'FAILED'}")
+    return good
+
+
+def torn_forecast(path: str) -> bool:
+    log = ForecastLog(path)
+    for i in range(3):
+        log.record(KEY, "ind", "BUY", candles(10 + i), ts=1000 + i)
+    log.flush()
+    with open(os.path.join(path, "ts.bin"), "ab") as fh:
+        np.array([999999], dtype=np.int64).tofile(fh)
+    log = ForecastLog(path)
+    log.record(KEY, "ind", "SELL", candles(20), ts=1003)
+    log.flush()
+    log = ForecastLog(path)
+    ts, direction = log.forecasts["ts"].tolist(), log.forecasts["direction"].tolist()
+    good = ts == [1000, 1001, 1002, 1003] and direction == [1, 1, 1, -1]
+    return report("torn forecast row", good, f"ts {ts}, direction {direction}")
+
+
+def torn_outcome(path: str) -> bool:
+    log = ForecastLog(path)
+    log.record(KEY, "ind", "BUY", candles(10), ts=T0)
+    log.observe(KEY, candles(14))
+    log.evaluate(now_ms=T0 + 20 * STEP)
+    log.flush()
+    with open(os.path.join(path, "resolved_index.bin"), "ab") as fh:
+        fh.write(b"\x01\x02\x03")
+    log = ForecastLog(path)
+    log.record(KEY, "ind", "SELL", candles(12), ts=T0 + STEP)
+    log.observe(KEY, candles(16))
+    log.evaluate(now_ms=T0 + 20 * STEP)
+    log.flush()
+    log = ForecastLog(path)
+    outcomes = log.outcome[:len(log)].tolist()
+    good = len(log) == 2 and PENDING not in outcomes
+    return report("torn outcome row", good, f"{len(log)} forecasts, outcomes {outcomes}")
+
+
+def compaction(path: str) -> bool:
+    now = T0 + 10 * 24 * 3600 * 1000
+    log = ForecastLog(path, window=3600)
+    old = 3000
+    for i in range(old):
+        log.record(KEY, "ind", "BUY", candles(10), ts=T0 + i)
+    log.observe(KEY, candles(14))
+    log.evaluate(now_ms=T0 + 20 * STEP)
+    recent = candles(10, start=now - 30 * STEP)
+    for i in range(5):
+        log.record(KEY, "ind", "BUY", recent, ts=now - 20 * STEP + i)
+    log.observe(KEY, candles(14, start=now - 30 * STEP))
+    log.evaluate(now_ms=now - 10 * STEP)
+    log.record(KEY, "ta", "SELL", candles(30, start=now - 30 * STEP), ts=now)
+    log.flush()
+    before = log.accuracy("ind", KEY)
+    dropped = log.compact(now_ms=now)
+    log = ForecastLog(path, window=3600)
+    log._refresh(now)
+    good = dropped == old and len(log) == 6 and log.pending == 1 and log.accuracy("ind", KEY) == before
+    ok = report("compaction", good, f"dropped {dropped}, {len(log)} left, {log.pending} pending, "
+                                    f"accuracy {log.accuracy('ind', KEY)} (was {before})")
+
+    # crash after the old directory was moved away, before the new one was moved in
+    shutil.copytree(path, path + ".compact")
+    os.rename(path, path + ".old")
+    log = ForecastLog(path, window=3600)
+    good = len(log) == 6 and not os.path.exists(path + ".old") and not os.path.exists(path + ".compact")
+    return report("interrupted rewrite", good, f"{len(log)} forecasts after recovery") and ok
+
+
+def main():
+    root = tempfile.mkdtemp(prefix="forecast_log_check_")
+    try:
+        ok = torn_forecast(os.path.join(root, "a"))
+        ok &= torn_outcome(os.path.join(root, "b"))
+        ok &= compaction(os.path.join(root, "c"))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Паритет и бенчмарк индикаторных ядер (app/analysis/kernels.py) против ta
+(и pandas ewm для EMA с adjust=True, которую считает FastPredictionEngine)
+Запуск: python -m app.utils.indicator_bench [pairs] [bars]
+"""
+
+import sys
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import ta
+
+# Добавляем путь к корню проекта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from app.analysis import kernels
+from app.analysis.indicators import compute_indicators, compute_indicators_batch
+
+
+def random_walk(pairs: int, bars: int, seed: int = 7) -> np.ndarray:
+    """Synthetic (pairs x bars) close matrix"""
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(0.0, 8e-4, size=(pairs, bars))
+    return 1.08 * np.exp(np.cumsum(steps, axis=1))
+
+
+def same_dict(a: dict, b: dict) -> bool:
+    """Dict equality that treats NaN == NaN (short series leave NaNs)"""
+    return a.keys() == b.keys() and all(a[k] == b[k] or (a[k] != a[k] and b[k] != b[k]) for k in a)
+
+
+def best_of(func, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def ta_indicators(df: pd.DataFrame) -> dict:
+    """The original ta-based compute_indicators, kept as the reference"""
+    close = df['Close']
+    ema_fast = ta.trend.EMAIndicator(close=close, window=9).ema_indicator()
+    ema_slow = ta.trend.EMAIndicator(close=close, window=21).ema_indicator()
+    macd = ta.trend.MACD(close=close, window_fast=12, window_slow=26, window_sign=9)
+    bb = ta.volatility.BollingerBands(close=close, window=20, window_dev=2)
+    return {
+        "RSI": round(float(ta.momentum.RSIIndicator(close=close, window=14).rsi().iloc[-1]), 2),
+        "EMA_fast": round(float(ema_fast.iloc[-1]), 6),
+        "EMA_slow": round(float(ema_slow.iloc[-1]), 6),
+        "EMA_cross_up": bool(ema_fast.iloc[-2] < ema_slow.iloc[-2] and ema_fast.iloc[-1] > ema_slow.iloc[-1]),
+        "EMA_cross_down": bool(ema_fast.iloc[-2] > ema_slow.iloc[-2] and ema_fast.iloc[-1] < ema_slow.iloc[-1]),
+        "MACD": round(float(macd.macd().iloc[-1]), 6),
+        "MACD_signal": round(float(macd.macd_signal().iloc[-1]), 6),
+        "MACD_hist": round(float(macd.macd_diff().iloc[-1]), 6),
+        "BB_upper": round(float(bb.bollinger_hband().iloc[-1]), 6),
+        "BB_middle": round(float(bb.bollinger_mavg().iloc[-1]), 6),
+        "BB_lower": round(float(bb.bollinger_lband().iloc[-1]), 6),
+    }
+
+
+def rsi_sma_reference(s: pd.Series) -> pd.Series:
+    """FastPredictionEngine's original pandas RSI, over the whole series"""
+    deltas = s.diff()
+    gain = deltas.where(deltas > 0, 0).rolling(14).mean()
+    loss = -deltas.where(deltas < 0, 0).rolling(14).mean()
+    rs = (gain / loss).where(loss != 0, 100)
+    return 100 - (100 / (1 + rs))
+
+
+# name -> (kernel on ndarray, ta (or pandas) on Series, exact match expected)
+KERNELS = {
+    "ema": (
+        lambda c: kernels.ema(c, 9),
+        lambda s: ta.trend.EMAIndicator(s, 9).ema_indicator(),
+        True,
+    ),
+    "ema_adjusted": (
+        lambda c: kernels.ema_adjusted(c, 9),
+        lambda s: s.ewm(span=9).mean(),
+        True,
+    ),
+    "rsi": (
+        lambda c: kernels.rsi(c, 14),
+        lambda s: ta.momentum.RSIIndicator(s, 14).rsi(),
+        True,
+    ),
+    "rsi_sma": (
+        lambda c: kernels.rsi_sma(c, 14),
+        rsi_sma_reference,
+        False,
+    ),
+    "macd_signal": (
+        lambda c: kernels.macd(c, 12, 26, 9)[1],
+        lambda s: ta.trend.MACD(s, 26, 12, 9).macd_signal(),
+        True,
+    ),
+    "bb_upper": (
+        lambda c: kernels.bollinger(c, 20, 2)[0],
+        lambda s: ta.volatility.BollingerBands(s, 20, 2).bollinger_hband(),
+        False,
+    ),
+    "sma": (
+        lambda c: kernels.sma(c, 20),
+        lambda s: ta.trend.SMAIndicator(s, 20).sma_indicator(),
+        False,
+    ),
+}
+
+
+def check_parity(samples: int = 50) -> bool:
+    """Every kernel against its reference on random walks of varied length, plus NaN padding"""
+    rng = np.random.default_rng(11)
+    series = [random_walk(1, int(n), seed=i)[0] for i, n in enumerate(rng.integers(2, 400, samples))]
+    padded = kernels.stack_series(series)
+
+    print("=" * 60)
+    print(f"🔍 PARITY vs ta / pandas ({samples} series)")
+    print("=" * 60)
+    ok = True
+    for name, (kernel, reference, exact) in KERNELS.items():
+        worst = 0.0
+        failed = 0
+        batch = kernel(padded)
+        for row, c in zip(batch, series):
+            expected = reference(pd.Series(c)).to_numpy(dtype=float)
+            for got in (kernel(c), row[len(row) - len(c):]):
+                if exact:
+                    failed += not np.array_equal(got, expected, equal_nan=True)
+                else:
+                    failed += not np.allclose(got, expected, rtol=1e-12, atol=0, equal_nan=True)
+                with np.errstate(invalid="ignore"):
+                    worst = max(worst, float(np.nanmax(np.abs(got - expected), initial=0.0)))
+        status = "✅" if not failed else "❌"
+        print(f"   {status} {name:<13} {'exact' if exact else 'rtol 1e-12':<10} max |diff| {worst:.1e}")
+        ok &= not failed
+
+    # no bars at all (a pair with no history yet): same shape back, no error
+    broken = []
+    for name, (kernel, _, _) in KERNELS.items():
+        for empty in (np.empty(0), np.empty((3, 0))):
+            try:
+                if kernel(empty).shape != empty.shape:
+                    broken.append(name)
+            except Exception:
+                broken.append(name)
+    print(f"   {'✅' if not broken else '❌'} empty input (0 bars): {', '.join(broken) or 'all kernels ok'}")
+    ok &= not broken
+
+    mismatched = 0
+    for c in series:
+        if len(c) >= 2:
+            df = pd.DataFrame({"Close": c})
+            mismatched += not same_dict(compute_indicators(df), ta_indicators(df))
+    print(f"   {'✅' if not mismatched else '❌'} compute_indicators vs ta dict: {mismatched} mismatches")
+    return ok and not mismatched
+
+
+def bench_kernels(pairs: int = 70, bars: int = 100):
+    """Per-kernel timings: ta on one series, kernel on one series, kernel on all pairs"""
+    close = random_walk(pairs, bars)
+    one = close[0]
+    one_s = pd.Series(one)
+
+    print("=" * 60)
+    print(f"⏱ KERNELS: 1 x {bars} and {pairs} x {bars}")
+    print("=" * 60)
+    print(f"   {'kernel':<13} {'ta 1x':>10} {'np 1x':>10} {'np batch':>10} {'per pair':>10}")
+    for name, (kernel, reference, _) in KERNELS.items():
+        ta_t = best_of(lambda: reference(one_s))
+        np_t = best_of(lambda: kernel(one))
+        batch_t = best_of(lambda: kernel(close))
+        print(
+            f"   {name:<13} {ta_t * 1e6:8.0f}µs {np_t * 1e6:8.0f}µs "
+            f"{batch_t * 1e6:8.0f}µs {batch_t / pairs * 1e6:8.1f}µs"
+        )
+
+
+def bench_batch(pairs: int = 70, bars: int = 100) -> bool:
+    close = random_walk(pairs, bars)
+    frames = [pd.DataFrame({"Open": c, "High": c, "Low": c, "Close": c}) for c in close]
+
+    loop_results = [compute_indicators(df) for df in frames]
+    batch_results = compute_indicators_batch(close)
+    mismatches = sum(not same_dict(a, b) for a, b in zip(loop_results, batch_results))
+
+    ta_t = best_of(lambda: [ta_indicators(df) for df in frames])
+    loop_t = best_of(lambda: [compute_indicators(df) for df in frames])
+    batch_t = best_of(lambda: compute_indicators_batch(close))
+
+    print("=" * 60)
+    print(f"📊 BATCH INDICATORS: {pairs} pairs x {bars} bars")
+    print("=" * 60)
+    print(f"   loop over ta indicators:      {ta_t * 1000:8.2f} ms")
+    print(f"   loop over compute_indicators: {loop_t * 1000:8.2f} ms")
+    print(f"   compute_indicators_batch:     {batch_t * 1000:8.2f} ms")
+    print(f"   speed-up vs loop: {loop_t / batch_t:.1f}x, vs ta: {ta_t / batch_t:.1f}x, "
+          f"mismatched rows: {mismatches}")
+    return mismatches == 0
+
+
+def backends():
+    """NumPy always, numba when it is installed"""
+    names = ["numpy"]
+    if kernels.use_backend("numba") == "numba":
+        names.append("numba")
+    return names
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    ok = True
+    for name in backends():
+        kernels.use_backend(name)
+        print(f"\n##### backend: {name}"
+              + (f" (compile/load {kernels.compile_seconds:.2f}s)" if name == "numba" else ""))
+        ok &= check_parity()
+        bench_kernels(*args)
+        ok &= bench_batch(*args)
+    sys.exit(0 if ok else 1)
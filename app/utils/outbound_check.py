@@ -0,0 +1,143 @@
+"""
+Проверка OutboundGovernor (app.outbound) против имитации лимитов Telegram.
+
+The fake Bot API answers after ``--latency`` and raises
+``TelegramRetryAfter`` the way Telegram does when a bot sends more than
+~30 messages/s overall or bursts into one chat.  ``--users`` users run
+the forecast flow at once: answer the callback, edit the message to
+"⏳ Analyzing...", then, after a short analysis, edit it to the forecast.
+
+Both runs are compared:
+
+- ``direct`` — every call goes straight out, a 429 is slept off and
+  retried inside the handler (what aiogram code usually does);
+- ``governor`` — the same calls through the governor, posted without
+  waiting.
+
+Reported: API requests, 429s, edits collapsed, time until each user sees
+the forecast, and how long handlers were held up by Telegram.
+
+Запуск: python -m app.utils.outbound_check [--users 300]
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import math
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import AnswerCallbackQuery, EditMessageText, TelegramMethod
+
+from app import outbound
+from app.outbound import OutboundGovernor, TokenBucket
+
+
+class FakeTelegram:
+    """Counts calls; 429 past 30 msg/s overall or a burst of 5 into one chat"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+        self.floods = 0
+        self.shown: Dict[int, float] = {}  # chat -> when the forecast text arrived
+        self._global = TokenBucket(30.0, 30.0)
+        self._chats: Dict[Any, TokenBucket] = {}
+
+    async def __call__(self, bot: Any, method: TelegramMethod) -> Any:
+        await asyncio.sleep(self.latency)
+        self.calls += 1
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is not None:
+            now = time.monotonic()
+            chat = self._chats.setdefault(chat_id, TokenBucket(1.0, 5.0, now))
+            wait = max(chat.reserve(now), self._global.reserve(now))
+            if wait:
+                # Telegram does not spend the quota on a rejected call
+                chat.tokens += 1
+                self._global.tokens += 1
+                self.floods += 1
+                raise TelegramRetryAfter(method=method, message="Flood control exceeded", retry_after=math.ceil(wait))
+            if isinstance(method, EditMessageText) and method.text.startswith("🎯"):
+                self.shown[chat_id] = now
+        return True
+
+
+async def _direct(api: FakeTelegram, method: TelegramMethod) -> Any:
+    while True:
+        try:
+            return await api(None, method)
+        except TelegramRetryAfter as e:
+            await asyncio.sleep(e.retry_after)
+
+
+async def run_mode(mode: str, users: int, latency: float, seed: int = 0) -> Dict[str, float]:
+    api = FakeTelegram(latency)
+    governor = OutboundGovernor()
+    rng = random.Random(seed)
+    held: List[float] = []
+    started = time.monotonic()
+
+    async def call(method: TelegramMethod):
+        if mode == "direct":
+            await _direct(api, method)
+        else:
+            outbound.post(governor(api, None, method))
+
+    async def user(uid: int):
+        await asyncio.sleep(rng.random() * 0.5)
+        t = time.monotonic()
+        await call(AnswerCallbackQuery(callback_query_id=str(uid), text="⏳ Analyzing..."))
+        await call(EditMessageText(chat_id=uid, message_id=1, text="⏳ Analyzing PocketOption data..."))
+        handler = time.monotonic() - t
+        await asyncio.sleep(rng.random() * 0.3)  # analysis
+        t = time.monotonic()
+        await call(EditMessageText(chat_id=uid, message_id=1, text=f"🎯 FORECAST #{uid}"))
+        held.append(handler + time.monotonic() - t)
+
+    await asyncio.gather(*(user(uid) for uid in range(users)))
+    while outbound.pending():
+        await asyncio.sleep(0.01)
+    delays = sorted(api.shown[uid] - started for uid in range(users) if uid in api.shown)
+    return {
+        "requests": api.calls,
+        "floods": api.floods,
+        "shown": len(delays),
+        "p50": delays[len(delays) // 2] if delays else float("nan"),
+        "p95": delays[int(len(delays) * 0.95) - 1] if delays else float("nan"),
+        "held": max(held),
+        "coalesced": outbound.OUTBOUND_REQUESTS.labels(method="EditMessageText", status="coalesced")._value.get(),
+    }
+
+
+async def run(users: int, latency: float) -> bool:
+    results = {}
+    for mode in ("direct", "governor"):
+        before = outbound.OUTBOUND_REQUESTS.labels(method="EditMessageText", status="coalesced")._value.get()
+        r = await run_mode(mode, users, latency)
+        r["coalesced"] -= before
+        results[mode] = r
+        print(f"{mode:>8}: {r['requests']} requests, {r['floods']} x 429, {int(r['coalesced'])} edits collapsed, "
+              f"forecast shown to {r['shown']}/{users} (p50 {r['p50']:.2f}s, p95 {r['p95']:.2f}s), "
+              f"handlers held up to {r['held']:.2f}s")
+    gov = results["governor"]
+    ok = gov["shown"] == users and gov["floods"] == 0 and gov["held"] < 0.05
+    print("OK" if ok else "FAILED")
+    return ok
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="Compare direct Telegram calls with the outbound governor")
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.03)
+    args = parser.parse_args(argv)
+    sys.exit(0 if asyncio.run(run(args.users, args.latency)) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -68,8 +68,8 @@ async def test_pocketoption_connection():
 
             if df is not None and len(df) > 0:
                 print(f"   ✅ Успешно! Получено {len(df)} баров за {elapsed:.1f} сек")
-                print(f"      Последняя цена: {df['close'].iloc[-1]:.5f}")
-                print(f"      Время последнего бара: {df.index[-1]}")
+                print(f"      Последняя цена: {df.close[-1]:.5f}")
+                print(f"      Время последнего бара: {df.to_frame().index[-1]}")
                 results.append(True)
             else:
                 print(f"   ⚠️ Получен пустой DataFrame")
@@ -192,9 +192,9 @@ async def test_real_fetch():  # NEW
 
     cf = CompositeFetcher()  # NEW
     try:  # NEW
-        df = await cf.fetch("EURUSD", "1m", False)  # NEW
+        df, source = await cf.fetch("EURUSD", "1m", False)  # NEW
         if df is not None:  # NEW
-            print(f"Bars: {len(df)}, Columns: {df.columns.tolist()}")  # NEW
+            print(f"Bars: {len(df)}, Source: {source}, Volume: {df.has_volume}")  # NEW
         else:  # NEW
             print("CompositeFetcher returned None or empty DataFrame")  # NEW
     except Exception as e:  # NEW
@@ -0,0 +1,160 @@
+"""
+Локальная замена Redis для проверок и разработки.
+
+An in-process asyncio server that speaks enough of the Redis protocol for
+``app.storage.RedisStorage``: PING, AUTH, SELECT, GET, MGET, SET (EX/PX),
+DEL, EXISTS, TTL, DBSIZE, FLUSHDB.  Keys expire lazily on access.
+Not a database — nothing is written to disk.
+
+Запуск: python -m app.utils.resp_server [--port 6379]
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.storage import RespError, _read_reply
+
+
+def _reply(value: Any) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, RespError):
+        return b"-%s\r\n" % str(value).encode()
+    if isinstance(value, bool):
+        return b"+OK\r\n" if value else b"$-1\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, str):
+        return b"+%s\r\n" % value.encode()
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    return b"*%d\r\n" % len(value) + b"".join(_reply(v) for v in value)
+
+
+class LocalRedis:
+    """Key-value server on 127.0.0.1; ``port=0`` picks a free port"""
+
+    def __init__(self, password: Optional[str] = None):
+        self.password = password
+        self.dbs: Dict[int, Dict[bytes, Tuple[bytes, Optional[float]]]] = {}
+        self.commands = 0
+        self.round_trips = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._sessions: set = set()
+        self.port = 0
+
+    async def start(self, port: int = 0) -> int:
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            for task in list(self._sessions):
+                task.cancel()
+            await asyncio.gather(*self._sessions, return_exceptions=True)
+            await self._server.wait_closed()
+
+    @property
+    def url(self) -> str:
+        auth = f":{self.password}@" if self.password else ""
+        return f"redis://{auth}127.0.0.1:{self.port}/0"
+
+    def _get(self, db: dict, key: bytes) -> Optional[bytes]:
+        item = db.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires is not None and expires <= time.monotonic():
+            del db[key]
+            return None
+        return value
+
+    def _run(self, session: dict, args: List[bytes]) -> Any:
+        name = args[0].decode().upper()
+        if name == "AUTH":
+            session["authed"] = args[-1].decode() == self.password
+            return True if session["authed"] else RespError("WRONGPASS invalid password")
+        if not session["authed"]:
+            return RespError("NOAUTH Authentication required.")
+        db = self.dbs.setdefault(session["db"], {})
+        if name == "PING":
+            return "PONG"
+        if name == "SELECT":
+            session["db"] = int(args[1])
+            return True
+        if name == "GET":
+            return self._get(db, args[1])
+        if name == "MGET":
+            return [self._get(db, k) for k in args[1:]]
+        if name == "SET":
+            expires = None
+            opts = [a.decode().upper() for a in args[3::2]]
+            for opt, val in zip(opts, args[4::2]):
+                if opt == "EX":
+                    expires = time.monotonic() + int(val)
+                elif opt == "PX":
+                    expires = time.monotonic() + int(val) / 1000
+            db[args[1]] = (args[2], expires)
+            return True
+        if name == "DEL":
+            removed = [k for k in args[1:] if self._get(db, k) is not None]
+            for k in removed:
+                del db[k]
+            return len(removed)
+        if name == "EXISTS":
+            return sum(1 for k in args[1:] if self._get(db, k) is not None)
+        if name == "TTL":
+            if self._get(db, args[1]) is None:
+                return -2
+            expires = db[args[1]][1]
+            return -1 if expires is None else max(0, round(expires - time.monotonic()))
+        if name == "DBSIZE":
+            return sum(1 for k in list(db) if self._get(db, k) is not None)
+        if name == "FLUSHDB":
+            db.clear()
+            return True
+        return RespError(f"ERR unknown command '{name}'")
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = {"db": 0, "authed": self.password is None}
+        task = asyncio.current_task()
+        self._sessions.add(task)
+        try:
+            while True:
+                command = await _read_reply(reader)
+                out = [self._run(session, command)]
+                # everything already buffered is one pipeline from the client
+                while reader._buffer:
+                    out.append(self._run(session, await _read_reply(reader)))
+                self.commands += len(out)
+                self.round_trips += 1
+                writer.write(b"".join(_reply(v) for v in out))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._sessions.discard(task)
+            writer.close()
+
+
+async def _serve_forever(port: int, password: Optional[str]):
+    server = LocalRedis(password)
+    await server.start(port)
+    print(f"Listening on {server.url}")
+    await asyncio.Event().wait()
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="In-memory Redis-protocol server for local runs")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--password", default=None)
+    args = parser.parse_args(argv)
+    asyncio.run(_serve_forever(args.port, args.password))
+
+
+if __name__ == "__main__":
+    main()
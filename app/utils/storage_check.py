@@ -0,0 +1,210 @@
+"""
+Проверка FSM-хранилищ (app.storage) на временном SQLite-файле и на
+локальной замене Redis (app.utils.resp_server).
+
+For each backend:
+
+1. the bot's menu walk (/start -> mode -> category -> pair -> timeframe)
+   runs as five updates, each in ``storage.batch()`` the way the
+   dispatcher runs it; every update must cost one read and at most one
+   write;
+2. a new storage instance on the same URL (a restart) must see the state;
+3. a second process must read the conversation and move it on;
+4. two taps of one user at once, through ``BatchedEventIsolation``: the
+   second must see the state the first one wrote;
+5. with a 1 s TTL the record must be gone after expiry;
+6. throughput of concurrent updates, batched and unbatched.
+
+Запуск: python -m app.utils.storage_check [--users 500]
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+
+from app.states import ForecastStates
+from app.storage import BatchedEventIsolation, PipelinedStorage, create_storage
+from app.utils.resp_server import LocalRedis
+
+BOT_ID = 123456
+
+
+def _key(uid: int) -> StorageKey:
+    return StorageKey(bot_id=BOT_ID, chat_id=uid, user_id=uid)
+
+
+def count_round_trips(storage: PipelinedStorage) -> Dict[str, int]:
+    """Wrap the backend calls of ``storage`` with counters"""
+    counts = {"read": 0, "write": 0}
+    for name in ("read", "write", "merge"):
+        original = getattr(storage, name)
+
+        async def counted(*args, _original=original, _name=name):
+            counts["write" if _name == "merge" else _name] += 1
+            if _name == "merge":
+                counts["read"] += 1
+            return await _original(*args)
+        setattr(storage, name, counted)
+    return counts
+
+
+async def _update(storage: PipelinedStorage, uid: int, step: int, batched: bool = True):
+    """One update as main.py handles it; the FSM middleware reads the state first"""
+    state = FSMContext(storage, _key(uid))
+
+    async def handle():
+        await state.get_state()
+        if step == 0:
+            await state.clear()
+            await state.update_data(lang="en")
+            await state.set_state(ForecastStates.Mode)
+        elif step == 1:
+            await state.update_data(mode="ind")
+            await state.set_state(ForecastStates.Category)
+        elif step == 2:
+            await state.update_data(category="otc")
+            await state.set_state(ForecastStates.Pair)
+        elif step == 3:
+            await state.update_data(pair="EUR/USD OTC")
+            await state.set_state(ForecastStates.Timeframe)
+        else:
+            data = await state.get_data()
+            assert data == {"lang": "en", "mode": "ind", "category": "otc", "pair": "EUR/USD OTC"}, data
+            await state.clear()
+
+    if batched:
+        async with storage.batch():
+            await handle()
+    else:
+        await handle()
+
+
+async def _walk(storage: PipelinedStorage, uid: int, steps=range(5), batched: bool = True):
+    for step in steps:
+        await _update(storage, uid, step, batched)
+
+
+async def double_tap(storage: PipelinedStorage, uid: int) -> str:
+    """Two updates of ``uid`` at once, each moving the menu one step on from what it reads"""
+    isolation = BatchedEventIsolation(storage)
+    steps = [ForecastStates.Mode.state, ForecastStates.Category.state, ForecastStates.Pair.state]
+    state = FSMContext(storage, _key(uid))
+    await state.set_state(steps[0])
+
+    async def tap():
+        async with isolation.lock(_key(uid)):
+            current = await state.get_state()
+            await asyncio.sleep(0.05)
+            await state.set_state(steps[steps.index(current) + 1])
+
+    await asyncio.gather(tap(), tap())
+    return await state.get_state()
+
+
+async def worker(url: str, uid: int):
+    """Second process: continue the conversation of ``uid`` by one step"""
+    storage = create_storage(url)
+    state = FSMContext(storage, _key(uid))
+    current = await state.get_state()
+    data = await state.get_data()
+    async with storage.batch():
+        await _update(storage, uid, 3)
+    await storage.close()
+    print(f"{current}|{data.get('category')}")
+
+
+async def check(name: str, url: str, users: int) -> bool:
+    ok = True
+    storage = create_storage(url, ttl=3600)
+    counts = count_round_trips(storage)
+    await _walk(storage, 1)
+    per_update = (counts["read"] / 5, counts["write"] / 5)
+    print(f"[{name}] menu walk: {per_update[0]:.1f} reads, {per_update[1]:.1f} writes per update")
+    ok &= per_update[0] <= 1 and per_update[1] <= 1
+
+    # restart: the half-finished conversation of user 2 must survive
+    await _walk(storage, 2, range(3))
+    await storage.close()
+    storage = create_storage(url, ttl=3600)
+    state = FSMContext(storage, _key(2))
+    restored = (await state.get_state(), (await state.get_data()).get("mode"))
+    print(f"[{name}] after restart: state={restored[0]} mode={restored[1]}")
+    ok &= restored == (ForecastStates.Pair.state, "ind")
+
+    # another process picks the conversation up
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "app.utils.storage_check", "--worker", url, "2",
+        stdout=asyncio.subprocess.PIPE, cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    )
+    out, _ = await proc.communicate()
+    seen = out.decode().strip().splitlines()[-1] if out else ""
+    after = await state.get_state()
+    print(f"[{name}] second process saw {seen!r}, moved it to {after}")
+    ok &= seen == f"{ForecastStates.Pair.state}|otc" and after == ForecastStates.Timeframe.state
+    await _update(storage, 2, 4)
+
+    final = await double_tap(storage, 4)
+    print(f"[{name}] two taps at once: {final}")
+    ok &= final == ForecastStates.Pair.state
+    await storage.close()
+
+    # TTL
+    storage = create_storage(url, ttl=1)
+    await _walk(storage, 3, range(2))
+    state = FSMContext(storage, _key(3))
+    before = await state.get_state()
+    await asyncio.sleep(1.2)
+    expired = (await state.get_state(), await state.get_data())
+    print(f"[{name}] ttl 1s: {before} -> {expired}")
+    ok &= before == ForecastStates.Category.state and expired == (None, {})
+    await storage.close()
+
+    # throughput
+    storage = create_storage(url, ttl=3600)
+    for batched in (False, True):
+        started = time.perf_counter()
+        await asyncio.gather(*(_walk(storage, 10_000 + i, batched=batched) for i in range(users)))
+        elapsed = time.perf_counter() - started
+        print(f"[{name}] {users} users x 5 updates {'batched' if batched else 'unbatched'}: "
+              f"{users * 5 / elapsed:.0f} updates/s")
+    await storage.close()
+    return ok
+
+
+async def run(users: int) -> bool:
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        ok &= await check("sqlite", f"sqlite:///{os.path.join(tmp, 'fsm.sqlite3')}", users)
+    server = LocalRedis(password="check")
+    await server.start()
+    try:
+        ok &= await check("redis", server.url, users)
+        print(f"[redis] server: {server.commands} commands in {server.round_trips} round trips")
+    finally:
+        await server.stop()
+    print("OK" if ok else "FAILED")
+    return ok
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="Check the shared FSM storages")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--worker", nargs=2, metavar=("URL", "USER"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.worker:
+        asyncio.run(worker(args.worker[0], int(args.worker[1])))
+        return
+    sys.exit(0 if asyncio.run(run(args.users)) else 1)
+
+
+if __name__ == "__main__":
+    main()
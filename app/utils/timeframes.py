@@ -0,0 +1,19 @@
+# app/utils/timeframes.py
+"""Timeframe labels used across the bot and their length"""
+
+TIMEFRAME_SECONDS = {
+    "30s": 30,
+    "1m": 60,
+    "2m": 120,
+    "3m": 180,
+    "5m": 300,
+    "10m": 600,
+    "15m": 900,
+    "30m": 1800,
+    "1h": 3600,
+}
+
+
+def tf_seconds(timeframe: str) -> int:
+    """Length of a bar in seconds (1m for unknown labels)"""
+    return TIMEFRAME_SECONDS.get(timeframe, 60)
@@ -0,0 +1,226 @@
+"""
+Проверка webhook-режима против локального «фейкового» Telegram.
+
+A small aiohttp server plays the Bot API: it answers every method the bot
+calls (sendMessage, editMessageText, setWebhook ...) and records it.  The
+bot's session is pointed at it, the real HTTP app (``/metrics`` + webhook
+route) is started on a free port, and updates are POSTed to it the way
+Telegram does:
+
+1. a request with a wrong secret token must get 401;
+2. one user walks the whole menu (/start -> mode -> category -> pair ->
+   timeframe) and must receive a forecast;
+3. another user gets one with ``/f EURUSD 1m otc`` — one update, two API
+   calls;
+4. ``/scan otc 1m`` must answer with a ranking of the OTC pairs;
+5. ``--users`` users send /start at once; the peak number of updates inside
+   the dispatcher must stay within ``WEBHOOK_CONCURRENCY``.
+
+Запуск: PO_USE_WS_FETCHER=0 PO_FETCH_ORDER=po python -m app.utils.webhook_check [--users 200]
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+os.environ.setdefault("TELEGRAM_TOKEN", "123456:fake-token")
+# conversations go to a throwaway file, not to fsm.sqlite3 in the working directory
+FSM_DIR = tempfile.mkdtemp(prefix="webhook_check_")
+os.environ.setdefault("FSM_STORAGE", f"sqlite:///{os.path.join(FSM_DIR, 'fsm.sqlite3')}")
+
+from aiohttp import ClientSession, web
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from app import main as bot_main
+from app import outbound, webhook
+from app.pairs import pair_registry
+
+SECRET = "check-secret"
+
+
+class FakeTelegram:
+    """Bot API stand-in: records calls, returns plausible results"""
+
+    def __init__(self):
+        self.calls: List[Tuple[str, Dict[str, Any]]] = []
+        self._ids = itertools.count(1)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        data = dict(await request.post()) if request.can_read_body else {}
+        self.calls.append((method, data))
+        if method in ("sendMessage", "editMessageText"):
+            result: Any = {
+                "message_id": int(data.get("message_id") or next(self._ids)),
+                "date": int(time.time()),
+                "chat": {"id": int(data.get("chat_id", 1)), "type": "private"},
+                "text": data.get("text", ""),
+            }
+        elif method == "getMe":
+            result = {"id": 123456, "is_bot": True, "first_name": "Forecast", "username": "forecast_bot"}
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    def texts(self, method: str, chat_id: int) -> List[str]:
+        return [d.get("text", "") for m, d in self.calls if m == method and str(d.get("chat_id")) == str(chat_id)]
+
+
+def _user(uid: int) -> dict:
+    return {"id": uid, "is_bot": False, "first_name": f"user{uid}"}
+
+
+def message_update(update_id: int, uid: int, text: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": int(time.time()),
+            "chat": {"id": uid, "type": "private"}, "from": _user(uid), "text": text,
+            **({"entities": [{"type": "bot_command", "offset": 0, "length": len(text)}]} if text.startswith("/") else {}),
+        },
+    }
+
+
+def callback_update(update_id: int, uid: int, data: str) -> dict:
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id), "from": _user(uid), "chat_instance": str(uid), "data": data,
+            "message": {
+                "message_id": 1, "date": int(time.time()),
+                "chat": {"id": uid, "type": "private"}, "from": _user(123456), "text": "menu",
+            },
+        },
+    }
+
+
+async def _start_server(app: web.Application) -> Tuple[web.AppRunner, int]:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, site._server.sockets[0].getsockname()[1]
+
+
+async def _settle(timeout: float = 30.0):
+    """Wait until no webhook update or forecast job is queued or running"""
+    deadline = time.monotonic() + timeout
+    queues = (bot_main.forecast_jobs, bot_main.scan_jobs)
+    while time.monotonic() < deadline:
+        if not (webhook.WEBHOOK_IN_FLIGHT._value.get() or webhook.WEBHOOK_WAITING._value.get()
+                or any(q.depth or q.running for q in queues) or outbound.pending()):
+            return
+        await asyncio.sleep(0.05)
+    raise TimeoutError("webhook updates still running")
+
+
+async def run(users: int) -> bool:
+    fake = FakeTelegram()
+    api = web.Application()
+    api.router.add_post("/bot{token}/{method}", fake.handle)
+    api_runner, api_port = await _start_server(api)
+    bot_main.bot.session = AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{api_port}"))
+    bot_main.bot.session.middleware(bot_main.governor)
+
+    app_runner, port = await _start_server(bot_main.build_http_app(SECRET))
+    url = f"http://127.0.0.1:{port}{bot_main.WEBHOOK_PATH}"
+    ok = True
+    ids = itertools.count(1)
+    try:
+        async with ClientSession() as http:
+            async def post(update: dict, secret: str = SECRET) -> int:
+                headers = {"X-Telegram-Bot-Api-Secret-Token": secret}
+                async with http.post(url, json=update, headers=headers) as resp:
+                    return resp.status
+
+            status = await post(message_update(next(ids), 1, "/start"), secret="wrong")
+            print(f"wrong secret -> HTTP {status}")
+            ok &= status == 401
+
+            # one user through the whole menu
+            uid = 42
+            steps = [message_update(next(ids), uid, "/start")] + [
+                callback_update(next(ids), uid, data)
+                for data in ("analysis", "otc", pair_registry.by_name["EUR/USD OTC"].callback, "1m")
+            ]
+            started = time.perf_counter()
+            for update in steps:
+                ok &= await post(update) == 200
+                await _settle()
+            forecast = [t for t in fake.texts("editMessageText", uid) if "FORECAST" in t]
+            print(f"menu walk: {len(steps)} updates in {time.perf_counter() - started:.2f}s, "
+                  f"forecast {'received' if forecast else 'MISSING'}")
+            ok &= bool(forecast)
+
+            # the same forecast in one command
+            uid = 43
+            started = time.perf_counter()
+            ok &= await post(message_update(next(ids), uid, "/f EURUSD 1m otc")) == 200
+            await _settle()
+            calls = [m for m, d in fake.calls if str(d.get("chat_id")) == str(uid)]
+            forecast = [t for t in fake.texts("editMessageText", uid) if "FORECAST" in t]
+            print(f"/f: 1 update in {time.perf_counter() - started:.2f}s, {len(calls)} API calls ({', '.join(calls)}), "
+                  f"forecast {'received' if forecast else 'MISSING'}")
+            ok &= bool(forecast)
+
+            # market scan
+            uid = 44
+            started = time.perf_counter()
+            ok &= await post(message_update(next(ids), uid, "/scan otc 1m")) == 200
+            await _settle()
+            scan = [t for t in fake.texts("editMessageText", uid) if t.startswith("🔎 SCAN")]
+            print(f"/scan: {time.perf_counter() - started:.2f}s, "
+                  + (scan[-1].splitlines()[0] if scan else "ranking MISSING"))
+            ok &= bool(scan)
+
+            # burst of /start from many users
+            peak = 0
+
+            async def watch():
+                nonlocal peak
+                while True:
+                    peak = max(peak, webhook.WEBHOOK_IN_FLIGHT._value.get())
+                    await asyncio.sleep(0)
+
+            watcher = asyncio.create_task(watch())
+            before = len(fake.calls)
+            started = time.perf_counter()
+            statuses = await asyncio.gather(*(post(message_update(next(ids), 1000 + i, "/start")) for i in range(users)))
+            acked = time.perf_counter() - started
+            await _settle()
+            elapsed = time.perf_counter() - started
+            watcher.cancel()
+            replies = sum(1 for m, _ in fake.calls[before:] if m == "sendMessage")
+            print(f"burst: {users} updates acknowledged in {acked:.2f}s, {replies} replies after {elapsed:.2f}s "
+                  f"({users / elapsed:.0f} updates/s), peak in flight {int(peak)} "
+                  f"(limit {bot_main.WEBHOOK_CONCURRENCY})")
+            ok &= all(s == 200 for s in statuses) and replies == users and peak <= bot_main.WEBHOOK_CONCURRENCY
+    finally:
+        await app_runner.cleanup()
+        await api_runner.cleanup()
+        await bot_main.bot.session.close()
+    print("OK" if ok else "FAILED")
+    return ok
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="Drive the webhook mode with a local fake Telegram")
+    parser.add_argument("--users", type=int, default=200)
+    args = parser.parse_args(argv)
+    try:
+        ok = asyncio.run(run(args.users))
+    finally:
+        shutil.rmtree(FSM_DIR, ignore_errors=True)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# app/webhook.py
+"""
+Webhook-доставка апдейтов Telegram на том же aiohttp-приложении, что и /metrics.
+
+Telegram POSTs every update to ``WEBHOOK_URL + WEBHOOK_PATH`` with the
+secret token in ``X-Telegram-Bot-Api-Secret-Token``; requests without it
+get 401.  Updates are acknowledged at once and dispatched in background
+tasks, at most ``WEBHOOK_CONCURRENCY`` of them inside the dispatcher at a
+time — the rest wait for a slot instead of piling onto the PocketOption
+fetchers.
+"""
+from __future__ import annotations
+import asyncio
+import secrets
+from typing import Any, Dict
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+from loguru import logger
+from prometheus_client import Counter, Gauge
+
+WEBHOOK_UPDATES = Counter("bot_webhook_updates_total", "Updates received over the webhook", ["status"])
+WEBHOOK_IN_FLIGHT = Gauge("bot_webhook_updates_in_flight", "Webhook updates being processed")
+WEBHOOK_WAITING = Gauge("bot_webhook_updates_waiting", "Webhook updates waiting for a processing slot")
+
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """SimpleRequestHandler with a cap on concurrently processed updates"""
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, concurrency: int = 32, **kwargs: Any):
+        super().__init__(dispatcher, bot, handle_in_background=True, **kwargs)
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+
+    async def handle(self, request: web.Request) -> web.Response:
+        response = await super().handle(request)
+        WEBHOOK_UPDATES.labels(status="accepted" if response.status == 200 else "rejected").inc()
+        return response
+
+    async def _background_feed_update(self, bot: Bot, update: Dict[str, Any]) -> None:
+        WEBHOOK_WAITING.inc()
+        async with self._slots:
+            WEBHOOK_WAITING.dec()
+            WEBHOOK_IN_FLIGHT.inc()
+            try:
+                await super()._background_feed_update(bot, update)
+            except Exception:
+                logger.exception("Webhook update failed")
+            finally:
+                WEBHOOK_IN_FLIGHT.dec()
+
+
+def new_secret() -> str:
+    """Random secret token (Telegram allows A-Z, a-z, 0-9, _ and -)"""
+    return secrets.token_urlsafe(32)
+
+
+def mount(app: web.Application, dp: Dispatcher, bot: Bot, path: str, secret: str,
+          concurrency: int = 32) -> BoundedRequestHandler:
+    """Register the webhook route and the dispatcher's startup/shutdown hooks on ``app``"""
+    handler = BoundedRequestHandler(dp, bot, concurrency=concurrency, secret_token=secret)
+    handler.register(app, path=path)
+    setup_application(app, dp, bot=bot)
+    return handler
+
+
+async def register(bot: Bot, dp: Dispatcher, url: str, secret: str):
+    """Point Telegram at ``url``; only the update types the routers handle are requested"""
+    await bot.set_webhook(
+        url,
+        secret_token=secret,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+    logger.info(f"Webhook set to {url}")
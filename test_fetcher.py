@@ -9,6 +9,6 @@ async def main():
     df, source = await cf.fetch("EURUSD", "5m", otc=False)
     print("Source:", source)
     print("Rows:", len(df))
-    print(df.head().to_dict(orient="records"))
+    print(df[:5].to_frame().to_dict(orient="records"))
 
 asyncio.run(main())